@@ -10,10 +10,10 @@ cd /d %~dp0
 rem Check if virtual environment exists
 if exist ".venv\Scripts\python.exe" (
     echo Using virtual environment...
-    .venv\Scripts\python.exe kindle_to_pdf.py
+    .venv\Scripts\python.exe kindle_to_pdf.py %*
 ) else (
     echo Virtual environment not found. Using system Python...
-    python kindle_to_pdf.py
+    python kindle_to_pdf.py %*
 )
 
 pause
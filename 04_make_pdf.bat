@@ -7,7 +7,7 @@ echo.
 echo dataフォルダ内の画像をPDFに変換します
 echo.
 
-python make_pdf.py
+python make_pdf.py %*
 
 echo.
 pause
@@ -0,0 +1,15 @@
+@echo off
+chcp 65001 >nul
+echo ====================================================================
+echo キャプチャ処理ベンチマーク（ローカルの簡易リーダーを使用）
+echo ====================================================================
+echo.
+
+REM 仮想環境のPythonを使用（引数はそのまま渡す）
+.venv\Scripts\python.exe benchmark_capture.py %*
+
+echo.
+echo ====================================================================
+echo ベンチマークが完了しました。
+echo ====================================================================
+pause
@@ -0,0 +1,309 @@
+"""
+キャプチャ処理のスループットを計測するベンチマーク
+ローカルの簡易リーダー（bench_reader.html）を配信し、実際の KindleToPDF のキャプチャループを実行して
+ページ/秒・フェーズごとのレイテンシ（パーセンタイル）・ピークRSSを表示します
+Amazonへのログインは不要です
+"""
+
+import argparse
+import contextlib
+import functools
+import http.server
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from kindle_to_pdf import KindleToPDF
+
+
+# 結果表に並べる主なフェーズ（その他の細かいフェーズは後に続ける）
+PHASES = ["next_page", "wait_for_page_settle", "take_screenshot", "get_page_state", "flush_image_writer", "create_pdf"]
+
+
+def start_reader_server():
+    """
+    bench_reader.html をローカルで配信するHTTPサーバーを起動する
+    
+    Returns:
+        tuple: (server, base_url)
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}/bench_reader.html"
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """アクセスログを出力しないHTTPハンドラー"""
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, pct):
+    """
+    パーセンタイルを求める（最近順位法）
+    
+    Args:
+        values (list): 値のリスト
+        pct (float): パーセンタイル（0-100）
+    
+    Returns:
+        float: パーセンタイル値
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """
+    このプロセスのピークRSS（MB）。取得できない環境ではNone
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return usage / 1024 / (1024 if os.uname().sysname == "Darwin" else 1)
+
+
+def build_config(args, output_dir, url):
+    """
+    ベンチマーク用の設定を作成する（config.json をベースに上書き）
+    """
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    
+    config.update({
+        "output_dir": output_dir,
+        "page_delay": args.page_delay,
+        "settle_mode": args.settle_mode,
+        "page_turn_direction": "left",
+        "use_chrome_profile": False,
+        "headless": args.headless,
+        "capture_backend": args.backend,
+        "delete_screenshots": False,
+        "session_journal": True,
+        "trace_timing": True,
+        "trace_file": os.path.join(output_dir, "trace_events.json"),
+        "parallel_sessions": args.sessions,
+        "jump_url_template": url + "&page={page}",
+        "suppress_animations": args.suppress_animations,
+    })
+    return config
+
+
+def run_benchmark(args):
+    """
+    ベンチマークを1回実行する
+    
+    Returns:
+        dict: 計測結果
+    """
+    server, base_url = start_reader_server()
+    url = base_url + "?" + urlencode({
+        "pages": args.pages,
+        "latency": args.latency,
+        "anim": args.anim,
+        "direction": "left",
+    })
+    
+    work_dir = tempfile.mkdtemp(prefix="k2p_bench_")
+    config_path = os.path.join(work_dir, "config.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(build_config(args, os.path.join(work_dir, "data"), url), f, ensure_ascii=False, indent=2)
+    
+    app = KindleToPDF(config_path)
+    
+    log = io.StringIO()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(log)
+    
+    try:
+        with output:
+            app.setup_browser()
+            app.driver.get(url)
+            time.sleep(1)
+            
+            start = time.perf_counter()
+            if args.mode == "auto_complete":
+                app.capture_mode = "auto_complete"
+                app._capture_until_last_page()
+            else:
+                app.capture_mode = "manual"
+                app.total_pages = args.pages
+                app._capture_with_page_count()
+            capture_time = time.perf_counter() - start
+            
+            app.create_pdf(os.path.join(work_dir, "benchmark.pdf"))
+            total_time = time.perf_counter() - start
+    finally:
+        # バックエンドは cleanup で閉じられるため、計測値を先に取り出す
+        capture_stats = app.capture_backend.stats() if app.capture_backend else None
+        with contextlib.redirect_stdout(log):
+            app.cleanup()
+        server.shutdown()
+        if args.trace:
+            app.tracer.save(args.trace)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    pages = len(app.images)
+    timings = app.tracer.durations()
+    return {
+        "pages": pages,
+        "capture_seconds": round(capture_time, 3),
+        "total_seconds": round(total_time, 3),
+        "pages_per_second": round(pages / capture_time, 3) if capture_time else None,
+        "settle_times": app.settle_times,
+        "frame_qualities": app.frame_qualities,
+        "frame_recaptures": app.frame_recaptures,
+        "capture_stats": capture_stats,
+        "phases": {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+            for name, values in timings.items() if values
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "work_dir": work_dir if args.keep else None,
+    }
+
+
+def print_report(result, args):
+    """
+    計測結果を表示する
+    """
+    print("\n" + "="*70)
+    print("ベンチマーク結果")
+    print("="*70)
+    print(f"条件: {args.pages}ページ / 描画遅延 {args.latency}ms / アニメーション {args.anim}ms / "
+          f"settle_mode={args.settle_mode} / page_delay={args.page_delay}s / backend={args.backend} / "
+          f"sessions={args.sessions} / suppress_animations={args.suppress_animations}")
+    print(f"キャプチャ: {result['pages']}ページ / {result['capture_seconds']:.2f}秒 "
+          f"→ {result['pages_per_second']:.3f} ページ/秒")
+    print(f"PDF作成を含む合計: {result['total_seconds']:.2f}秒")
+    stats = result["capture_stats"]
+    if stats and stats["frames"]:
+        line = f"キャプチャ: 平均 {stats['grab_ms']:.1f}ms/フレーム"
+        if stats["allocations_per_grab"] is not None:
+            line += (f" / 確保 {stats['allocations_per_grab']:.2f}回/取得（{stats['alloc_kb_per_grab']:.0f}KB、{stats['grabs']}回） / "
+                     f"共有メモリの確保 {stats['buffer_allocations']}回")
+        print(line)
+    if result["frame_qualities"]:
+        print(f"フレーム品質: 最低 {min(result['frame_qualities']):.2f} / 撮り直し {result['frame_recaptures']}回")
+    print()
+    # 全角文字は表示幅が2文字分なので、その分だけ詰めて揃える
+    print(f"{'フェーズ':<26}{'回数':>4}{'p50':>10}{'p90':>10}{'p99':>10}{'最大':>8}")
+    others = sorted(name for name in result["phases"] if name not in PHASES)
+    for name in PHASES + others:
+        stats = result["phases"].get(name)
+        if not stats:
+            continue
+        print(f"{name:<30}{stats['count']:>6}"
+              f"{stats['p50'] * 1000:>8.0f}ms{stats['p90'] * 1000:>8.0f}ms"
+              f"{stats['p99'] * 1000:>8.0f}ms{stats['max'] * 1000:>8.0f}ms")
+    print()
+    if result["peak_rss_mb"] is not None:
+        print(f"ピークRSS（Pythonプロセス）: {result['peak_rss_mb']:.1f} MB")
+    else:
+        print("ピークRSS: この環境では取得できません")
+    if result["work_dir"]:
+        print(f"出力ファイル: {result['work_dir']}")
+    print("="*70)
+
+
+def print_animation_comparison(before, after):
+    """
+    アニメーション抑止の有無によるページあたりの時間の比較を表示する
+    
+    Args:
+        before (dict): suppress_animations 無効時の計測結果
+        after (dict): suppress_animations 有効時の計測結果
+    """
+    def per_page(result):
+        return result["capture_seconds"] / result["pages"] if result["pages"] else 0.0
+    
+    def average_settle(result):
+        times = result["settle_times"]
+        return sum(times) / len(times) if times else 0.0
+    
+    print("\n" + "="*70)
+    print("アニメーション抑止の比較")
+    print("="*70)
+    # 全角文字は表示幅が2文字分なので、その分だけ詰めて揃える
+    print(f"{'':<18}{'ページ数':>6}{'秒/ページ':>8}{'安定待ち平均':>8}")
+    for label, result in (("抑止なし", before), ("抑止あり", after)):
+        print(f"{label:<14}{result['pages']:>10}{per_page(result):>12.3f}{average_settle(result):>14.3f}")
+    if per_page(before):
+        change = (per_page(after) - per_page(before)) / per_page(before)
+        print(f"\nページあたりの時間: {per_page(before):.3f}秒 → {per_page(after):.3f}秒（{change:+.0%}）")
+    print("="*70)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ローカルの簡易リーダーでキャプチャ処理のスループットを計測します")
+    parser.add_argument("--pages", type=int, default=20, help="総ページ数（既定: 20）")
+    parser.add_argument("--latency", type=int, default=300, help="ページ描画の遅延ミリ秒（既定: 300）")
+    parser.add_argument("--anim", type=int, default=200, help="ページめくりアニメーションのミリ秒（既定: 200）")
+    parser.add_argument("--mode", choices=["manual", "auto_complete"], default="manual",
+                        help="キャプチャモード（auto_complete は最終ページ検出も計測）")
+    parser.add_argument("--settle-mode", default="fixed", choices=["fixed", "frame", "dom", "event"], help="settle_mode")
+    parser.add_argument("--page-delay", type=float, default=2.0, help="page_delay（秒）")
+    parser.add_argument("--backend", default="cdp", choices=["pyautogui", "cdp", "x11shm"],
+                        help="capture_backend（既定: cdp）")
+    parser.add_argument("--headless", action="store_true", help="ヘッドレスChromeで実行する")
+    parser.add_argument("--sessions", type=int, default=1,
+                        help="並列キャプチャのセッション数（parallel_sessions、manual モードのみ）")
+    parser.add_argument("--suppress-animations", action="store_true",
+                        help="ページめくりアニメーションを無効にする（suppress_animations）")
+    parser.add_argument("--compare-animations", action="store_true",
+                        help="アニメーション抑止なし・ありの2回を実行してページあたりの時間を比較する")
+    parser.add_argument("--config", default="config.json", help="ベースにする設定ファイル")
+    parser.add_argument("--json", help="結果をJSONで保存するファイル")
+    parser.add_argument("--trace", help="フェーズごとのスパンをChromeトレースイベント形式で保存するファイル")
+    parser.add_argument("--keep", action="store_true", help="キャプチャ画像とPDFを削除せずに残す")
+    parser.add_argument("--verbose", action="store_true", help="キャプチャ中のログを表示する")
+    args = parser.parse_args()
+    
+    if args.compare_animations:
+        results = {}
+        for suppress in (False, True):
+            args.suppress_animations = suppress
+            print(f"ベンチマークを実行しています（suppress_animations={suppress}）...")
+            results["suppressed" if suppress else "baseline"] = run_benchmark(args)
+            print_report(results["suppressed" if suppress else "baseline"], args)
+        print_animation_comparison(results["baseline"], results["suppressed"])
+        result = results
+    else:
+        print("ベンチマークを実行しています...")
+        result = run_benchmark(args)
+        print_report(result, args)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+"""
+スクリーンショットの取得方法（キャプチャバックエンド）
+config.json の capture_backend で選択する
+
+- pyautogui: デスクトップ画面をキャプチャ（実際の画面とフォーカスが必要）
+- cdp: Chrome DevTools Protocol の Page.captureScreenshot でブラウザの描画結果を直接取得
+       （ヘッドレスChromeや画面のないLinuxでも動作し、他のウィンドウが重なっても影響を受けない）
+- x11shm: X11 の MIT-SHM 拡張で screenshot_region だけを共有メモリに直接取得（Linux。Xvfb 上でも動作）
+          共有メモリとその NumPy ビューは一度だけ確保して使い回し、取得ごとに実際に確保した回数とバイト数を計測する
+"""
+
+import base64
+import ctypes
+import ctypes.util
+import io
+import os
+import time
+from PIL import Image
+
+from trace_timing import Tracer
+
+
+class PyAutoGUIBackend:
+    """pyautogui によるデスクトップキャプチャ"""
+    
+    name = "pyautogui"
+    
+    def __init__(self):
+        # 画面のない環境でもモジュールを読み込めるよう、使う時点でインポートする
+        import pyautogui
+        self._pyautogui = pyautogui
+        self.frames = 0
+        self.grab_seconds = 0.0
+    
+    def grab(self, region=None):
+        """
+        画面をキャプチャする
+        
+        Args:
+            region (tuple): (x, y, width, height)。Noneの場合は画面全体
+        
+        Returns:
+            PIL.Image.Image: キャプチャしたフレーム
+        """
+        start = time.perf_counter()
+        frame = self._pyautogui.screenshot(region=region)
+        self.frames += 1
+        self.grab_seconds += time.perf_counter() - start
+        return frame
+    
+    def stats(self):
+        """
+        取得の計測値（フレームごとの確保は計測できないためNone）
+        """
+        return _timing_stats(self)
+    
+    def close(self):
+        """後処理（何もしない）"""
+        pass
+
+
+class CDPBackend:
+    """Chrome DevTools Protocol によるブラウザ内キャプチャ"""
+    
+    name = "cdp"
+    
+    def __init__(self, driver):
+        """
+        初期化
+        
+        Args:
+            driver: CDPコマンドを実行できるChromeのWebDriver
+        """
+        self.driver = driver
+        self.frames = 0
+        self.grab_seconds = 0.0
+    
+    def grab(self, region=None):
+        """
+        ブラウザの表示領域をキャプチャする
+        
+        Args:
+            region (tuple): (x, y, width, height)。ビューポート内のCSSピクセル座標。Noneの場合は表示領域全体
+        
+        Returns:
+            PIL.Image.Image: キャプチャしたフレーム（メモリ上のバッファから読み込み）
+        """
+        start = time.perf_counter()
+        params = {"format": "png", "fromSurface": True, "captureBeyondViewport": False}
+        if region:
+            x, y, width, height = region
+            params["clip"] = {"x": x, "y": y, "width": width, "height": height, "scale": 1}
+        
+        result = self.driver.execute_cdp_cmd("Page.captureScreenshot", params)
+        frame = Image.open(io.BytesIO(base64.b64decode(result["data"])))
+        frame.load()
+        
+        self.frames += 1
+        self.grab_seconds += time.perf_counter() - start
+        return frame.convert("RGB") if frame.mode != "RGB" else frame
+    
+    def stats(self):
+        """
+        取得の計測値（フレームごとの確保は計測できないためNone）
+        """
+        return _timing_stats(self)
+    
+    def close(self):
+        """後処理（何もしない）"""
+        pass
+
+
+def _timing_stats(backend):
+    """フレーム数と平均取得時間だけの計測値"""
+    return {
+        "frames": backend.frames,
+        "grab_ms": round(backend.grab_seconds / backend.frames * 1000, 2) if backend.frames else None,
+        "buffer_allocations": None,
+        "grabs": None,
+        "allocations_per_grab": None,
+        "alloc_kb_per_grab": None,
+    }
+
+
+# X11 の定数
+_Z_PIXMAP = 2
+_ALL_PLANES = 0xFFFFFFFF
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+
+class _XImage(ctypes.Structure):
+    """XImage 構造体（使用するフィールドまで）"""
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    """XShmSegmentInfo 構造体"""
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+_X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+
+def _load_library(name):
+    path = ctypes.util.find_library(name)
+    if not path:
+        raise RuntimeError(f"lib{name} が見つかりません")
+    return ctypes.CDLL(path, use_errno=True)
+
+
+class X11SHMBackend:
+    """X11 の MIT-SHM 拡張による共有メモリキャプチャ"""
+    
+    name = "x11shm"
+    
+    def __init__(self, tracer=None, display=None):
+        """
+        初期化（Xサーバーに接続し、MIT-SHM が使えるか確認する）
+        
+        Args:
+            tracer (Tracer): 取得・変換時間の計測先（Noneの場合は計測しない）
+            display (str): 接続するディスプレイ（Noneの場合は環境変数 DISPLAY）
+        """
+        import numpy as np
+        self._np = np
+        self.tracer = tracer or Tracer()
+        
+        display = display or os.environ.get("DISPLAY")
+        if not display:
+            raise RuntimeError("DISPLAY が設定されていません（Xvfb などのXサーバーが必要です）")
+        
+        self._x11 = _load_library("X11")
+        self._xext = _load_library("Xext")
+        self._libc = _load_library("c")
+        self._declare_functions()
+        
+        self._display = self._x11.XOpenDisplay(display.encode())
+        if not self._display:
+            raise RuntimeError(f"Xサーバーに接続できません: {display}")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+            raise RuntimeError("XサーバーがMIT-SHM拡張に対応していません")
+        
+        # 非同期のXエラーで既定のハンドラーがプロセスを終了しないよう、エラーを記録するだけのハンドラーにする
+        self._x_error = False
+        self._error_handler = _X_ERROR_HANDLER(self._on_x_error)
+        self._x11.XSetErrorHandler(self._error_handler)
+        
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XRootWindow(self._display, screen)
+        self._visual = self._x11.XDefaultVisual(self._display, screen)
+        self._depth = self._x11.XDefaultDepth(self._display, screen)
+        self.screen_size = (self._x11.XDisplayWidth(self._display, screen),
+                            self._x11.XDisplayHeight(self._display, screen))
+        
+        # 共有メモリの画像（領域の大きさが変わった場合のみ作り直す）
+        self._shminfo = None
+        self._ximage = None
+        self._view = None  # 共有メモリの NumPy ビュー（高さ, 1行のバイト数）
+        self._size = None
+        
+        # 計測値
+        self.frames = 0
+        self.grab_seconds = 0.0
+        self.buffer_allocations = 0  # 共有メモリの確保回数
+        self.grabs = 0  # grab() と grab_signal() の合計回数
+        self.allocations = 0  # 取得中に確保したバッファの数（共有メモリ、保存用の画像、間引き用の配列）
+        self.allocated_bytes = 0  # その合計バイト数
+    
+    def _declare_functions(self):
+        """使用する関数の引数と戻り値の型を宣言する"""
+        x11, xext, libc = self._x11, self._xext, self._libc
+        display_p = ctypes.c_void_p
+        ximage_p = ctypes.POINTER(_XImage)
+        shminfo_p = ctypes.POINTER(_XShmSegmentInfo)
+        
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = display_p
+        x11.XCloseDisplay.argtypes = [display_p]
+        x11.XDefaultScreen.argtypes = [display_p]
+        x11.XRootWindow.argtypes = [display_p, ctypes.c_int]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultVisual.argtypes = [display_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultDepth.argtypes = [display_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [display_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [display_p, ctypes.c_int]
+        x11.XSync.argtypes = [display_p, ctypes.c_int]
+        x11.XFree.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.argtypes = [_X_ERROR_HANDLER]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        
+        xext.XShmQueryExtension.argtypes = [display_p]
+        xext.XShmCreateImage.argtypes = [display_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+                                         shminfo_p, ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ximage_p
+        xext.XShmAttach.argtypes = [display_p, shminfo_p]
+        xext.XShmDetach.argtypes = [display_p, shminfo_p]
+        xext.XShmGetImage.argtypes = [display_p, ctypes.c_ulong, ximage_p, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    
+    def _on_x_error(self, display, event):
+        self._x_error = True
+        return 0
+    
+    def _clamp(self, region):
+        """領域を画面内に収める"""
+        screen_width, screen_height = self.screen_size
+        if not region:
+            return 0, 0, screen_width, screen_height
+        x, y, width, height = (int(value) for value in region)
+        x, y = max(0, min(x, screen_width - 1)), max(0, min(y, screen_height - 1))
+        return x, y, max(1, min(width, screen_width - x)), max(1, min(height, screen_height - y))
+    
+    def _allocate(self, width, height):
+        """
+        領域の大きさの共有メモリ画像を作る（前回と同じ大きさなら再利用する）
+        """
+        if self._size == (width, height):
+            return
+        self._release()
+        
+        shminfo = _XShmSegmentInfo()
+        ximage = self._xext.XShmCreateImage(self._display, self._visual, self._depth, _Z_PIXMAP, None,
+                                           ctypes.byref(shminfo), width, height)
+        if not ximage:
+            raise RuntimeError("共有メモリの画像を作成できませんでした")
+        if ximage.contents.bits_per_pixel != 32:
+            self._x11.XFree(ximage)
+            raise RuntimeError(f"対応していない画素形式です（{ximage.contents.bits_per_pixel}ビット/画素）")
+        
+        size = ximage.contents.bytes_per_line * height
+        shminfo.shmid = self._libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            self._x11.XFree(ximage)
+            raise OSError(ctypes.get_errno(), "shmget に失敗しました")
+        shminfo.shmaddr = self._libc.shmat(shminfo.shmid, None, 0)
+        if shminfo.shmaddr in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(shminfo.shmid, _IPC_RMID, None)
+            self._x11.XFree(ximage)
+            raise OSError(ctypes.get_errno(), "shmat に失敗しました")
+        shminfo.readOnly = 0
+        ximage.contents.data = shminfo.shmaddr
+        
+        self._x_error = False
+        self._xext.XShmAttach(self._display, ctypes.byref(shminfo))
+        self._x11.XSync(self._display, 0)
+        # アタッチ後はプロセスが終了しても共有メモリが残らないよう、削除の予約をしておく
+        self._libc.shmctl(shminfo.shmid, _IPC_RMID, None)
+        
+        self._shminfo, self._ximage, self._size = shminfo, ximage, (width, height)
+        if self._x_error:
+            self._release()
+            raise RuntimeError("共有メモリをXサーバーにアタッチできませんでした（リモートのディスプレイでは使えません）")
+        
+        buffer = (ctypes.c_uint8 * size).from_address(shminfo.shmaddr)
+        self._view = self._np.ctypeslib.as_array(buffer).reshape(height, ximage.contents.bytes_per_line)
+        self.buffer_allocations += 1
+        self._count_allocation(size)
+    
+    def _release(self):
+        """共有メモリ画像を解放する"""
+        if self._ximage is None:
+            return
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        self._ximage.contents.data = None
+        self._x11.XFree(self._ximage)
+        self._libc.shmdt(self._shminfo.shmaddr)
+        self._shminfo = self._ximage = self._view = self._size = None
+    
+    def _count_allocation(self, nbytes):
+        """取得中に確保したバッファを1つ数える"""
+        self.allocations += 1
+        self.allocated_bytes += nbytes
+    
+    def _record_grab(self, name, start, allocations, allocated_bytes):
+        """
+        1回の取得で確保した回数とバイト数をトレースに記録する
+        
+        Args:
+            name (str): スパン名
+            start (float): 取得の開始時刻（time.perf_counter() の値）
+            allocations (int): 取得前の self.allocations
+            allocated_bytes (int): 取得前の self.allocated_bytes
+        """
+        self.grabs += 1
+        self.tracer.add_span(name, start, time.perf_counter() - start,
+                             allocations=self.allocations - allocations,
+                             alloc_kb=round((self.allocated_bytes - allocated_bytes) / 1024, 1))
+    
+    def grab_array(self, region=None):
+        """
+        領域を共有メモリに取得し、そのビューを返す（コピーしない。次の取得で上書きされる）
+        
+        Args:
+            region (tuple): (x, y, width, height)。Noneの場合は画面全体
+        
+        Returns:
+            numpy.ndarray: (高さ, 幅, 4) の BGRX 配列
+        """
+        x, y, width, height = self._clamp(region)
+        self._allocate(width, height)
+        
+        with self.tracer.span("capture.shm_get"):
+            self._x_error = False
+            if not self._xext.XShmGetImage(self._display, self._root, self._ximage, x, y, _ALL_PLANES) or self._x_error:
+                raise RuntimeError("XShmGetImage に失敗しました")
+        return self._view[:, :width * 4].reshape(height, width, 4)
+    
+    def grab(self, region=None):
+        """
+        画面の領域をキャプチャする
+        
+        Args:
+            region (tuple): (x, y, width, height)。Noneの場合は画面全体
+        
+        Returns:
+            PIL.Image.Image: キャプチャしたフレーム（共有メモリから1回だけコピーする）
+        """
+        start = time.perf_counter()
+        allocations, allocated_bytes = self.allocations, self.allocated_bytes
+        pixels = self.grab_array(region)
+        height, width = pixels.shape[:2]
+        
+        # BGRX -> RGB の変換と保存用の画像へのコピーを1回で行う
+        with self.tracer.span("capture.convert"):
+            frame = Image.frombuffer("RGB", (width, height), self._view, "raw", "BGRX",
+                                     self._ximage.contents.bytes_per_line, 1)
+            frame.load()
+        self._count_allocation(width * height * 4)  # PILのRGB画像は1画素4バイトで保持される
+        
+        self.frames += 1
+        self.grab_seconds += time.perf_counter() - start
+        self._record_grab("capture.grab", start, allocations, allocated_bytes)
+        return frame
+    
+    def grab_signal(self, region=None, size=64):
+        """
+        安定判定用の縮小フレームを取得する（保存用の画像を作らず、共有メモリから間引いて読む）
+        
+        Args:
+            region (tuple): (x, y, width, height)。Noneの場合は画面全体
+            size (int): 縮小後の一辺の画素数
+        
+        Returns:
+            bytes: size x size のグレースケール画素（緑チャンネルを輝度の近似として使う）
+        """
+        start = time.perf_counter()
+        allocations, allocated_bytes = self.allocations, self.allocated_bytes
+        pixels = self.grab_array(region)
+        height, width = pixels.shape[:2]
+        rows = self._np.linspace(0, height - 1, size).astype(self._np.intp)
+        columns = self._np.linspace(0, width - 1, size).astype(self._np.intp)
+        sampled = pixels[rows[:, None], columns, 1]
+        signal = sampled.tobytes()
+        for array in (rows, columns, sampled):
+            self._count_allocation(array.nbytes)
+        self._count_allocation(len(signal))
+        
+        self._record_grab("capture.grab_signal", start, allocations, allocated_bytes)
+        return signal
+    
+    def stats(self):
+        """
+        取得の計測値
+        
+        Returns:
+            dict: frames, grab_ms（1フレームの平均）, buffer_allocations, grabs,
+                  allocations_per_grab, alloc_kb_per_grab（安定検出の取得も含む、実際に確保した回数とバイト数の平均）
+        """
+        return {
+            "frames": self.frames,
+            "grab_ms": round(self.grab_seconds / self.frames * 1000, 2) if self.frames else None,
+            "buffer_allocations": self.buffer_allocations,
+            "grabs": self.grabs,
+            "allocations_per_grab": round(self.allocations / self.grabs, 3) if self.grabs else None,
+            "alloc_kb_per_grab": round(self.allocated_bytes / self.grabs / 1024, 1) if self.grabs else None,
+        }
+    
+    def close(self):
+        """共有メモリとXサーバーへの接続を解放する"""
+        if self._display:
+            self._release()
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+def create_capture_backend(name, driver=None, tracer=None):
+    """
+    設定名からキャプチャバックエンドを作成する
+    
+    Args:
+        name (str): 'pyautogui'、'cdp' または 'x11shm'
+        driver: WebDriver（cdp の場合に必要）
+        tracer (Tracer): 取得時間の計測先（x11shm で使用）
+    
+    Returns:
+        キャプチャバックエンド
+    """
+    name = (name or "pyautogui").lower()
+    
+    if name == "cdp":
+        if driver is None:
+            raise ValueError("cdp バックエンドにはブラウザの起動が必要です")
+        return CDPBackend(driver)
+    
+    if name == "x11shm":
+        try:
+            return X11SHMBackend(tracer)
+        except Exception as e:
+            # 使えない環境（Windows・Wayland・リモートのディスプレイなど）では pyautogui で続行する
+            print(f"  注意: x11shm バックエンドを使えないため pyautogui に切り替えます（{e}）")
+            return PyAutoGUIBackend()
+    
+    if name == "pyautogui":
+        return PyAutoGUIBackend()
+    
+    raise ValueError(f"不明な capture_backend です: {name}（'pyautogui'、'cdp' または 'x11shm' を指定してください）")
@@ -0,0 +1,160 @@
+"""
+ChromeDriverの解決結果のキャッシュ
+ChromeDriverManager().install() は起動のたびにネットワークで最新版を確認するため数秒かかり、オフラインでは失敗する
+一度解決したドライバーのパスとその時のChromeのバージョンをローカルに記録し、
+インストールされているChromeのメジャーバージョンが変わらない限りネットワークに接続せずに再利用する
+"""
+
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+from datetime import datetime
+
+from trace_timing import Tracer
+
+
+# キャッシュファイル（複数のチェックアウトで共有する）
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".kindle2pdf", "chromedriver.json")
+
+# Chromeの実行ファイルの候補（Windows以外）
+CHROME_COMMANDS = {
+    "darwin": ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+               "/Applications/Chromium.app/Contents/MacOS/Chromium"],
+    "linux": ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"],
+}
+
+VERSION_PATTERN = re.compile(r"(\d+\.\d+\.\d+\.\d+)")
+
+
+def _windows_chrome_version():
+    """Windowsのレジストリ（なければインストール先のフォルダ名）からChromeのバージョンを取得"""
+    try:
+        import winreg
+        for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            try:
+                with winreg.OpenKey(root, r"Software\Google\Chrome\BLBeacon") as key:
+                    return winreg.QueryValueEx(key, "version")[0]
+            except OSError:
+                continue
+    except ImportError:
+        pass
+    
+    for base in (os.environ.get("PROGRAMFILES", ""), os.environ.get("PROGRAMFILES(X86)", ""),
+                 os.environ.get("LOCALAPPDATA", "")):
+        for path in glob.glob(os.path.join(base, "Google", "Chrome", "Application", "*.*.*.*")):
+            match = VERSION_PATTERN.search(os.path.basename(path))
+            if match:
+                return match.group(1)
+    return None
+
+
+def installed_chrome_version():
+    """
+    インストールされているChromeのバージョンを取得（ネットワークには接続しない）
+    
+    Returns:
+        str: バージョン（例: "120.0.6099.109"）、取得できない場合はNone
+    """
+    if sys.platform.startswith("win"):
+        return _windows_chrome_version()
+    
+    commands = CHROME_COMMANDS["darwin" if sys.platform == "darwin" else "linux"]
+    for command in commands:
+        try:
+            output = subprocess.run([command, "--version"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = VERSION_PATTERN.search(output)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _major(version):
+    return version.split(".")[0] if version else None
+
+
+def load_cache(cache_path=CACHE_PATH):
+    """キャッシュを読み込む（ない場合や壊れている場合は空の辞書）"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(driver_path, chrome_version, cache_path=CACHE_PATH):
+    """
+    解決したドライバーのパスとChromeのバージョンを記録する
+    """
+    entry = {
+        "driver_path": os.path.abspath(driver_path),
+        "chrome_version": chrome_version,
+        "resolved_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"  警告: ChromeDriverのキャッシュを保存できませんでした: {e}")
+
+
+def resolve_chromedriver(pinned_path=None, tracer=None, cache_path=CACHE_PATH):
+    """
+    ChromeDriverのパスを解決する
+    1. pinned_path が指定されていればそのまま使う
+    2. キャッシュのドライバーが存在し、Chromeのメジャーバージョンが記録時と同じなら再利用する
+    3. それ以外は ChromeDriverManager でダウンロードしてキャッシュに記録する
+       （ネットワークに接続できない場合は古いキャッシュ、それもなければSelenium Managerに任せる）
+    
+    Args:
+        pinned_path (str): 固定するChromeDriverのパス（設定の chromedriver_path）
+        tracer (Tracer): 所要時間の計測先
+        cache_path (str): キャッシュファイルのパス
+    
+    Returns:
+        str: ChromeDriverのパス。Noneの場合は Service() の既定（Selenium Manager）を使う
+    """
+    tracer = tracer or Tracer()
+    
+    with tracer.span("driver_resolve"):
+        if pinned_path:
+            if os.path.exists(pinned_path):
+                print(f"ChromeDriver（固定）: {pinned_path}")
+                return pinned_path
+            print(f"警告: chromedriver_path が見つかりません: {pinned_path}")
+        
+        with tracer.span("driver_resolve.chrome_version"):
+            chrome_version = installed_chrome_version()
+        cache = load_cache(cache_path)
+        cached_path = cache.get("driver_path")
+        cached_exists = bool(cached_path) and os.path.exists(cached_path)
+        
+        # Chromeのバージョンが取得できない場合も、キャッシュがあればそれを使う
+        if cached_exists and (chrome_version is None or _major(chrome_version) == _major(cache.get("chrome_version"))):
+            print(f"ChromeDriver（キャッシュ）: {cached_path}")
+            return cached_path
+        
+        if cached_exists:
+            print(f"Chromeのバージョンが変わりました（{cache.get('chrome_version')} → {chrome_version}）。ChromeDriverを更新します...")
+        
+        try:
+            with tracer.span("driver_resolve.download"):
+                from webdriver_manager.chrome import ChromeDriverManager
+                driver_path = ChromeDriverManager().install()
+        except Exception as e:
+            if cached_exists:
+                print(f"警告: ChromeDriverを更新できませんでした（{e}）。キャッシュのドライバーを使用します")
+                return cached_path
+            print(f"警告: ChromeDriverを取得できませんでした（{e}）。Selenium Managerに任せます")
+            return None
+        
+        save_cache(driver_path, chrome_version, cache_path)
+        print(f"ChromeDriver: {driver_path}（Chrome {chrome_version or '不明'}）")
+        return driver_path
@@ -0,0 +1,169 @@
+"""
+キャプチャしたフレームの解析ユーティリティ（NumPyによるベクトル化処理）
+"""
+
+import numpy as np
+
+
+def _runs(indices, max_gap):
+    """
+    インデックス列を、間隔が max_gap 以下の連続区間にまとめる
+    
+    Returns:
+        list: (start, end) のリスト（endは含まない）
+    """
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > max_gap)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _content_span(profile, min_fraction, edge_band, max_chrome):
+    """
+    行（または列）ごとの内容画素の割合から、内容がある範囲を求める
+    フレームの端に張り付いた細い帯（リーダーのツールバーやページ番号表示）は除外する
+    
+    Returns:
+        tuple: (start, end)、内容がない場合はNone
+    """
+    length = profile.size
+    runs = _runs(np.flatnonzero(profile > min_fraction), max(1, int(length * 0.02)))
+    if not runs:
+        return None
+    
+    edge = length * edge_band
+    body = [
+        (start, end) for start, end in runs
+        if not ((start <= edge or end >= length - edge) and end - start <= length * max_chrome)
+    ]
+    runs = body or runs
+    return runs[0][0], runs[-1][1]
+
+
+def find_content_bbox(frames, threshold=24, min_fraction=0.002, padding=8, edge_band=0.06, max_chrome=0.08):
+    """
+    フレームの行・列の射影からページ内容のバウンディングボックスを求める
+    複数フレームの結果を合成して、どのページでも内容が切れない範囲にする
+    
+    Args:
+        frames (list): PIL画像のリスト（同じサイズ）
+        threshold (int): 背景色との輝度差がこれを超える画素を内容とみなす
+        min_fraction (float): 行（列）の内容画素の割合がこれを超えると内容がある行（列）とみなす
+        padding (int): ボックスの周囲に追加する余白（ピクセル）
+        edge_band (float): 端からこの割合以内にある帯をリーダーのUI候補とみなす
+        max_chrome (float): UIとして除外する帯の最大の太さ（割合）
+    
+    Returns:
+        tuple: (left, top, right, bottom)、内容が見つからない場合はNone
+    """
+    box = None
+    
+    for frame in frames:
+        gray = np.asarray(frame.convert("L"), dtype=np.int16)
+        
+        # 最も多い輝度をページの背景色とみなす
+        background = np.bincount(gray.ravel(), minlength=256).argmax()
+        mask = np.abs(gray - background) > threshold
+        
+        rows = _content_span(mask.mean(axis=1), min_fraction, edge_band, max_chrome)
+        if rows is None:
+            continue
+        # 列の射影は除外したUIの帯を含めずに計算する
+        cols = _content_span(mask[rows[0]:rows[1]].mean(axis=0), min_fraction, edge_band, max_chrome)
+        if cols is None:
+            continue
+        
+        frame_box = (cols[0], rows[0], cols[1], rows[1])
+        if box is None:
+            box = frame_box
+        else:
+            box = (min(box[0], frame_box[0]), min(box[1], frame_box[1]),
+                   max(box[2], frame_box[2]), max(box[3], frame_box[3]))
+    
+    if box is None:
+        return None
+    
+    width, height = frames[0].size
+    return (max(0, box[0] - padding), max(0, box[1] - padding),
+            min(width, box[2] + padding), min(height, box[3] + padding))
+
+
+def _thumbnail(frame, size):
+    """縮小したグレースケール画像（NumPy配列、長辺が size ピクセル）"""
+    gray = frame.convert("L")
+    gray.thumbnail((size, size))
+    return np.asarray(gray, dtype=np.int16)
+
+
+def frame_difference(first, second, threshold=24, size=256):
+    """
+    2つのフレームの差（縮小したグレースケールで、輝度差がしきい値を超える画素の割合）
+    
+    Args:
+        first (PIL.Image.Image): フレーム
+        second (PIL.Image.Image): 直後に取得したフレーム
+        threshold (int): 変化とみなす輝度差
+        size (int): 比較に使う縮小サイズ（長辺）
+    
+    Returns:
+        float: 変化した画素の割合（0～1）
+    """
+    a = _thumbnail(first, size)
+    b = _thumbnail(second, size)
+    if a.shape != b.shape:
+        return 1.0
+    return float((np.abs(a - b) > threshold).mean())
+
+
+def midtone_fraction(frame, threshold=24, size=512):
+    """
+    内容画素のうち中間調の画素の割合
+    ページめくりのクロスフェードや描画途中のフレームでは、前後のページの文字が薄く重なって中間調が増える
+    
+    Args:
+        frame (PIL.Image.Image): フレーム
+        threshold (int): 背景色との輝度差がこれを超える画素を内容とみなす
+        size (int): 計算に使う縮小サイズ（長辺）
+    
+    Returns:
+        float: 中間調の割合（0～1）、内容がない場合は0
+    """
+    gray = _thumbnail(frame, size)
+    background = np.bincount(gray.ravel(), minlength=256).argmax()
+    distance = np.abs(gray - background)
+    content = distance > threshold
+    if not content.any():
+        return 0.0
+    
+    # 背景から最も離れた輝度（文字の色）に届かない内容画素を中間調とみなす
+    ink = np.percentile(distance[content], 95)
+    midtone = content & (distance < ink - threshold)
+    return float(midtone.sum() / content.sum())
+
+
+def frame_quality(first, second, baseline_midtone=None, diff_limit=0.01, blend_margin=0.15):
+    """
+    フレームの品質スコア（ページめくりの途中や描画途中のフレームを検出する）
+    直後に取得した2枚目のフレームとの差と、最近の正常なフレームと比べた中間調の増加から計算する
+    中間調の増加は2枚が異なる（画面が動いている）場合のみ評価する（写真や図のページは静止していれば中間調が多くても正常）
+    
+    Args:
+        first (PIL.Image.Image): フレーム
+        second (PIL.Image.Image): 直後に取得したフレーム
+        baseline_midtone (float): 最近の正常なフレームの中間調の割合（Noneの場合は中間調を評価しない）
+        diff_limit (float): この割合以上の画素が2枚の間で変化していたらスコア0
+        blend_margin (float): 2枚が異なり、中間調の割合が基準よりこれだけ増えていたらスコア0
+    
+    Returns:
+        dict: score（0～1、1が最良）, diff（変化した画素の割合）, midtone（2枚目の中間調の割合）
+    """
+    diff = frame_difference(first, second)
+    midtone = midtone_fraction(second)
+    
+    penalty = min(1.0, diff / diff_limit)
+    if baseline_midtone is not None and diff > 0:
+        penalty = max(penalty, min(1.0, max(0.0, midtone - baseline_midtone) / blend_margin))
+    
+    return {"score": round(1.0 - penalty, 3), "diff": round(diff, 4), "midtone": round(midtone, 4)}
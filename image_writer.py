@@ -0,0 +1,159 @@
+"""
+スクリーンショット画像をバックグラウンドで保存するパイプライン
+キャプチャループはフレームをキューに渡すだけで、PNG圧縮とディスク書き込みはワーカースレッドが行う
+"""
+
+import os
+import queue
+import threading
+from trace_timing import Tracer
+
+
+class ImageWriterPool:
+    """画像保存用のワーカースレッドプール"""
+    
+    def __init__(self, num_workers=2, max_queue=8, tracer=None, compress_level=6):
+        """
+        初期化
+        
+        Args:
+            num_workers (int): 保存ワーカー数（0の場合は呼び出し元で同期保存）
+            max_queue (int): 保存待ちフレームの上限（超えるとsubmitが待機する）
+            tracer (Tracer): 保存時間・キュー待ち時間の計測先（Noneの場合は計測しない）
+            compress_level (int): PNGのzlib圧縮レベル（0=無圧縮、1=最速、9=最小）
+        """
+        self.tracer = tracer or Tracer()
+        self.compress_level = compress_level
+        self.num_workers = max(0, int(num_workers))
+        self.queue = queue.Queue(maxsize=max(1, int(max_queue))) if self.num_workers > 0 else None
+        self.errors = []  # 保存に失敗した (path, exception) のリスト
+        self._lock = threading.Lock()
+        self._threads = []
+        self._inflight = {}  # 保存中のパス -> 完了イベント（同じ内容のフレームを重複して保存しないため）
+        
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"ImageWriter-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def submit(self, image, path, on_saved=None, skip_existing=False):
+        """
+        フレームを保存キューに追加する
+        
+        Args:
+            image (PIL.Image.Image): 保存するフレーム
+            path (str): 保存先のファイルパス
+            on_saved (callable): 保存完了後に path を引数として呼ばれるコールバック（ワーカースレッドで実行）
+            skip_existing (bool): 同じパスのファイルが保存済み（または保存中）なら保存しない（内容アドレス方式のストア用）
+        """
+        job = (image, path, on_saved, skip_existing)
+        
+        if self.queue is None:
+            self._save(job)
+        else:
+            # キューが満杯の間はここで待つ（保存が追いつかない場合の待ち時間を計測する）
+            with self.tracer.span("image_writer.queue_wait"):
+                self.queue.put(job)
+    
+    def _save(self, job):
+        """
+        1フレームを保存する
+        """
+        image, path, on_saved, skip_existing = job
+        try:
+            if skip_existing:
+                self._save_once(image, path)
+            else:
+                with self.tracer.span("image_writer.save", file=os.path.basename(path)):
+                    image.save(path, format="PNG", compress_level=self.compress_level)
+            if on_saved:
+                on_saved(path)
+        except Exception as e:
+            with self._lock:
+                self.errors.append((path, e))
+            print(f"  ✗ 画像の保存に失敗しました: {path}: {e}")
+    
+    def _save_once(self, image, path):
+        """
+        同じパスには1回だけ保存する
+        別のワーカーが保存中の場合は完了を待ち、一時ファイルに書いてから置き換えるため、途中まで書かれたファイルは見えない
+        """
+        with self._lock:
+            pending = self._inflight.get(path)
+            if pending is None and not os.path.exists(path):
+                done = self._inflight[path] = threading.Event()
+            else:
+                done = None
+        
+        if done is None:
+            if pending is not None:
+                pending.wait()
+            if not os.path.exists(path):
+                raise OSError(f"同じ内容の画像の保存に失敗しています: {path}")
+            return
+        
+        try:
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with self.tracer.span("image_writer.save", file=os.path.basename(path)):
+                image.save(temp_path, format="PNG", compress_level=self.compress_level)
+            os.replace(temp_path, path)
+        finally:
+            with self._lock:
+                del self._inflight[path]
+            done.set()
+    
+    def _worker(self):
+        """
+        ワーカースレッドの処理
+        """
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self._save(job)
+            finally:
+                self.queue.task_done()
+    
+    def pending(self):
+        """
+        保存待ちのフレーム数
+        
+        Returns:
+            int: キューに残っているフレーム数
+        """
+        return self.queue.qsize() if self.queue is not None else 0
+    
+    def flush(self):
+        """
+        保存待ちのフレームがすべて書き込まれるまで待つ
+        """
+        if self.queue is not None:
+            self.queue.join()
+    
+    def take_errors(self):
+        """
+        保存エラーを取り出してクリアする
+        
+        Returns:
+            list: (path, exception) のリスト
+        """
+        with self._lock:
+            errors, self.errors = self.errors, []
+        return errors
+    
+    def close(self):
+        """
+        残りのフレームを書き込んでワーカーを終了する
+        """
+        if self.queue is None:
+            return
+        
+        self.flush()
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        
+        self._threads = []
+        self.queue = None
@@ -0,0 +1,15 @@
+@echo off
+chcp 65001 >nul
+echo ====================================================================
+echo 複数の本のキャプチャ（ジョブスケジューラー）
+echo ====================================================================
+echo.
+
+REM 仮想環境のPythonを使用（引数はそのまま渡す）
+.venv\Scripts\python.exe job_queue.py %*
+
+echo.
+echo ====================================================================
+echo ジョブスケジューラーが終了しました。
+echo ====================================================================
+pause
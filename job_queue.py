@@ -0,0 +1,352 @@
+"""
+複数の本のキャプチャを無人で実行するジョブスケジューラー
+キューファイル（JSON）に本のASINまたはURLと本ごとの設定を書いておくと、
+kindle_to_pdf.py を無人実行モード（--unattended）で1冊ずつ別プロセスとして起動する
+失敗したジョブはジャーナルから再開（--resume）して再試行し、ジョブごとの状態と所要時間を状態ファイルに保存する
+スケジューラーを再起動した場合は、状態ファイルから完了していないジョブだけを続きから処理する
+
+キューファイルの例:
+{
+  "defaults": {"headless": true, "capture_backend": "cdp", "use_chrome_profile": true},
+  "books": [
+    {"asin": "B0XXXXXXXX"},
+    {"id": "novel", "url": "https://read.amazon.co.jp/?asin=B0YYYYYYYY", "config": {"page_turn_direction": "right"}}
+  ]
+}
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+# ASINから本のURLを作るテンプレート
+DEFAULT_URL_TEMPLATE = "https://read.amazon.co.jp/?asin={asin}"
+
+# kindle_to_pdf.py のパス（このファイルと同じディレクトリ）
+KINDLE_TO_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kindle_to_pdf.py")
+
+
+def now():
+    """状態ファイルに記録する現在時刻"""
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def load_queue(queue_path, url_template=DEFAULT_URL_TEMPLATE):
+    """
+    キューファイルを読み込み、ジョブの一覧を作成する
+    
+    Args:
+        queue_path (str): キューファイルのパス（{"defaults": {...}, "books": [...]} または本のリスト）
+        url_template (str): ASINから本のURLを作るテンプレート（キューファイルの "url_template" が優先）
+    
+    Returns:
+        list: ジョブ（{"id", "url", "config"}）のリスト
+    
+    Raises:
+        ValueError: キューファイルの内容が不正な場合
+    """
+    with open(queue_path, "r", encoding="utf-8") as f:
+        queue = json.load(f)
+    if isinstance(queue, list):
+        queue = {"books": queue}
+    
+    defaults = queue.get("defaults", {})
+    url_template = queue.get("url_template", url_template)
+    
+    jobs = []
+    seen = set()
+    for index, book in enumerate(queue.get("books", []), 1):
+        if isinstance(book, str):
+            # 文字列だけの場合はURLまたはASIN
+            book = {"url": book} if "://" in book else {"asin": book}
+        
+        url = book.get("url") or (url_template.format(asin=book["asin"]) if book.get("asin") else None)
+        if not url:
+            raise ValueError(f"{index}冊目に asin または url がありません")
+        
+        job_id = book.get("id") or book.get("asin") or hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+        if job_id in seen:
+            raise ValueError(f"ジョブIDが重複しています: {job_id}")
+        seen.add(job_id)
+        
+        # 出力PDFのファイル名は本ごとの設定だけに従う（共通の設定にあると全ジョブが同じPDFに上書きしてしまうため）
+        config = {key: value for key, value in defaults.items() if key != "pdf_filename"}
+        config.update(book.get("config", {}))
+        jobs.append({"id": job_id, "url": url, "config": config})
+    return jobs
+
+
+class JobScheduler:
+    """キャプチャジョブの実行と状態ファイルの管理"""
+    
+    def __init__(self, jobs, state_path, base_config="config.json", output_root="books",
+                 workers=1, max_attempts=3, retry_delay=30, timeout=None):
+        """
+        初期化
+        
+        Args:
+            jobs (list): load_queue() が返すジョブのリスト
+            state_path (str): 状態ファイルのパス
+            base_config (str): ジョブの設定のベースにする設定ファイル
+            output_root (str): ジョブごとの出力ディレクトリ（output_root/<ジョブID>/）を作る場所
+            workers (int): 同時に実行するジョブ数
+            max_attempts (int): 1つのジョブの最大試行回数
+            retry_delay (float): 失敗してから再試行するまでの待ち時間（秒）
+            timeout (float): 1回の試行の制限時間（秒、Noneの場合は無制限）
+        """
+        self.jobs = jobs
+        self.state_path = state_path
+        self.base_config = base_config
+        self.output_root = output_root
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.state = self.load_state()
+    
+    def load_state(self):
+        """
+        状態ファイルを読み込む（前回の実行中に終了したジョブは待機中に戻す）
+        
+        Returns:
+            dict: ジョブID -> 状態
+        """
+        state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f).get("jobs", {})
+        
+        for job in self.jobs:
+            entry = state.setdefault(job["id"], {"status": "pending", "attempts": 0, "history": []})
+            entry["url"] = job["url"]
+            if entry["status"] == "running":
+                # スケジューラーが途中で終了した（ジャーナルから再開する）
+                entry["status"] = "pending"
+        return state
+    
+    def save_state(self):
+        """
+        状態ファイルを書き込む（一時ファイルに書いてから置き換える）
+        """
+        with self._lock:
+            data = {"updated_at": now(), "jobs": self.state}
+            temp_path = self.state_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.state_path)
+    
+    def _update(self, job_id, history=None, **values):
+        """
+        ジョブの状態を更新して保存
+        
+        Args:
+            job_id (str): ジョブID
+            history (dict): 試行の記録（指定した場合は履歴に追加し、合計時間も更新する）
+            **values: 更新する項目
+        """
+        with self._lock:
+            entry = self.state[job_id]
+            if history is not None:
+                # 履歴は状態ファイルの書き込みと同じロックの中で追加する（書き込み中の辞書を変更しない）
+                entry["history"].append(history)
+                entry["total_seconds"] = round(sum(h["seconds"] for h in entry["history"]), 1)
+            entry.update(values)
+        self.save_state()
+    
+    def write_job_config(self, job, output_dir):
+        """
+        ジョブ用の設定ファイルを書き込む（ベースの設定 + キューの設定 + 無人実行の設定）
+        
+        Returns:
+            str: 設定ファイルのパス
+        """
+        config = {}
+        if os.path.exists(self.base_config):
+            with open(self.base_config, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        config = {key: value for key, value in config.items() if not key.startswith("_comment_")}
+        config.update(job["config"])
+        config.update({
+            "output_dir": output_dir,
+            # ベースの設定の pdf_filename は使わない（本ごとに別のPDFにする）
+            "pdf_filename": job["config"].get("pdf_filename") or os.path.join(self.output_root, f"{job['id']}.pdf"),
+            "book_url": job["url"],
+            "unattended": True,
+            "session_journal": True,  # 再試行時に続きから再開するため
+        })
+        
+        config_path = os.path.join(output_dir, "job_config.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        return config_path
+    
+    def run_attempt(self, job, attempt):
+        """
+        ジョブを1回実行する（kindle_to_pdf.py を別プロセスで起動）
+        
+        Returns:
+            tuple: (成功したか, エラーメッセージ, PDFのパス)
+        """
+        output_dir = os.path.join(self.output_root, job["id"])
+        os.makedirs(output_dir, exist_ok=True)
+        config_path = self.write_job_config(job, output_dir)
+        with open(config_path, "r", encoding="utf-8") as f:
+            pdf_path = json.load(f)["pdf_filename"]
+        
+        command = [sys.executable, KINDLE_TO_PDF, "--config", config_path, "--unattended"]
+        if attempt > 1 and os.path.exists(os.path.join(output_dir, "session_journal.jsonl")):
+            command.append("--resume")
+        
+        log_path = os.path.join(output_dir, f"job_attempt{attempt}.log")
+        env = dict(os.environ, PYTHONIOENCODING="utf-8")
+        with open(log_path, "w", encoding="utf-8") as log:
+            try:
+                # 標準入力は閉じておく（入力待ちが残っていてもその場で失敗し、止まったままにならない）
+                process = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                         env=env, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                return False, f"{self.timeout}秒以内に終了しませんでした（ログ: {log_path}）", pdf_path
+        
+        if process.returncode != 0:
+            return False, f"終了コード {process.returncode}（ログ: {log_path}）", pdf_path
+        if not os.path.exists(pdf_path):
+            return False, f"PDFが作成されていません（ログ: {log_path}）", pdf_path
+        return True, None, pdf_path
+    
+    def run_job(self, job):
+        """
+        ジョブを成功するか試行回数の上限に達するまで実行する（ワーカースレッドで呼ばれる）
+        """
+        job_id = job["id"]
+        entry = self.state[job_id]
+        while entry["status"] != "done" and entry["attempts"] < self.max_attempts:
+            attempt = entry["attempts"] + 1
+            started = time.time()
+            print(f"▶ {job_id}: 開始（{attempt}/{self.max_attempts}回目）")
+            self._update(job_id, status="running", attempts=attempt, started_at=now(), finished_at=None)
+            
+            success, error, pdf_path = self.run_attempt(job, attempt)
+            
+            seconds = round(time.time() - started, 1)
+            self._update(job_id,
+                         history={"attempt": attempt, "seconds": seconds, "error": error},
+                         status="done" if success else "failed",
+                         finished_at=now(),
+                         error=error,
+                         pdf=pdf_path if success else None)
+            
+            if success:
+                print(f"✓ {job_id}: 完了（{seconds:.0f}秒） → {pdf_path}")
+            else:
+                print(f"✗ {job_id}: 失敗（{seconds:.0f}秒）: {error}")
+                if entry["attempts"] < self.max_attempts:
+                    time.sleep(self.retry_delay)
+        return entry
+    
+    def run(self):
+        """
+        完了していないジョブをすべて実行する
+        
+        Returns:
+            bool: すべてのジョブが完了した場合True
+        """
+        os.makedirs(self.output_root, exist_ok=True)
+        for job in self.jobs:
+            entry = self.state[job["id"]]
+            if entry["status"] == "failed" and entry["attempts"] >= self.max_attempts:
+                # 前回の実行で上限に達したジョブも、スケジューラーを起動し直したら改めて試す
+                entry["attempts"] = 0
+        self.save_state()
+        
+        pending = [job for job in self.jobs if self.state[job["id"]]["status"] != "done"]
+        done = len(self.jobs) - len(pending)
+        print(f"ジョブ: {len(self.jobs)}冊（完了済み {done}冊 / 実行 {len(pending)}冊、同時実行 {self.workers}）\n")
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(self.run_job, pending))
+        
+        self.print_summary()
+        return all(self.state[job["id"]]["status"] == "done" for job in self.jobs)
+    
+    def print_summary(self):
+        """
+        ジョブごとの結果を表で表示
+        """
+        status_labels = {"done": "完了", "failed": "失敗", "pending": "待機中", "running": "実行中"}
+        id_width = max([len(job["id"]) for job in self.jobs] + [10])
+        
+        print(f"\n{'='*60}")
+        print("ジョブの結果")
+        print(f"{'='*60}")
+        # 全角文字は表示幅が2文字分なので、その分だけ詰めて揃える
+        print(f"{'ジョブ':<{id_width - 3}}  {'試行':>2}  {'時間':>6}  状態")
+        for job in self.jobs:
+            entry = self.state[job["id"]]
+            seconds = f"{entry['total_seconds']:.0f}s" if entry.get("total_seconds") is not None else "-"
+            print(f"{job['id']:<{id_width}}  {entry['attempts']:>4}  {seconds:>8}  {status_labels[entry['status']]}")
+            if entry["status"] == "failed" and entry.get("error"):
+                print(f"    ✗ {entry['error']}")
+        
+        counts = {status: sum(1 for job in self.jobs if self.state[job["id"]]["status"] == status)
+                  for status in status_labels}
+        print(f"{'-'*60}")
+        print(f"完了: {counts['done']}冊 / 失敗: {counts['failed']}冊（状態ファイル: {self.state_path}）")
+
+
+def parse_args():
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="複数の本のキャプチャを無人で実行するジョブスケジューラー")
+    parser.add_argument("queue", help="キューファイル（JSON）")
+    parser.add_argument("--state", help="状態ファイル（省略時はキューファイル名.state.json）")
+    parser.add_argument("--config", default="config.json", help="ジョブの設定のベースにする設定ファイル")
+    parser.add_argument("--output-root", default="books", help="ジョブごとの出力ディレクトリを作る場所（既定: books）")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="同時に実行するジョブ数（2以上はヘッドレス + cdp バックエンドで使用。既定: 1）")
+    parser.add_argument("--retries", type=int, default=2, help="失敗したジョブを再試行する回数（既定: 2）")
+    parser.add_argument("--retry-delay", type=float, default=30, help="再試行までの待ち時間（秒、既定: 30）")
+    parser.add_argument("--timeout", type=float, help="1回の試行の制限時間（秒）")
+    parser.add_argument("--url-template", default=DEFAULT_URL_TEMPLATE,
+                        help=f"ASINから本のURLを作るテンプレート（既定: {DEFAULT_URL_TEMPLATE}）")
+    return parser.parse_args()
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+    
+    print("="*60)
+    print("Kindle to PDF ジョブスケジューラー")
+    print("="*60)
+    print()
+    
+    try:
+        jobs = load_queue(args.queue, args.url_template)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"エラー: キューファイルを読み込めません: {e}")
+        sys.exit(1)
+    
+    if args.workers > 1:
+        print("注意: 同時に実行するジョブは同じChromeプロファイルを使えないため、本ごとに chrome_user_data_dir を分けてください\n")
+    
+    scheduler = JobScheduler(jobs,
+                             state_path=args.state or os.path.splitext(args.queue)[0] + ".state.json",
+                             base_config=args.config,
+                             output_root=args.output_root,
+                             workers=args.workers,
+                             max_attempts=args.retries + 1,
+                             retry_delay=args.retry_delay,
+                             timeout=args.timeout)
+    sys.exit(0 if scheduler.run() else 1)
+
+
+if __name__ == "__main__":
+    main()
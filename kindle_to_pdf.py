@@ -7,51 +7,181 @@ Kindle本を自動的にスクリーンショットしてPDFに変換するア
 import os
 import time
 import json
+import argparse
 import hashlib
+import sys
+import statistics
+from collections import deque
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-import pyautogui
 from PIL import Image
 import img2pdf
 import re
-from pynput import keyboard
+from concurrent.futures import ProcessPoolExecutor, as_completed
+try:
+    from pynput import keyboard
+except Exception:  # 画面のない環境（ヘッドレスLinuxなど）ではキーボード監視を使わない
+    keyboard = None
+from image_writer import ImageWriterPool
+from png_optimizer import PNGOptimizer
+from pdf_stream import StreamingPDFWriter
+from session_journal import SessionJournal
+import make_pdf
+from frame_analysis import find_content_bbox, frame_quality
+from capture_backends import create_capture_backend
+from trace_timing import Tracer, traced
+from page_turner import PageTurner, METHODS as PAGE_TURN_METHODS
+from page_store import PageStore
+from page_indicator import PageIndicatorLocator, FIND_PAGE_INFO_JS
+from driver_cache import resolve_chromedriver
+from last_page_detector import LastPageDetector
+from page_events import PageEventMonitor
+from reduced_motion import AnimationSuppressor
+from virtual_display import VirtualDisplay
+import parallel_capture
 
 
 class KindleToPDF:
     """Kindle本をPDFに変換するクラス"""
     
-    def __init__(self, config_path="config.json"):
+    def __init__(self, config_path="config.json", resume=False, config_overrides=None):
         """
         初期化
         
         Args:
             config_path (str): 設定ファイルのパス
+            resume (bool): 中断したセッションをジャーナルから再開するか
+            config_overrides (dict): 設定ファイルの値を上書きする設定（並列キャプチャのセッションなどで使用）
         """
+        self.config_path = config_path
         self.config = self.load_config(config_path)
+        self.config.update(config_overrides or {})
         self.output_dir = self.config.get("output_dir", "kindle_screenshots")
         self.total_pages = self.config.get("total_pages", None)  # Noneの場合は自動検出
         self.page_delay = self.config.get("page_delay", 1.5)
-        self.capture_mode = None  # キャプチャモード（manual/auto_detect/auto_complete）
+        self.capture_mode = self.config.get("capture_mode")  # キャプチャモード（manual/auto_detect/auto_complete、Noneの場合は起動時に選択）
+        
+        # 無人実行（確認のための入力待ちをしない。ジョブスケジューラーから起動する場合など）
+        self.unattended = self.config.get("unattended", False)
+        self.book_url = self.config.get("book_url")  # 直接開く本のURL（Noneの場合は手動で本を開く）
+        self.ready_timeout = self.config.get("ready_timeout", 60)
+        
+        # ページ安定検出の設定（fixed: 固定待機 / frame: 縮小フレーム比較 / dom: DOMフィンガープリント / event: 注入したMutationObserver）
+        self.settle_mode = self.config.get("settle_mode", "fixed").lower()
+        self.settle_poll_interval = self.config.get("settle_poll_interval", 0.1)
+        self.settle_stable_polls = self.config.get("settle_stable_polls", 2)
+        self.settle_frame_threshold = self.config.get("settle_frame_threshold", 1.0)
+        self.settle_event_idle_ms = self.config.get("settle_event_idle_ms", 150)
+        self.page_events = None  # event モードでページに注入した監視スクリプト
+        
+        # ページめくりアニメーションの抑止（有効にできた場合は待機時間の上限を短くする）
+        self.suppress_animations = self.config.get("suppress_animations", False)
+        self.suppressed_page_delay = self.config.get("suppressed_page_delay", 0.6)
+        self.animations_suppressed = False
+        self.settle_times = []  # ページごとの実測安定待ち時間（秒）
+        self.last_settle_changed = None  # 直前の安定待ちでページの変化を検出したか（不明ならNone）
+        
+        # ページ送り（方向は起動時に一度だけ読み込み、方法は初回に探索して記憶する）
+        self.page_turn_direction = self.config.get("page_turn_direction", "left").lower()
+        self.page_turner = None
+        
+        # ページ番号表示の位置（最初に見つけた要素を記録し、以降はその要素だけを読む）
+        self.page_indicator = PageIndicatorLocator()
         
         # screenshot_regionの処理
         region = self.config.get("screenshot_region", None)
         self.screenshot_region = tuple(region) if region else None
         
+        # 仮想ディスプレイ（キャプチャごとにXvfbを起動し、Chromeと画面キャプチャ・キー操作をそのディスプレイで行う）
+        self.use_virtual_display = self.config.get("virtual_display", False)
+        self.virtual_display_size = self.config.get("virtual_display_size", [1920, 1080])
+        self.virtual_display = None
+        
+        # キャプチャバックエンド（pyautogui: デスクトップ画面 / cdp: ブラウザの描画結果をCDPで取得 / x11shm: X11の共有メモリ）
+        self.headless = self.config.get("headless", False)
+        if self.headless and self.use_virtual_display:
+            print("注意: 仮想ディスプレイを使用するため、Chromeはヘッドレスではなく仮想ディスプレイ上で起動します")
+            self.headless = False
+        self.capture_backend_name = self.config.get("capture_backend", "pyautogui").lower()
+        if self.headless and self.capture_backend_name in ("pyautogui", "x11shm"):
+            print("注意: ヘッドレスモードでは画面をキャプチャできないため、capture_backend を 'cdp' に切り替えます")
+            self.capture_backend_name = "cdp"
+        self.capture_backend = None
+        
+        # 自動クロップ（最初の数フレームからページ内容の範囲を推定して余白とUIを切り取る）
+        self.auto_crop = self.config.get("auto_crop", False)
+        self.auto_crop_sample_frames = self.config.get("auto_crop_sample_frames", 3)
+        self.auto_crop_padding = self.config.get("auto_crop_padding", 8)
+        self.auto_crop_update_region = self.config.get("auto_crop_update_region", False)
+        self.crop_box = None  # 推定したクロップ範囲 (left, top, right, bottom)
+        self._crop_resolved = False
+        self._crop_samples = []  # 範囲推定のために保存を保留しているフレーム
+        
+        # フレーム品質チェック（直後にもう1枚取得して比較し、ページめくり途中のフレームは撮り直す）
+        self.frame_check = self.config.get("frame_check", False)
+        self.frame_check_interval = self.config.get("frame_check_interval", 0.05)
+        self.frame_check_min_quality = self.config.get("frame_check_min_quality", 0.5)
+        self.frame_check_retries = self.config.get("frame_check_retries", 3)
+        self.frame_qualities = []  # ページごとの品質スコア
+        self.frame_recaptures = 0  # 撮り直した回数
+        self._midtone_history = deque(maxlen=10)  # 最近の正常なフレームの中間調の割合
+        
         self.driver = None
         self.images = []
-        self.last_page_state = None  # 最終ページ検出用
+        
+        # 最終ページ検出（直近のページ送りの履歴で指標の重みを調整し、複数回のページ送りで確認する）
+        self.last_page_detector = LastPageDetector(
+            weights=self.config.get("last_page_weights"),
+            threshold=self.config.get("last_page_threshold", 50),
+            confirm_attempts=self.config.get("last_page_confirm_attempts", 2),
+            history_size=self.config.get("last_page_history", 20))
+        self.last_page_recheck_delay = self.config.get("last_page_recheck_delay", 1.0)
         self.user_stop_requested = False  # ユーザーによる手動終了フラグ
         self.keyboard_listener = None  # キーボードリスナー
         
+        # 画像保存パイプライン（PNG圧縮と書き込みをバックグラウンドで行う）
+        self.encoder_workers = self.config.get("encoder_workers", 2)
+        self.encoder_queue_size = self.config.get("encoder_queue_size", 8)
+        self.image_writer = None
+        
+        # 2段階のPNG圧縮（キャプチャ時は最速のレベルで保存し、バックグラウンドで最大レベルに再圧縮する）
+        self.png_compress_level = self.config.get("png_compress_level", 1)
+        self.png_optimize = self.config.get("png_optimize", True)
+        self.png_optimize_workers = self.config.get("png_optimize_workers", 1)
+        self.png_optimize_reduce = self.config.get("png_optimize_reduce", True)
+        self.png_optimizer = None
+        
+        # PDFのエンコード方式（original: 画像をそのまま埋め込む / adaptive: ページごとに白黒・グレー・カラーを判定）
+        self.pdf_encoding = self.config.get("pdf_encoding", "original")
+        
+        # ストリーミングPDF（保存済みのページから順次PDFに追記する。適応エンコードはキャプチャ後に行うため併用しない）
+        self.streaming_pdf = self.config.get("streaming_pdf", True) and self.pdf_encoding != "adaptive"
+        self.pdf_writer = None
+        self.pdf_append_failures = set()  # ストリーミングPDFへの追記に失敗したページ番号
+        
         # 出力ディレクトリの作成
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # セッションジャーナル（中断したキャプチャの再開用）
+        self.resume = resume
+        self.start_page = 1  # 最初にキャプチャするページ番号（再開時は続きから）
+        self.journal = SessionJournal(self.output_dir) if self.config.get("session_journal", True) else None
+        
+        # 内容アドレス方式のページストア（同じ内容のフレームは1回だけ保存し、ページの並びはマニフェストに記録する）
+        self.page_store = PageStore(self.output_dir) if self.config.get("page_store", False) else None
+        
+        # フェーズごとの所要時間の計測（無効時はほぼオーバーヘッドなし）
+        self.tracer = Tracer(enabled=self.config.get("trace_timing", False))
+        self.trace_file = self.config.get("trace_file") or os.path.join(self.output_dir, "trace_events.json")
+        
+        # 並列キャプチャ（ページ範囲を分割して複数のヘッドレスChromeで同時にキャプチャする）
+        self.parallel_sessions = max(1, int(self.config.get("parallel_sessions", 1)))
+        self.jump_url_template = self.config.get("jump_url_template")  # 例: "https://.../?page={page}"
+        
     def load_config(self, config_path):
         """
         設定ファイルを読み込む
@@ -73,6 +203,15 @@ class KindleToPDF:
         """
         キーボードリスナーを開始（Ctrl+Xで終了）
         """
+        if self.virtual_display:
+            # 仮想ディスプレイにはキーボードがないため監視しない
+            print("\n注意: 仮想ディスプレイで実行中のため、Ctrl+X での終了は無効です（Ctrl+C で中断できます）\n")
+            return
+        
+        if keyboard is None:
+            print("\n注意: キーボード監視を利用できないため、Ctrl+X での終了は無効です（Ctrl+C で中断できます）\n")
+            return
+        
         def on_press(key):
             try:
                 # Ctrl+X の検出
@@ -98,14 +237,20 @@ class KindleToPDF:
             self.keyboard_listener.stop()
             self.keyboard_listener = None
     
+    @traced("setup_browser")
     def setup_browser(self):
         """
         Chromeブラウザをセットアップする
         """
         print("ブラウザを起動しています...")
+        started = time.perf_counter()
         
-        # ChromeDriverを自動的にダウンロード・セットアップ
-        service = Service(ChromeDriverManager().install())
+        # 仮想ディスプレイはChromeと pyautogui より先に用意する（どちらも起動・インポート時の DISPLAY を使う）
+        if self.use_virtual_display and self.virtual_display is None:
+            self.start_virtual_display()
+        
+        # ChromeDriver（解決結果をキャッシュし、Chromeのバージョンが変わった場合のみダウンロードする）
+        service = Service(resolve_chromedriver(self.config.get("chromedriver_path"), self.tracer))
         
         # ブラウザオプションの設定
         options = webdriver.ChromeOptions()
@@ -140,8 +285,23 @@ class KindleToPDF:
         if self.config.get("fullscreen", False):
             options.add_argument("--start-maximized")
         
+        # 仮想ディスプレイ（ウィンドウマネージャーがないため、画面全体に合わせて配置する）
+        if self.virtual_display:
+            width, height = self.virtual_display.size
+            options.add_argument(f"--display={self.virtual_display.display}")
+            options.add_argument("--window-position=0,0")
+            options.add_argument(f"--window-size={width},{height}")
+        
+        # ヘッドレスモード（画面のないLinuxサーバー向け。ログイン済みのChromeプロファイルと併用する）
+        if self.headless:
+            width, height = self.config.get("window_size", [1920, 1080])
+            options.add_argument("--headless=new")
+            options.add_argument(f"--window-size={width},{height}")
+            print(f"ヘッドレスモードで起動します（{width}x{height}）")
+        
         try:
-            self.driver = webdriver.Chrome(service=service, options=options)
+            with self.tracer.span("setup_browser.launch"):
+                self.driver = webdriver.Chrome(service=service, options=options)
             
             # Selenium検出を回避するJavaScriptを実行
             self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
@@ -152,12 +312,33 @@ class KindleToPDF:
                 '''
             })
             
-            print("✓ ブラウザの起動に成功しました")
+            # ページ変化の監視スクリプト（event モードのみ。以降に開くすべてのドキュメントに注入される）
+            if self.settle_mode == "event":
+                self.page_events = PageEventMonitor(self.driver)
+                self.page_events.install()
+            
+            if self.suppress_animations:
+                self.apply_animation_suppression()
+            
+            print(f"✓ ブラウザの起動に成功しました（{time.perf_counter() - started:.1f}秒）")
             
         except Exception as e:
             print(f"✗ ブラウザの起動に失敗しました: {e}")
             raise
         
+    def start_virtual_display(self):
+        """
+        このセッション専用の仮想ディスプレイ（Xvfb）を起動する
+        """
+        self.virtual_display = VirtualDisplay(self.virtual_display_size)
+        try:
+            display = self.virtual_display.start()
+        except Exception:
+            self.virtual_display = None
+            raise
+        width, height = self.virtual_display.size
+        print(f"✓ 仮想ディスプレイを起動しました: DISPLAY={display}（{width}x{height}）")
+    
     def open_kindle_cloud_reader(self):
         """
         Kindle Cloud Readerを開く
@@ -165,7 +346,14 @@ class KindleToPDF:
         # URLを開くかスキップするか
         skip_url = self.config.get("skip_url_open", False)
         
-        if not skip_url:
+        if self.resume:
+            print("※ 再開モード: 本を開いておけば、ページ位置はジャーナルの記録から自動で合わせます\n")
+        
+        if self.book_url:
+            self.open_book_url()
+        elif self.unattended:
+            raise ValueError("無人実行では本のURL（book_url または --url）を指定してください")
+        elif not skip_url:
             print("Kindle Cloud Readerを開いています...")
             
             # 日本のAmazonを使用（設定で変更可能）
@@ -246,9 +434,56 @@ class KindleToPDF:
             print("既存のブラウザウィンドウに接続しています...")
             time.sleep(1)
         
+        # 本のタブが新しく開かれた場合は、そのタブにもアニメーションの抑止とページ変化の監視を適用する
+        if self.suppress_animations:
+            self.apply_animation_suppression()
+        if self.page_events:
+            try:
+                self.page_events.install()
+            except Exception as e:
+                print(f"  警告: ページ変化の監視スクリプトを注入できませんでした: {e}")
+        
         # ブラウザをアクティブにする
         time.sleep(1)
     
+    def apply_animation_suppression(self):
+        """
+        現在のタブのページめくりアニメーションを無効にし、待機時間の上限を suppressed_page_delay に短くする
+        """
+        if not AnimationSuppressor(self.driver).apply():
+            return
+        
+        if not self.animations_suppressed:
+            self.animations_suppressed = True
+            if self.suppressed_page_delay < self.page_delay:
+                print(f"✓ ページめくりアニメーションを無効にしました（待機時間: {self.page_delay}秒 → {self.suppressed_page_delay}秒）")
+                self.page_delay = self.suppressed_page_delay
+            else:
+                print("✓ ページめくりアニメーションを無効にしました")
+    
+    def open_book_url(self):
+        """
+        book_url の本を直接開く
+        無人実行ではログイン済みのChromeプロファイルが必要で、ページ番号表示が読めるまで待ってから開始する
+        """
+        print(f"本を開いています: {self.book_url}")
+        self.driver.get(self.book_url)
+        
+        if not self.unattended:
+            print("\n本が開いたら1ページ目に移動し、このターミナルに戻ってEnterキーを押してください。")
+            input()
+            return
+        
+        deadline = time.time() + self.ready_timeout
+        while time.time() < deadline:
+            if "signin" in self.driver.current_url:
+                raise RuntimeError("ログインが必要です（use_chrome_profile でログイン済みのChromeプロファイルを指定してください）")
+            if self.page_indicator.read(self.driver):
+                print("✓ 本の読み込みを確認しました")
+                return
+            time.sleep(1)
+        print(f"警告: {self.ready_timeout}秒以内にページ番号表示を確認できませんでした。このままキャプチャを開始します")
+    
     def select_capture_mode(self):
         """
         キャプチャモードを選択する
@@ -296,17 +531,14 @@ class KindleToPDF:
         print("\n総ページ数を自動検出中...")
         
         try:
-            # 複数のパターンでページ情報を探す
-            selectors = [
-                # Kindle Cloud Readerのページ表示（例: "5 / 196"）
-                "div[class*='page']",
-                "span[class*='page']",
-                "div[class*='position']",
-                "div[class*='location']",
-                # より広範囲な検索
-                "div", "span"
-            ]
+            # ページ番号表示の要素を探す（見つけた位置は記録され、以降のページ状態取得でも使われる）
+            page_info = self.page_indicator.read(self.driver)
+            if page_info:
+                print(f"  ページ番号表示を検出: {page_info['text']}（{self.page_indicator.path}）")
+                print(f"  ✓ 総ページ数を検出: {page_info['total']}ページ")
+                return page_info['total']
             
+            # 見つからない場合のみ、ページ全体のソースを正規表現で検索する
             # 正規表現パターン（例: "5 / 196", "5/196", "Page 5 of 196"）
             patterns = [
                 r'(\d+)\s*/\s*(\d+)',  # "5 / 196" または "5/196"
@@ -315,7 +547,7 @@ class KindleToPDF:
                 r'位置\s+\d+\s*/\s*(\d+)',  # "位置 500 / 3000"（位置から推定）
             ]
             
-            # ページ全体のテキストを取得して検索
+            print("  ページ番号表示が見つからないため、ページソースを検索します...")
             page_source = self.driver.page_source
             print(f"  ページソースを取得しました（{len(page_source)}文字）")
             
@@ -336,55 +568,6 @@ class KindleToPDF:
                     print(f"  ✓ 総ページ数を検出: {total}ページ")
                     return total
             
-            # JavaScriptで要素を検索
-            print("  JavaScriptで要素を検索中...")
-            js_code = """
-            function findPageInfo() {
-                // すべてのテキストノードを検索
-                const walker = document.createTreeWalker(
-                    document.body,
-                    NodeFilter.SHOW_TEXT,
-                    null,
-                    false
-                );
-                
-                const patterns = [
-                    /(\d+)\s*\/\s*(\d+)/,
-                    /Page\s+(\d+)\s+of\s+(\d+)/i,
-                    /(\d+)\s+\/\s+(\d+)\s+ページ/
-                ];
-                
-                let results = [];
-                let node;
-                while (node = walker.nextNode()) {
-                    const text = node.textContent.trim();
-                    for (let pattern of patterns) {
-                        const match = text.match(pattern);
-                        if (match) {
-                            results.push({
-                                text: text,
-                                current: parseInt(match[1]),
-                                total: parseInt(match[2])
-                            });
-                        }
-                    }
-                }
-                
-                return results;
-            }
-            
-            return findPageInfo();
-            """
-            
-            page_info = self.driver.execute_script(js_code)
-            
-            if page_info and len(page_info) > 0:
-                print(f"  JavaScriptで検出: {page_info}")
-                # 最大の総ページ数を取得
-                total = max([info['total'] for info in page_info])
-                print(f"  ✓ 総ページ数を検出: {total}ページ")
-                return total
-            
             print("  ✗ ページ数を検出できませんでした")
             return None
             
@@ -394,304 +577,739 @@ class KindleToPDF:
             traceback.print_exc()
             return None
     
+    @traced("get_page_state")
     def get_page_state(self):
         """
         現在のページ状態を取得
+        ハッシュはブラウザ内で計算し、小さなダイジェストとページ番号情報だけを1回の通信で受け取る
+        ページ番号表示は記録した位置の要素だけを読む（見つからない場合のみ全体を走査）
         
         Returns:
             dict: ページの状態情報
         """
         state = {
-            'url': self.driver.current_url,
-            'page_source_hash': hashlib.md5(self.driver.page_source.encode()).hexdigest(),
+            'url': None,
+            'page_source_hash': None,
             'page_content_hash': None,
             'page_info': None,
             'body_text_hash': None
         }
         
         try:
-            # ページコンテンツのハッシュを取得（より正確）
-            js_result = self.driver.execute_script("""
-                // ページ表示領域のテキスト内容を取得
-                var contentElement = document.querySelector('[id*="reader"], [class*="reader"], [class*="content"]');
-                if (contentElement) {
-                    return {
-                        content: contentElement.innerText,
-                        html: contentElement.innerHTML.substring(0, 1000)
-                    };
+            js_result = self.driver.execute_script(FIND_PAGE_INFO_JS + """
+                // 53bitハッシュ（cyrb53）を16進文字列で返す
+                function digest(str) {
+                    var h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+                    for (var i = 0; i < str.length; i++) {
+                        var ch = str.charCodeAt(i);
+                        h1 = Math.imul(h1 ^ ch, 2654435761);
+                        h2 = Math.imul(h2 ^ ch, 1597334677);
+                    }
+                    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+                    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+                    return (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(16);
                 }
                 
-                // フォールバック: body全体
+                // ページ表示領域のテキスト内容（見つからなければbody全体）
+                var contentElement = document.querySelector('[id*="reader"], [class*="reader"], [class*="content"]') || document.body;
+                var content = contentElement.innerText;
+                
                 return {
-                    content: document.body.innerText,
-                    html: document.body.innerHTML.substring(0, 1000)
+                    url: location.href,
+                    source_hash: digest(document.documentElement.outerHTML),
+                    content_hash: digest(content),
+                    body_text_hash: digest(content.substring(0, 500)),
+                    // ページ番号情報（例: "5 / 196"）
+                    page_indicator: findPageInfo(arguments[0])
                 };
-            """)
+            """, self.page_indicator.path)
             
             if js_result:
-                state['page_content_hash'] = hashlib.md5(js_result['content'].encode()).hexdigest()
-                state['body_text_hash'] = hashlib.md5(js_result['content'][:500].encode()).hexdigest()
-            
-            # ページ番号情報を取得
-            page_info = self.driver.execute_script("""
-                function findPageInfo() {
-                    var walker = document.createTreeWalker(
-                        document.body,
-                        NodeFilter.SHOW_TEXT,
-                        null,
-                        false
-                    );
-                    
-                    var pattern = /(\\d+)\\s*\\/\\s*(\\d+)/;
-                    var node;
-                    while (node = walker.nextNode()) {
-                        var text = node.textContent.trim();
-                        var match = text.match(pattern);
-                        if (match) {
-                            return {
-                                text: text,
-                                current: parseInt(match[1]),
-                                total: parseInt(match[2])
-                            };
-                        }
-                    }
-                    return null;
-                }
-                return findPageInfo();
-            """)
-            
-            state['page_info'] = page_info
+                state['url'] = js_result['url']
+                state['page_source_hash'] = js_result['source_hash']
+                state['page_content_hash'] = js_result['content_hash']
+                state['body_text_hash'] = js_result['body_text_hash']
+                state['page_info'] = self.page_indicator.remember(js_result['page_indicator'])
             
         except Exception as e:
             pass  # エラーは無視
         
+        if state['url'] is None:
+            # スクリプトが失敗した場合でもURL比較だけはできるようにする
+            try:
+                state['url'] = self.driver.current_url
+            except Exception:
+                pass
+        
         return state
     
-    def is_last_page(self, before_state, after_state):
+    def confirm_last_page(self):
         """
-        最終ページかどうかを判定
-        
-        Args:
-            before_state: ページ送り前の状態
-            after_state: ページ送り後の状態
+        ページ送り後の状態から最終ページかどうかを判定する（ページ送りの前に last_page_detector.begin() を呼んでおく）
+        ページが変わっていないように見える場合は、描画が遅れている可能性があるため少し待って状態を再確認し、
+        それでも変わらなければもう一度ページ送りを試す（last_page_confirm_attempts 回続いたら最終ページ）
         
         Returns:
             tuple: (is_last, reasons, confidence)
         """
-        reasons = []
-        confidence = 0
-        
-        # 1. URL比較
-        if before_state['url'] == after_state['url']:
-            reasons.append("URL変化なし")
-            confidence += 30
-        
-        # 2. ページコンテンツのハッシュ比較（最重要）
-        if before_state['page_content_hash'] and after_state['page_content_hash']:
-            if before_state['page_content_hash'] == after_state['page_content_hash']:
-                reasons.append("コンテンツ変化なし")
-                confidence += 40
-        
-        # 3. body全体のハッシュ比較
-        if before_state['page_source_hash'] == after_state['page_source_hash']:
-            reasons.append("ソース変化なし")
-            confidence += 10
-        
-        # 4. ページ番号情報の比較
-        if before_state['page_info'] and after_state['page_info']:
-            before_page = before_state['page_info']['current']
-            after_page = after_state['page_info']['current']
-            total_pages = before_state['page_info']['total']
-            
-            if before_page == after_page:
-                reasons.append(f"ページ番号変化なし ({before_page}/{total_pages})")
-                confidence += 20
+        detector = self.last_page_detector
+        status, confidence, reasons = detector.observe(self.get_page_state())
+        
+        while status == "suspect":
+            print(f"  最終ページの可能性があります（信頼度 {confidence}%）。状態を再確認します...")
+            time.sleep(self.last_page_recheck_delay)
+            status, confidence, reasons = detector.observe(self.get_page_state(), new_attempt=False)
+            if status != "suspect":
+                print("  ✓ ページが変わっていました（描画待ち）")
+                break
             
-            if before_page == total_pages or after_page == total_pages:
-                reasons.append(f"最終ページ番号到達 ({total_pages}/{total_pages})")
-                confidence += 30
+            # ページが動いていないことを確認済みなので、もう一度送っても二重送りにはならない
+            print(f"  もう一度ページ送りを試します（{detector.attempts + 1}/{detector.confirm_attempts}回目）")
+            if not self.next_page():
+                return True, reasons + ["ページ送り失敗"], confidence
+            status, confidence, reasons = detector.observe(self.get_page_state())
         
-        # 判定: confidence が 50 以上なら最終ページ
-        is_last = confidence >= 50
+        return status == "last", reasons, confidence
         
-        return is_last, reasons, confidence
+    def get_capture_backend(self):
+        """
+        キャプチャバックエンドを取得（初回に作成）
         
-    def take_screenshot(self, page_num):
+        Returns:
+            キャプチャバックエンド（grab(region) でフレームを返す）
+        """
+        if self.capture_backend is None:
+            self.capture_backend = create_capture_backend(self.capture_backend_name, self.driver, self.tracer)
+            print(f"  キャプチャバックエンド: {self.capture_backend.name}")
+        return self.capture_backend
+    
+    @traced("take_screenshot")
+    def take_screenshot(self, page_num, page_info=None):
         """
         ページのスクリーンショットを撮る
         
         Args:
             page_num (int): ページ番号
+            page_info (dict): 現在のページ番号表示（ジャーナルに記録する。Noneの場合は必要に応じて取得）
             
         Returns:
             str: スクリーンショットのファイルパス
         """
         screenshot_path = os.path.join(self.output_dir, f"page_{page_num:04d}.png")
+        captured_at = time.time()
+        
+        # 指定された領域のみ（Noneの場合は画面全体）をキャプチャ
+        with self.tracer.span("take_screenshot.grab", page=page_num):
+            frame = self.get_capture_backend().grab(self.screenshot_region)
         
-        if self.screenshot_region:
-            # 指定された領域のみスクリーンショット
-            pyautogui.screenshot(screenshot_path, region=self.screenshot_region)
+        quality = None
+        if self.frame_check:
+            frame, quality = self.check_frame_quality(frame)
+        
+        if self.journal and page_info is None:
+            # 再開時の位置合わせに使うページ番号表示を記録する（番号表示の要素だけを読み、DOM全体は取得しない）
+            try:
+                page_info = self.page_indicator.read(self.driver)
+            except Exception:
+                page_info = None
+        
+        meta = {
+            'page_info': page_info,
+            'settle_time': self.settle_times[-1] if self.settle_times else None,
+            'captured_at': round(captured_at, 3)
+        }
+        if quality:
+            meta['quality'] = quality['score']
+            meta['recaptures'] = quality['recaptures']
+        
+        if self.auto_crop and not self._crop_resolved:
+            # 最初の数フレームは保存を保留して、ページ内容の範囲を推定する
+            self._crop_samples.append((frame, screenshot_path, page_num, meta))
+            if len(self._crop_samples) >= self.auto_crop_sample_frames:
+                # ページストアでは保存先が内容で決まるため、確定したパスを返す
+                return self.resolve_crop_box().get(screenshot_path, screenshot_path)
+            return screenshot_path
+        
+        if self.crop_box:
+            frame = frame.crop(self.crop_box)
+        
+        with self.tracer.span("take_screenshot.submit", page=page_num):
+            return self._submit_frame(frame, screenshot_path, page_num, meta)
+    
+    @traced("take_screenshot.quality")
+    def check_frame_quality(self, frame):
+        """
+        フレームの品質を確認し、ページめくりの途中や描画途中と判定されたら撮り直す
+        直後に取得した2枚目のフレームとの差と、最近の正常なフレームと比べた中間調の増加（文字の重なり）から判定する
+        
+        Args:
+            frame (PIL.Image.Image): 取得したフレーム
+        
+        Returns:
+            tuple: (保存するフレーム, 品質 {"score", "diff", "midtone", "recaptures"})
+        """
+        baseline = statistics.median(self._midtone_history) if len(self._midtone_history) >= 3 else None
+        
+        for attempt in range(self.frame_check_retries + 1):
+            time.sleep(self.frame_check_interval)
+            second = self.get_capture_backend().grab(self.screenshot_region)
+            quality = frame_quality(frame, second, baseline)
+            quality['recaptures'] = attempt
+            
+            # 2枚目の方が新しく安定に近いので、2枚目を保存する
+            frame = second
+            if quality['score'] >= self.frame_check_min_quality:
+                break
+            if attempt < self.frame_check_retries:
+                print(f"  ⚠️ ページめくり途中のフレームを検出しました（品質 {quality['score']:.2f}）。撮り直します...")
         else:
-            # 画面全体のスクリーンショット
-            pyautogui.screenshot(screenshot_path)
+            print(f"  ⚠️ {self.frame_check_retries}回撮り直しても品質が基準に達しませんでした（品質 {quality['score']:.2f}）")
         
-        return screenshot_path
+        if quality['score'] >= self.frame_check_min_quality:
+            self._midtone_history.append(quality['midtone'])
+        self.frame_qualities.append(quality['score'])
+        self.frame_recaptures += quality['recaptures']
+        return frame, quality
     
-    def next_page(self):
+    def _submit_frame(self, frame, path, page_num, meta):
         """
-        次のページに移動する
+        フレームを保存キューに渡す（PNGの圧縮と書き込みはバックグラウンドのワーカーが行う）
+        
+        Returns:
+            str: 保存先のパス（ページストアでは内容のダイジェストから決まる）
         """
-        print(f"\n  --- ページ送り開始 ---")
+        if self.image_writer is None:
+            self.image_writer = ImageWriterPool(self.encoder_workers, self.encoder_queue_size, self.tracer,
+                                                compress_level=self.png_compress_level)
+        
+        if self.png_optimize and self.png_optimizer is None:
+            self.png_optimizer = PNGOptimizer(self.png_optimize_workers, reduce=self.png_optimize_reduce, tracer=self.tracer)
+        
+        if self.streaming_pdf and self.pdf_writer is None:
+            self.pdf_writer = StreamingPDFWriter(os.path.join(self.output_dir, "capture.pdf.part"))
         
-        # ページめくり方向を設定から取得
-        page_turn_direction = self.config.get("page_turn_direction", "left").lower()
-        if page_turn_direction == "left":
-            arrow_key = Keys.ARROW_LEFT
-            arrow_name = "ArrowLeft"
-            arrow_code = 37
-            pyautogui_key = "left"
-            direction_text = "左"
-        elif page_turn_direction == "right":
-            arrow_key = Keys.ARROW_RIGHT
-            arrow_name = "ArrowRight"
-            arrow_code = 39
-            pyautogui_key = "right"
-            direction_text = "右"
+        if self.page_store:
+            # 同じ内容のフレームは同じファイルになり、保存済みなら書き込まない
+            meta = dict(meta, digest=PageStore.digest(frame))
+            path = self.page_store.path_for(meta['digest'])
+        
+        self.image_writer.submit(frame, path, lambda saved_path: self._on_frame_saved(frame, saved_path, page_num, meta),
+                                 skip_existing=self.page_store is not None)
+        return path
+    
+    def resolve_crop_box(self):
+        """
+        保留中のフレームからページ内容の範囲を推定し、保留していたフレームを保存する
+        auto_crop_update_region が有効な場合は、以降のキャプチャ領域自体を狭める
+        
+        Returns:
+            dict: 保留中に返したパス -> 実際の保存先（ページストアでは異なる）
+        """
+        samples, self._crop_samples = self._crop_samples, []
+        self._crop_resolved = True
+        if not samples:
+            return {}
+        
+        box = find_content_bbox([sample[0] for sample in samples], padding=self.auto_crop_padding)
+        width, height = samples[0][0].size
+        
+        if box and box != (0, 0, width, height):
+            cropped = (box[2] - box[0]) * (box[3] - box[1]) / (width * height)
+            print(f"  ✓ 自動クロップ: {box}（元の面積の{cropped:.0%}）")
+            
+            if self.auto_crop_update_region:
+                # 以降は内容の範囲だけをキャプチャする
+                offset_x, offset_y = self.screenshot_region[:2] if self.screenshot_region else (0, 0)
+                self.screenshot_region = (offset_x + box[0], offset_y + box[1], box[2] - box[0], box[3] - box[1])
+                print(f"  ✓ キャプチャ領域を更新: {self.screenshot_region}")
+            else:
+                self.crop_box = box
         else:
-            print(f"  ✗ エラー: 不正な page_turn_direction 設定: {page_turn_direction}")
-            print(f"     'left' または 'right' を指定してください")
-            return False
+            print("  自動クロップ: 内容の範囲を特定できなかったため、クロップしません")
+            box = None
+        
+        saved_paths = {}
+        for frame, path, page_num, meta in samples:
+            saved_paths[path] = self._submit_frame(frame.crop(box) if box else frame, path, page_num, meta)
+        self.images = [saved_paths.get(path, path) for path in self.images]
+        return saved_paths
+    
+    def _on_frame_saved(self, frame, path, page_num, meta):
+        """
+        フレームの保存完了後の処理（保存ワーカーのスレッドで呼ばれる）
         
-        print(f"  ページめくり方向: {direction_text}矢印キー")
+        Args:
+            frame (PIL.Image.Image): 保存したフレーム
+            path (str): 保存先のファイルパス
+            page_num (int): ページ番号
+            meta (dict): ジャーナルに記録する情報
+        """
+        if self.journal:
+            meta = dict(meta)
+            digest = meta.pop('digest', None) or hashlib.sha1(frame.tobytes()).hexdigest()
+            self.journal.record_page(page_num, path, digest, **meta)
+        
+        # 再圧縮する場合は、再圧縮が終わってからPDFへ追記する（PDFにはPNGの圧縮データがそのまま埋め込まれるため）
+        if self.png_optimizer:
+            self.png_optimizer.submit(path, lambda optimized_path: self._append_to_pdf(optimized_path, page_num))
+        else:
+            self._append_to_pdf(path, page_num)
+    
+    def _append_to_pdf(self, path, page_num):
+        """
+        保存が終わったページから順にPDFへ追記する（ストリーミングPDFが有効な場合）
+        """
+        if self.pdf_writer:
+            try:
+                with self.tracer.span("pdf_writer.add_page", page=page_num):
+                    self.pdf_writer.add_image_file(path, page_num)
+            except Exception as e:
+                # 画像は保存済みのため、PDFの作成時に画像から作り直す
+                self.pdf_append_failures.add(page_num)
+                print(f"  ✗ {page_num}ページ目をPDFに追記できませんでした: {e}")
+    
+    @traced("flush_image_writer")
+    def flush_image_writer(self):
+        """
+        保存待ちのスクリーンショットをすべてディスクに書き込む
+        保存に失敗した画像は self.images から除外する
+        """
+        if self._crop_samples:
+            self.resolve_crop_box()
+        
+        if self.image_writer is None:
+            return
+        
+        pending = self.image_writer.pending()
+        if pending:
+            print(f"  保存待ちの画像を書き込んでいます（{pending}枚）...")
+        self.image_writer.flush()
+        
+        failed = {path for path, _ in self.image_writer.take_errors()}
+        if failed:
+            print(f"  警告: {len(failed)}枚の画像を保存できなかったため除外します")
+            self.images = [path for path in self.images if path not in failed]
+        
+        if self.png_optimizer:
+            pending = self.png_optimizer.pending()
+            if pending:
+                print(f"  画像を再圧縮しています（残り{pending}枚）...")
+            self.png_optimizer.flush()
+            errors = self.png_optimizer.take_callback_errors()
+            if errors:
+                print(f"  警告: 再圧縮後の処理に失敗した画像が{len(errors)}枚あります")
+        
+        if self.page_store and self.images:
+            self.page_store.write_manifest(self.images)
+    
+    def is_adaptive_settle(self):
+        """
+        安定検出モード（frame/dom/event）が有効かどうか
         
-        # ブラウザが有効か確認
+        Returns:
+            bool: 固定待機以外のモードならTrue
+        """
+        return self.settle_mode in ("frame", "dom", "event")
+    
+    def get_settle_signal(self):
+        """
+        ページ安定判定用の軽量なシグナルを取得
+        
+        Returns:
+            bytes, str or int: 比較用シグナル（取得失敗時はNone）
+        """
         try:
-            # 現在のURLを確認
-            current_url = self.driver.current_url
-            print(f"  現在のURL: {current_url[:80]}...")
+            if self.settle_mode == "event":
+                # 注入したスクリプトが数えているDOMの変更回数
+                return self.page_events.counter() if self.page_events else None
             
-            # ブラウザウィンドウを強制的にアクティブにする
-            self.driver.switch_to.window(self.driver.current_window_handle)
-            print(f"  ✓ ウィンドウハンドルに切り替え完了")
+            if self.settle_mode == "frame":
+                # 縮小したグレースケールフレーム（64x64）を比較に使う
+                backend = self.get_capture_backend()
+                if hasattr(backend, "grab_signal"):
+                    # 共有メモリから直接間引く（ポーリングごとにフレームを確保しない）
+                    return backend.grab_signal(self.screenshot_region)
+                frame = backend.grab(self.screenshot_region)
+                return frame.convert("L").resize((64, 64), Image.BILINEAR, reducing_gap=2.0).tobytes()
             
-            # Seleniumでブラウザを前面に持ってくる
-            self.driver.execute_script("window.focus();")
-            print(f"  ✓ window.focus() 実行完了")
+            if self.settle_mode == "dom":
+                return self.get_dom_fingerprint()
+        except Exception:
+            pass  # 取得できない場合は待機を継続
+        
+        return None
+    
+    def get_dom_fingerprint(self):
+        """
+        ページ表示領域のテキストと画像の指紋を取得（ブラウザ内で計算し、短い文字列だけを受け取る）
+        
+        Returns:
+            str: 指紋（取得失敗時はNone）
+        """
+        try:
+            return self.driver.execute_script("""
+                function fnv(str) {
+                    var h = 0x811c9dc5;
+                    for (var i = 0; i < str.length; i++) {
+                        h ^= str.charCodeAt(i);
+                        h = Math.imul(h, 0x01000193) >>> 0;
+                    }
+                    return h.toString(16);
+                }
+                var root = document.querySelector('[id*="reader"], [class*="reader"], [class*="content"]') || document.body;
+                var images = Array.prototype.map.call(document.images, function(img) {
+                    return img.currentSrc + (img.complete ? '' : '~');
+                }).join('|');
+                return document.readyState + ':' + fnv(root.innerText) + ':' + fnv(images);
+            """)
+        except Exception:
+            return None
+    
+    def _settle_signal_differs(self, a, b):
+        """
+        2つの安定判定シグナルが異なるかどうか
+        
+        Args:
+            a: シグナル
+            b: シグナル
+        
+        Returns:
+            bool: 異なる場合True
+        """
+        if a is None or b is None:
+            return a is not b
+        
+        if isinstance(a, bytes) and isinstance(b, bytes) and len(a) == len(b):
+            # フレームは平均輝度差がしきい値を超えた場合のみ変化とみなす
+            diff = sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+            return diff > self.settle_frame_threshold
+        
+        return a != b
+    
+    @traced("wait_for_page_settle")
+    def wait_for_page_settle(self, baseline=None):
+        """
+        ページ送り後、表示が安定するまで待機する
+        page_delay を上限とし、シグナルが変化して落ち着いた時点で戻る
+        
+        Args:
+            baseline: ページ送り前のシグナル（Noneの場合は変化を待たずに安定のみ確認）
+        
+        Returns:
+            float: 実測の待機時間（秒）（ページが変わったかどうかは self.last_settle_changed に記録）
+        """
+        start = time.perf_counter()
+        self.last_settle_changed = None
+        
+        if not self.is_adaptive_settle():
+            time.sleep(self.page_delay)
+            return time.perf_counter() - start
+        
+        if self.settle_mode == "event" and self.page_events:
+            # ページ内で変更を待ち、落ち着いた瞬間に戻る（ポーリングの通信なし）
+            try:
+                changed = self.page_events.wait_for_change(baseline, self.settle_event_idle_ms, self.page_delay)
+                if baseline is not None:
+                    self.last_settle_changed = changed
+                return time.perf_counter() - start
+            except Exception as e:
+                # ドキュメントの再読み込みなどでスクリプトが中断された場合は、残り時間だけ待つ
+                print(f"  ページ変化の待機に失敗しました（{e}）。固定時間待機します")
+                time.sleep(max(0.0, start + self.page_delay - time.perf_counter()))
+                return time.perf_counter() - start
+        
+        deadline = start + self.page_delay
+        changed = baseline is None
+        previous = None
+        stable_polls = 0
+        
+        while True:
+            signal = self.get_settle_signal()
             
-            # 少し待ってフォーカスが移るのを確実にする
-            time.sleep(0.5)
+            if signal is not None:
+                if not changed and self._settle_signal_differs(signal, baseline):
+                    changed = True
+                
+                if changed and previous is not None and not self._settle_signal_differs(signal, previous):
+                    stable_polls += 1
+                    if stable_polls >= self.settle_stable_polls:
+                        break
+                else:
+                    stable_polls = 0
+                previous = signal
             
-        except Exception as e:
-            print(f"  ✗ エラー: ブラウザのフォーカス切り替えに失敗: {e}")
-            return False
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(self.settle_poll_interval, remaining))
+        
+        if baseline is not None:
+            self.last_settle_changed = changed
+        return time.perf_counter() - start
+    
+    def print_settle_summary(self):
+        """
+        ページごとの安定待ち時間の集計を表示（PNGを再圧縮した場合はサイズの変化も表示）
+        """
+        if self.png_optimizer and self.png_optimizer.original_bytes:
+            before = self.png_optimizer.original_bytes / 1024 / 1024
+            after = self.png_optimizer.optimized_bytes / 1024 / 1024
+            print(f"  PNG再圧縮: {before:.1f} MB → {after:.1f} MB（{after / before - 1:+.0%}）")
+        
+        if not self.settle_times:
+            return
+        
+        total = sum(self.settle_times)
+        average = total / len(self.settle_times)
+        print(f"  安定待ち時間: 平均 {average:.2f}秒 / 最大 {max(self.settle_times):.2f}秒 / 合計 {total:.1f}秒 ({self.settle_mode})")
+        
+        stats = self.capture_backend.stats() if self.capture_backend else None
+        if stats and stats['frames']:
+            line = f"  キャプチャ: 平均 {stats['grab_ms']:.1f}ms/フレーム（{self.capture_backend.name}、{stats['frames']}フレーム）"
+            if stats['allocations_per_grab'] is not None:
+                line += f" / 確保 {stats['allocations_per_grab']:.2f}回・{stats['alloc_kb_per_grab']:.0f}KB/取得（{stats['grabs']}回）"
+            print(line)
+        
+        if self.frame_qualities:
+            low = sum(1 for score in self.frame_qualities if score < self.frame_check_min_quality)
+            print(f"  フレーム品質: 平均 {statistics.mean(self.frame_qualities):.2f} / 最低 {min(self.frame_qualities):.2f} / "
+                  f"撮り直し {self.frame_recaptures}回 / 基準未満 {low}ページ")
+    
+    def get_page_turner(self):
+        """
+        ページ送りエンジンを取得（初回に作成）
+        
+        Returns:
+            PageTurner: ページ送りエンジン
+        """
+        if self.page_turner is None:
+            self.page_turner = PageTurner(
+                self.driver,
+                self.page_turn_direction,
+                self.config.get("navigation_methods", list(PAGE_TURN_METHODS)),
+                self.config.get("navigation_reprobe_after", 2),
+                self.tracer,
+            )
+        return self.page_turner
+    
+    def _make_page_wait(self, record=True):
+        """
+        キー送信後の待機処理を作る（PageTurner に渡す）
+        表示の安定を待ち、ページが変わったかどうかを返す
+        
+        Args:
+            record (bool): 安定待ち時間を self.settle_times に記録するか
         
-        # 方法1: Seleniumでキーを送る
-        print(f"  試行1: Selenium Keys.{arrow_name.upper()} (次のページへ)")
+        Returns:
+            callable: 呼ぶたびに待機して True/False（不明ならNone）を返す関数
+                      （recheck=True の場合はキー送信直後の待機を省き、もう一度待って確認する）
+        """
+        adaptive = self.is_adaptive_settle()
+        # 安定検出モードでは変化の検出に安定判定のシグナルを使う
+        # 固定待機モードではページ送り方法を探している間だけDOMの指紋を比較し、
+        # 方法が決まった後はページ番号表示だけを比較する（記憶した方法でページが変わらなくなったことを検出するため）
+        fingerprint = not adaptive and self.get_page_turner().method is None
+        if adaptive:
+            baseline = self.get_settle_signal()
+        elif fingerprint:
+            baseline = self.get_dom_fingerprint()
+        else:
+            baseline = self.read_page_indicator_text()
+        
+        def wait(recheck=False):
+            if adaptive:
+                print(f"  安定検出中: 最大{self.page_delay}秒 ({self.settle_mode})")
+            elif not recheck:
+                # 固定待機モードではキー送信後に1秒（アニメーションを無効にした場合は0.2秒）待ってから page_delay 待機する
+                with self.tracer.span("next_page.key_wait"):
+                    time.sleep(0.2 if self.animations_suppressed else 1)
+                print(f"  待機中: {self.page_delay}秒")
+            
+            settle_time = self.wait_for_page_settle(baseline if adaptive else None)
+            if record:
+                if recheck and self.settle_times:
+                    self.settle_times[-1] += settle_time
+                else:
+                    self.settle_times.append(settle_time)
+            print(f"  ✓ 安定待ち時間: {settle_time:.2f}秒")
+            
+            if adaptive:
+                return self.last_settle_changed
+            if baseline is None:
+                return None
+            after = self.get_dom_fingerprint() if fingerprint else self.read_page_indicator_text()
+            if after is None:
+                return None
+            return after != baseline
+        
+        return wait
+    
+    def read_page_indicator_text(self):
+        """
+        ページ番号表示の文字列を読み取る（ページが変わったかの簡易な確認に使う。記憶した要素を直接読むため1回の往復で済む）
+        
+        Returns:
+            str: ページ番号表示の文字列、読み取れない場合はNone
+        """
         try:
-            body = self.driver.find_element("tag name", "body")
-            print(f"    ✓ body要素を取得")
-            body.send_keys(arrow_key)
-            print(f"    ✓ Keys.{arrow_name.upper()} を送信")
-            time.sleep(1)  # ページ遷移を待つ
-            
-            # URLが変わったか確認
-            new_url = self.driver.current_url
-            if new_url != current_url:
-                print(f"    ✓ ページ遷移検出: URL変更あり")
-            else:
-                print(f"    ? URL変更なし（同一ページの可能性）")
+            page_info = self.page_indicator.read(self.driver)
+        except Exception:
+            return None
+        return page_info.get('text') if page_info else None
+    
+    def send_page_key(self, forward=True):
+        """
+        ページ送りキーだけを送って表示の安定を待つ（位置合わせ用の軽量な操作）
+        
+        Args:
+            forward (bool): Trueなら次のページ、Falseなら前のページ
+        """
+        turner = self.get_page_turner()
+        baseline = self.get_settle_signal() if self.is_adaptive_settle() else None
+        turner.send(turner.method or "selenium", forward)
+        self.wait_for_page_settle(baseline)
+    
+    def seek_to_page_info(self, target, max_turns=2000):
+        """
+        ページ番号表示が目標の値になるまでページを移動する
+        
+        Args:
+            target (dict): 目標のページ番号表示（{"current": ..., "total": ...}）
+            max_turns (int): 最大移動回数
             
-            print(f"  ✓ 方法1成功: Selenium Keys.{arrow_name.upper()}")
-            success = True
+        Returns:
+            bool: 目標の位置（または最も近い位置）に移動できた場合True
+        """
+        target_current = target['current']
+        print(f"\nページ番号表示 {target_current} / {target.get('total')} の位置に移動しています...")
+        
+        last_forward = None
+        for turn in range(max_turns):
+            page_info = self.get_page_state()['page_info']
+            if not page_info:
+                print("  ✗ ページ番号表示を取得できません")
+                return False
             
-        except Exception as e:
-            print(f"  ✗ 方法1失敗: {e}")
+            current = page_info['current']
+            if current == target_current:
+                print(f"  ✓ 移動完了: {current} / {page_info['total']}（{turn}回移動）")
+                return True
             
-            # 方法2: JavaScript経由でイベントを発火
-            print(f"  試行2: JavaScript KeyboardEvent ({arrow_name})")
-            try:
-                self.driver.execute_script(f"""
-                    console.log('JavaScript: キーイベント送信開始');
-                    var event = new KeyboardEvent('keydown', {{
-                        key: '{arrow_name}',
-                        code: '{arrow_name}',
-                        keyCode: {arrow_code},
-                        which: {arrow_code},
-                        bubbles: true,
-                        cancelable: true
-                    }});
-                    document.dispatchEvent(event);
-                    console.log('JavaScript: キーイベント送信完了');
-                    
-                    // ページ番号要素があれば取得
-                    var pageInfo = document.querySelector('[class*="page"]');
-                    if (pageInfo) {{
-                        console.log('現在のページ情報:', pageInfo.textContent);
-                    }}
-                """)
-                print(f"    ✓ JavaScript実行完了")
-                time.sleep(1)
-                
-                new_url = self.driver.current_url
-                if new_url != current_url:
-                    print(f"    ✓ ページ遷移検出: URL変更あり")
-                else:
-                    print(f"    ? URL変更なし")
-                
-                print(f"  ✓ 方法2成功: JavaScript KeyboardEvent")
-                success = True
-                
-            except Exception as e2:
-                print(f"  ✗ 方法2失敗: {e2}")
-                
-                # 方法3: クリック + PyAutoGUI
-                print(f"  試行3: PyAutoGUI（画面中央クリック + {direction_text}矢印）")
-                try:
-                    # maximize_window()は呼ばない（F11全画面モードを解除してしまうため）
-                    
-                    import pyautogui
-                    # 画面中央をクリック
-                    screen_width, screen_height = pyautogui.size()
-                    click_x = screen_width // 2
-                    click_y = screen_height // 2
-                    print(f"    クリック位置: ({click_x}, {click_y})")
-                    pyautogui.click(click_x, click_y)
-                    time.sleep(0.3)
-                    print(f"    ✓ クリック完了")
-                    
-                    # 矢印キーを送信
-                    pyautogui.press(pyautogui_key)
-                    print(f"    ✓ {direction_text}矢印キー送信完了")
-                    time.sleep(1)
-                    
-                    print(f"  ✓ 方法3成功: PyAutoGUI")
-                    success = True
-                    
-                except Exception as e3:
-                    print(f"  ✗ 方法3失敗: {e3}")
-                    print(f"  ✗✗✗ すべてのページ送り方法が失敗しました ✗✗✗")
-                    success = False
+            forward = current < target_current
+            if last_forward is not None and forward != last_forward:
+                # 飛び番号で目標の番号に一致しない場合は、目標を超えない位置で止める
+                if not forward:
+                    self.send_page_key(forward=False)
+                print(f"  ⚠️ 番号が一致しないため近い位置で停止しました（目標: {target_current}）")
+                return True
+            
+            self.send_page_key(forward)
+            last_forward = forward
+            
+            if (turn + 1) % 10 == 0:
+                print(f"  移動中... 現在 {current} / {page_info['total']}")
+        
+        print(f"  ✗ {max_turns}回移動しても目標の位置に到達しませんでした")
+        return False
+    
+    def resume_session(self):
+        """
+        ジャーナルから中断したセッションを復元し、リーダーを続きの位置へ移動する
+        
+        Returns:
+            bool: 再開できた場合True（できない場合は最初からキャプチャする）
+        """
+        state = self.journal.load() if self.journal else None
+        if not state:
+            print("\n再開できるセッションが見つかりません。最初からキャプチャします。")
+            return False
+        if state['complete']:
+            print("\n前回のセッションは完了しています。最初からキャプチャします。")
+            return False
+        
+        records = SessionJournal.captured_prefix(state['pages'])
+        if not records:
+            print("\n保存済みのページがありません。最初からキャプチャします。")
+            return False
+        
+        session = state['session']
+        self.capture_mode = session.get('capture_mode') or 'auto_complete'
+        if session.get('total_pages'):
+            self.total_pages = session['total_pages']
+        self.images = [record['file'] for record in records]
+        self.start_page = len(records) + 1
+        
+        print(f"\n✓ 前回のセッションを再開します: {len(records)}ページ保存済み（{self.start_page}ページ目から）")
+        
+        # 最後に保存したページの位置へ移動してから、次のページへ進む
+        last_info = records[-1].get('page_info')
+        if not (last_info and self.seek_to_page_info(last_info)):
+            if self.unattended:
+                raise RuntimeError("最後に保存したページの位置に移動できませんでした")
+            print(f"\nリーダーを手動で {len(records)}ページ目（最後に保存したページ）に合わせてください。")
+            input("準備ができたらEnterキーを押してください...")
+        self.next_page()
+        
+        # 保存済みのページをストリーミングPDFに追加
+        if self.streaming_pdf:
+            self.pdf_writer = StreamingPDFWriter(os.path.join(self.output_dir, "capture.pdf.part"))
+            for record in records:
+                self.pdf_writer.add_image_file(record['file'], record['page'])
+        
+        self.journal.resume_session(self.start_page)
+        return True
+    
+    @traced("next_page")
+    def next_page(self):
+        """
+        次のページに移動する
+        ページ送り方法は初回に探索して記憶し、以降はその方法だけを使う（PageTurner）
         
-        # ページ遷移を待つ
-        print(f"  待機中: {self.page_delay}秒")
-        time.sleep(self.page_delay)
+        Returns:
+            bool: ページ送りキーを送れた場合True
+        """
+        print(f"\n  --- ページ送り開始 ---")
         
-        print(f"  --- ページ送り終了 (成功: {success}) ---\n")
+        try:
+            turner = self.get_page_turner()
+        except ValueError as e:
+            print(f"  ✗ エラー: {e}")
+            return False
+        
+        success, method = turner.turn(self._make_page_wait())
+        
+        print(f"  --- ページ送り終了 (成功: {success}, 方法: {method}) ---\n")
         return success
     
     def capture_all_pages(self):
         """
         すべてのページをキャプチャする
         """
-        # キャプチャモードを選択
+        # 中断したセッションの再開
+        if self.resume and self.resume_session():
+            print(f"\n再開モード: {self.capture_mode}\n")
+            if self.capture_mode == 'auto_complete':
+                self._capture_until_last_page()
+            else:
+                self._capture_with_page_count()
+            return
+        
+        # キャプチャモードを選択（無人実行では自動完了モード）
         if self.capture_mode is None:
-            self.capture_mode = self.select_capture_mode()
+            self.capture_mode = 'auto_complete' if self.unattended else self.select_capture_mode()
+        if self.capture_mode not in ('manual', 'auto_detect', 'auto_complete'):
+            raise ValueError(f"不正な capture_mode 設定です: {self.capture_mode}（manual, auto_detect, auto_complete から選択してください）")
         
         print(f"\n選択されたモード: {self.capture_mode}\n")
         
         # モード別の処理
         if self.capture_mode == 'manual':
             # 手動入力モード
+            if self.total_pages is None and self.unattended:
+                print("総ページ数（total_pages）が未設定のため、自動完了モードに切り替えます...\n")
+                self.capture_mode = 'auto_complete'
+                self._capture_until_last_page()
+                return
             if self.total_pages is None:
                 user_input = input("総ページ数を入力してください: ").strip()
                 self.total_pages = int(user_input) if user_input else 100
@@ -707,7 +1325,7 @@ class KindleToPDF:
                 self._capture_with_page_count()
             else:
                 print("\n総ページ数が検出できませんでした。")
-                user_input = input("手動でページ数を入力してください: ").strip()
+                user_input = "" if self.unattended else input("手動でページ数を入力してください: ").strip()
                 if user_input:
                     self.total_pages = int(user_input)
                     self._capture_with_page_count()
@@ -724,8 +1342,15 @@ class KindleToPDF:
         """
         ページ数指定でキャプチャする
         """
+        if self.parallel_sessions > 1 and self.start_page == 1:
+            self._capture_in_parallel()
+            return
+        
         print(f"\n{self.total_pages}ページのスクリーンショットを開始します...\n")
         
+        if self.journal and self.start_page == 1:
+            self.journal.start_session(self.capture_mode, self.total_pages)
+        
         # キーボードリスナーを開始
         self.start_keyboard_listener()
         
@@ -739,10 +1364,11 @@ class KindleToPDF:
         except Exception as e:
             print(f"警告: ブラウザのフォーカスに失敗: {e}\n")
         
-        for page in range(1, self.total_pages + 1):
+        for page in range(self.start_page, self.total_pages + 1):
             # ユーザーによる手動終了チェック
             if self.user_stop_requested:
                 print(f"\n✓ ユーザーによって手動終了されました（{page-1}ページまでキャプチャ完了）")
+                self.flush_image_writer()
                 break
             print(f"ページ {page}/{self.total_pages} をキャプチャ中...")
             
@@ -767,7 +1393,9 @@ class KindleToPDF:
             # 最後のページでなければ次のページへ
             if page < self.total_pages:
                 success = self.next_page()
-                if not success:
+                if not success and self.unattended:
+                    print(f"\n警告: ページ送りに失敗しました。無人実行のため続行します")
+                elif not success:
                     print(f"\n警告: ページ送りに失敗しました。処理を続行しますか？")
                     self.stop_keyboard_listener()  # 入力待ち前にリスナー停止
                     response = input("続行する場合はEnterキーを押してください（中断する場合はCtrl+C）: ")
@@ -777,7 +1405,95 @@ class KindleToPDF:
         # キーボードリスナーを停止
         self.stop_keyboard_listener()
         
+        # 保存待ちの画像を書き込む
+        self.flush_image_writer()
+        
         print(f"\n✓ {len(self.images)}ページのキャプチャが完了しました！")
+        self.print_settle_summary()
+    
+    def _capture_in_parallel(self):
+        """
+        ページ範囲を分割し、複数のヘッドレスChromeのセッションで並列にキャプチャする
+        各セッションは page_NNNN.png（通し番号）で保存し、終了後にページ順に結合する
+        """
+        ranges = parallel_capture.plan_ranges(self.total_pages, self.parallel_sessions)
+        print(f"\n{self.total_pages}ページを{len(ranges)}個のセッションで並列にキャプチャします...")
+        if not self.jump_url_template:
+            print("  jump_url_template が未設定のため、各セッションはページ番号表示を見ながら担当範囲の先頭へ移動します")
+        
+        if self.journal:
+            self.journal.start_session(self.capture_mode, self.total_pages)
+        
+        # 開いている本のURLとログイン状態（Cookie）をメインのセッションから引き継ぐ
+        reader_url = self.driver.current_url
+        cookies = self.driver.get_cookies()
+        overrides = dict(parallel_capture.worker_overrides(), output_dir=self.output_dir)
+        
+        jobs = []
+        for index, (start, end) in enumerate(ranges, 1):
+            log_path = os.path.join(self.output_dir, f"parallel_session_{index}.log")
+            print(f"  セッション{index}: {start}～{end}ページ（ログ: {log_path}）")
+            jobs.append({
+                "index": index,
+                "start": start,
+                "end": end,
+                "config_path": self.config_path,
+                "overrides": overrides,
+                "jump_url_template": self.jump_url_template,
+                "reader_url": reader_url,
+                "cookies": cookies,
+                "log_path": log_path,
+            })
+        
+        results = []
+        with self.tracer.span("parallel_capture", sessions=len(jobs)):
+            with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+                futures = {executor.submit(parallel_capture.capture_range, job): job for job in jobs}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        job = futures[future]
+                        print(f"  ✗ セッション{job['index']}（{job['start']}～{job['end']}ページ）が異常終了しました: {e}")
+                        continue
+                    summary = f"{result['start']}～{result['end']}ページ: {len(result['pages'])}ページ保存"
+                    if result['error']:
+                        print(f"  ✗ {summary}（{result['error']}）")
+                    else:
+                        print(f"  ✓ {summary}")
+                    results.append(result)
+        
+        # 各セッションが返したページ番号で結合する
+        captured = {}
+        for result in results:
+            captured.update(result['pages'])
+            self.settle_times.extend(result['settle_times'])
+            self.frame_qualities.extend(result['frame_qualities'])
+        
+        # ジャーナルには元のページ番号で記録する（欠けたページがあっても、--resume で最初の欠けたページから続けられる）
+        if self.journal:
+            for page in sorted(captured):
+                self.journal.record_page(page, captured[page], None)
+        
+        # 欠けたページがあるままPDFにすると気づかずにページが抜けるため、範囲を表示して中止する
+        missing = parallel_capture.missing_ranges(ranges, captured)
+        if missing:
+            print("\n✗ 次のページをキャプチャできませんでした（各セッションのログを確認してください）:")
+            for start, end in missing:
+                print(f"  - {start}～{end}ページ" if start != end else f"  - {start}ページ")
+            count = sum(end - start + 1 for start, end in missing)
+            raise RuntimeError(f"並列キャプチャで{count}ページが欠けています")
+        
+        self.images = [captured[page] for page in sorted(captured)]
+        
+        # 結合した順にストリーミングPDFへ追加する
+        if self.streaming_pdf:
+            self.pdf_writer = StreamingPDFWriter(os.path.join(self.output_dir, "capture.pdf.part"))
+            for page_num, path in enumerate(self.images, 1):
+                self.pdf_writer.add_image_file(path, page_num)
+        
+        print(f"\n✓ {len(self.images)}ページのキャプチャが完了しました！")
+        self.print_settle_summary()
     
     def _capture_until_last_page(self):
         """
@@ -785,6 +1501,9 @@ class KindleToPDF:
         """
         print("\n最終ページに到達するまで自動的にキャプチャします...\n")
         
+        if self.journal and self.start_page == 1:
+            self.journal.start_session(self.capture_mode, None)
+        
         # キーボードリスナーを開始
         self.start_keyboard_listener()
         
@@ -797,13 +1516,14 @@ class KindleToPDF:
         except Exception as e:
             print(f"警告: ブラウザのフォーカスに失敗: {e}\n")
         
-        page = 1
+        page = self.start_page
         max_pages = 1000  # 安全のための上限
         
         while page <= max_pages:
             # ユーザーによる手動終了チェック
             if self.user_stop_requested:
                 print(f"\n✓ ユーザーによって手動終了されました（{page-1}ページまでキャプチャ完了）")
+                self.flush_image_writer()
                 break
             print(f"ページ {page} をキャプチャ中...")
             
@@ -818,12 +1538,13 @@ class KindleToPDF:
             
             # ページ送り前の状態を取得
             before_state = self.get_page_state()
+            self.last_page_detector.begin(before_state)
             if before_state['page_info']:
                 print(f"  ページ番号表示: {before_state['page_info']['current']} / {before_state['page_info']['total']}")
             
             # スクリーンショットを撮る
             try:
-                screenshot_path = self.take_screenshot(page)
+                screenshot_path = self.take_screenshot(page, before_state['page_info'])
                 self.images.append(screenshot_path)
                 print(f"  ✓ スクリーンショット保存: {screenshot_path}")
             except Exception as e:
@@ -837,7 +1558,11 @@ class KindleToPDF:
             if not success:
                 print(f"\n⚠️  ページ送りに失敗しました。")
                 self.stop_keyboard_listener()  # 入力待ち前にリスナー停止
-                response = input("最終ページに到達した可能性があります。終了しますか？ (y/n): ").strip().lower()
+                if self.unattended:
+                    print("最終ページに到達した可能性があります。無人実行のため終了します")
+                    response = 'y'
+                else:
+                    response = input("最終ページに到達した可能性があります。終了しますか？ (y/n): ").strip().lower()
                 if response == 'y':
                     print("キャプチャを終了します。")
                     break
@@ -848,11 +1573,8 @@ class KindleToPDF:
                     page += 1
                     continue
             
-            # ページ送り後の状態を取得
-            after_state = self.get_page_state()
-            
-            # 最終ページ判定
-            is_last, reasons, confidence = self.is_last_page(before_state, after_state)
+            # ページ送り後の状態から最終ページ判定（疑わしい場合は再確認・再送で確定する）
+            is_last, reasons, confidence = self.confirm_last_page()
             
             if is_last:
                 print(f"\n{'='*70}")
@@ -878,27 +1600,68 @@ class KindleToPDF:
         # キーボードリスナーを停止
         self.stop_keyboard_listener()
         
+        # 保存待ちの画像を書き込む
+        self.flush_image_writer()
+        
         print(f"\n✓ {len(self.images)}ページのキャプチャが完了しました！")
+        self.print_settle_summary()
     
+    @traced("create_pdf")
     def create_pdf(self, output_filename=None):
         """
         画像をPDFに変換する
         
         Args:
             output_filename (str): 出力PDFファイル名
+        
+        Returns:
+            bool: PDFを作成できた場合True
         """
         if not output_filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_filename = f"kindle_book_{timestamp}.pdf"
         
+        if self.pdf_encoding == "adaptive":
+            # ページごとにコーデックを選んでマルチプロセスでエンコード（進捗は make_pdf 側で表示）
+            self.flush_image_writer()
+            return make_pdf.create_pdf(self.images, output_filename,
+                                       encoding="adaptive",
+                                       jpeg_quality=self.config.get("jpeg_quality", 85),
+                                       workers=self.config.get("pdf_workers", None),
+                                       use_cache=self.config.get("pdf_cache", True))
+        
         print(f"\nPDFを作成しています: {output_filename}")
         
         try:
-            with open(output_filename, "wb") as f:
-                f.write(img2pdf.convert(self.images))
+            if self.pdf_writer:
+                # キャプチャ中に追記済みのPDFを完成させる
+                self.flush_image_writer()
+                if self.pdf_writer.page_count == len(self.images):
+                    self.pdf_writer.close(output_filename)
+                    print(f"  ストリーミングPDF: {self.pdf_writer.page_count}ページ")
+                else:
+                    # 追記できなかったページがある: 抜けたPDFを完成させず、保存済みの画像から作り直す
+                    failed = ", ".join(str(page) for page in sorted(self.pdf_append_failures)) or "不明"
+                    print(f"  ✗ ストリーミングPDFのページ数（{self.pdf_writer.page_count}）が画像の数（{len(self.images)}）と一致しません"
+                          f"（追記に失敗したページ: {failed}）")
+                    print("  画像からPDFを作り直します...")
+                    self.pdf_writer.abort()
+                    self.pdf_writer = None
+                    if not make_pdf.create_pdf(self.images, output_filename, use_cache=False):
+                        return False
+            elif self.page_store:
+                # 同じ内容のページは画像を1回だけ埋め込む
+                self.flush_image_writer()
+                if not make_pdf.create_pdf(self.images, output_filename, use_cache=False):
+                    return False
+            else:
+                with open(output_filename, "wb") as f:
+                    f.write(img2pdf.convert(self.images))
             print(f"✓ PDF作成完了: {output_filename}")
+            return True
         except Exception as e:
             print(f"✗ PDFの作成中にエラーが発生しました: {e}")
+            return False
     
     def cleanup(self):
         """
@@ -907,21 +1670,69 @@ class KindleToPDF:
         # キーボードリスナーを停止
         self.stop_keyboard_listener()
         
+        # 保存待ちの画像を書き込んでワーカーを終了
+        if self.image_writer:
+            self.flush_image_writer()
+            self.image_writer.close()
+            self.image_writer = None
+        
+        if self.png_optimizer:
+            self.png_optimizer.close()
+            self.png_optimizer = None
+        
+        # 完成しなかったストリーミングPDFの一時ファイルを削除
+        if self.pdf_writer:
+            self.pdf_writer.abort()
+        
+        if self.capture_backend:
+            self.capture_backend.close()
+            self.capture_backend = None
+        
         if self.driver:
             self.driver.quit()
         
+        # Chromeを終了してから仮想ディスプレイを閉じる
+        if self.virtual_display:
+            self.virtual_display.stop()
+            self.virtual_display = None
+        
         # スクリーンショット画像の削除（オプション）
         if self.config.get("delete_screenshots", False):
             print("\nスクリーンショット画像を削除しています...")
-            for img_path in self.images:
+            for img_path in dict.fromkeys(self.images):
                 try:
                     os.remove(img_path)
                 except Exception as e:
                     print(f"警告: {img_path} の削除に失敗しました: {e}")
     
+    def finish_trace(self):
+        """
+        計測したスパンをトレースファイルに保存し、フェーズごとの集計を表示
+        """
+        if not self.tracer.enabled:
+            return
+        
+        try:
+            self.tracer.save(self.trace_file)
+            print(f"\n✓ トレースを保存しました: {self.trace_file}（chrome://tracing または https://ui.perfetto.dev で表示）")
+        except Exception as e:
+            print(f"\n警告: トレースの保存に失敗しました: {e}")
+        self.tracer.print_summary()
+    
+    def print_resume_hint(self):
+        """
+        中断時に再開方法を表示
+        """
+        if self.journal and self.images:
+            print(f"\n💡 {len(self.images)}ページまで保存済みです。続きから再開するには:")
+            print("   python kindle_to_pdf.py --resume")
+    
     def run(self):
         """
         メイン処理を実行する
+        
+        Returns:
+            bool: PDFまで作成できた場合True
         """
         try:
             # ブラウザのセットアップ
@@ -933,21 +1744,33 @@ class KindleToPDF:
             # すべてのページをキャプチャ
             self.capture_all_pages()
             
+            if not self.images:
+                raise RuntimeError("キャプチャしたページがありません")
+            
             # PDFを作成
             pdf_filename = self.config.get("pdf_filename", None)
-            self.create_pdf(pdf_filename)
+            if not self.create_pdf(pdf_filename):
+                raise RuntimeError("PDFを作成できませんでした")
+            
+            if self.journal:
+                self.journal.mark_complete()
             
             print("\n処理が正常に完了しました！")
+            return True
             
         except KeyboardInterrupt:
             print("\n\n処理が中断されました。")
+            self.print_resume_hint()
         except Exception as e:
             print(f"\n\nエラーが発生しました: {e}")
             import traceback
             traceback.print_exc()
+            self.print_resume_hint()
         finally:
             # クリーンアップ
             self.cleanup()
+            self.finish_trace()
+        return False
 
 
 def main():
@@ -963,9 +1786,35 @@ def main():
     print("- DRM保護されたコンテンツの扱いには十分注意してください")
     print("="*60 + "\n")
     
-    # アプリケーションの実行
-    app = KindleToPDF()
-    app.run()
+    parser = argparse.ArgumentParser(description="Kindle to PDF Converter")
+    parser.add_argument("--resume", action="store_true",
+                        help="中断したセッションをジャーナル（output_dir/session_journal.jsonl）から再開する")
+    parser.add_argument("--config", default="config.json", help="設定ファイルのパス（既定: config.json）")
+    parser.add_argument("--mode", choices=["manual", "auto_detect", "auto_complete"],
+                        help="キャプチャモード（指定するとモード選択を省略）")
+    parser.add_argument("--url", help="直接開く本のURL（book_url）")
+    parser.add_argument("--output-dir", help="スクリーンショットの保存先（output_dir）")
+    parser.add_argument("--pdf", help="出力PDFファイル名（pdf_filename）")
+    parser.add_argument("--unattended", action="store_true",
+                        help="確認のための入力待ちをせずに実行する（--url とログイン済みのChromeプロファイルが必要）")
+    parser.add_argument("--virtual-display", action="store_true",
+                        help="専用の仮想ディスプレイ（Xvfb）でChromeを起動する（virtual_display。画面のないLinuxサーバー向け）")
+    args = parser.parse_args()
+    
+    # コマンドラインで指定した項目は設定ファイルより優先する
+    overrides = {
+        "capture_mode": args.mode,
+        "book_url": args.url,
+        "output_dir": args.output_dir,
+        "pdf_filename": args.pdf,
+        "unattended": args.unattended or None,
+        "virtual_display": args.virtual_display or None,
+    }
+    
+    # アプリケーションの実行（PDFまで作成できなかった場合は終了コード1）
+    app = KindleToPDF(args.config, resume=args.resume,
+                      config_overrides={key: value for key, value in overrides.items() if value is not None})
+    sys.exit(0 if app.run() else 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+"""
+複数フレームの履歴による最終ページ検出
+ページ送り前後の1組の状態だけで判定すると、描画が遅れている場合に「変化なし」と見えて早く終了してしまう
+直近のページ送りの履歴から、この本で当てにならない指標（ページが変わっても変化しないもの）の重みを下げ、
+最終ページらしい状態が複数回のページ送りで続いた場合にのみ最終ページと判定する
+"""
+
+from collections import deque
+
+
+# 指標ごとの重み（ページ送り前後で変化しなかった場合に信頼度へ加算する）
+DEFAULT_WEIGHTS = {
+    "url": 30,                # URL変化なし
+    "content": 40,            # ページ表示領域のテキスト変化なし
+    "source": 10,             # HTML全体の変化なし
+    "page_number": 20,        # ページ番号表示の変化なし
+    "final_page_number": 30,  # ページ番号表示が最終ページ（例: 196 / 196）
+}
+
+def unchanged_signals(before, after):
+    """
+    ページ送り前後で変化しなかった指標
+    
+    Args:
+        before (dict): ページ送り前の状態（get_page_state の戻り値）
+        after (dict): ページ送り後の状態
+    
+    Returns:
+        dict: 指標 -> 変化しなかったか（比較できない指標は含まない）
+    """
+    unchanged = {"url": before['url'] == after['url']}
+    if before['page_content_hash'] and after['page_content_hash']:
+        unchanged["content"] = before['page_content_hash'] == after['page_content_hash']
+    if before['page_source_hash'] and after['page_source_hash']:
+        unchanged["source"] = before['page_source_hash'] == after['page_source_hash']
+    if before['page_info'] and after['page_info']:
+        unchanged["page_number"] = before['page_info']['current'] == after['page_info']['current']
+    return unchanged
+
+
+class LastPageDetector:
+    """ページ送りの履歴を使った最終ページ判定"""
+    
+    def __init__(self, weights=None, threshold=50, confirm_attempts=2, history_size=20):
+        """
+        初期化
+        
+        Args:
+            weights (dict): 指標ごとの重み（指定したものだけ DEFAULT_WEIGHTS を上書き）
+            threshold (int): 最終ページの疑いありとする信頼度
+            confirm_attempts (int): 最終ページと判定するまでに、疑いありの状態が続く必要があるページ送りの回数
+            history_size (int): 指標の信頼性の学習に使う直近のページ送りの数
+        """
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.threshold = threshold
+        self.confirm_attempts = max(1, int(confirm_attempts))
+        self.history = deque(maxlen=max(1, int(history_size)))  # ページが変わったページ送りでの unchanged_signals
+        self.before = None
+        self.attempts = 0  # 現在のページで疑いありとなったページ送りの回数
+    
+    def reliability(self, signal):
+        """
+        指標の信頼性（ページが変わったページ送りで、その指標が変化した割合）
+        
+        例えばページ番号表示が2ページに1回しか変わらない本では0.5になり、重みも半分になる
+        """
+        samples = [unchanged[signal] for unchanged in self.history if signal in unchanged]
+        if not samples:
+            return 1.0
+        return 1.0 - sum(samples) / len(samples)
+    
+    def score(self, before, after):
+        """
+        ページ送り前後の状態から最終ページの信頼度を計算
+        
+        Returns:
+            tuple: (confidence, reasons)
+        """
+        reasons = []
+        confidence = 0
+        labels = {"url": "URL変化なし", "content": "コンテンツ変化なし", "source": "ソース変化なし"}
+        
+        for signal, unchanged in unchanged_signals(before, after).items():
+            if not unchanged:
+                continue
+            reliability = self.reliability(signal)
+            weight = self.weights.get(signal, 0) * reliability
+            if weight <= 0:
+                continue
+            confidence += weight
+            label = labels.get(signal) or f"ページ番号変化なし ({before['page_info']['current']}/{before['page_info']['total']})"
+            reasons.append(label if reliability >= 1.0 else f"{label}（信頼性 {reliability:.0%}）")
+        
+        for state in (before, after):
+            info = state['page_info']
+            if info and info['current'] == info['total']:
+                reasons.append(f"最終ページ番号到達 ({info['total']}/{info['total']})")
+                confidence += self.weights.get("final_page_number", 0)
+                break
+        
+        return round(confidence), reasons
+    
+    def begin(self, before_state):
+        """
+        ページ送りの前に呼ぶ（新しいページの判定を始める）
+        
+        Args:
+            before_state (dict): ページ送り前の状態
+        """
+        self.before = before_state
+        self.attempts = 0
+    
+    def observe(self, after_state, new_attempt=True):
+        """
+        ページ送り後（または再確認時）の状態を判定する
+        
+        Args:
+            after_state (dict): 現在の状態
+            new_attempt (bool): ページ送りキーを新たに送った後ならTrue、送らずに状態を再確認しただけならFalse
+        
+        Returns:
+            tuple: (status, confidence, reasons)
+                   status は "changed"（ページが変わった）/ "suspect"（最終ページの疑い）/ "last"（最終ページと確定）
+        """
+        confidence, reasons = self.score(self.before, after_state)
+        unchanged = unchanged_signals(self.before, after_state)
+        
+        # ページ表示領域のテキストが変わった場合はページが動いたことが確実なので、再送もしない
+        if confidence < self.threshold or unchanged.get("content") is False:
+            # ページが変わった: 各指標の変化を履歴に記録して信頼性の学習に使う
+            self.history.append(unchanged)
+            self.attempts = 0
+            return "changed", confidence, reasons
+        
+        if new_attempt:
+            self.attempts += 1
+        if self.attempts >= self.confirm_attempts:
+            return "last", confidence, reasons
+        return "suspect", confidence, reasons
@@ -2,11 +2,31 @@
 フォルダ内の画像ファイルをPDFに変換するスクリプト
 """
 
+import io
 import os
 import glob
 import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-import img2pdf
+import numpy as np
+from PIL import Image
+from pdf_stream import StreamingPDFWriter, encode_pdf_image, image_dpi, load_pdf_image
+from pdf_cache import PageCache
+from page_store import PageStore
+
+
+# 適応エンコード（pdf_encoding: "adaptive"）のページ分類しきい値
+COLOR_CHROMA_THRESHOLD = 24    # RGBの最大値と最小値の差がこれを超える画素をカラー画素とみなす
+COLOR_PIXEL_RATIO = 0.001      # カラー画素の割合がこれを超えるとカラーページ
+BILEVEL_DARK = 64              # これ以下の輝度を「黒」とみなす
+BILEVEL_LIGHT = 192            # これ以上の輝度を「白」とみなす
+BILEVEL_RATIO = 0.98           # 黒と白の画素の割合がこれ以上なら白黒ページ
+CLASSIFY_MAX_PIXELS = 1000000  # 分類に使う最大画素数（間引いてサンプリングする）
+
+PAGE_KIND_LABELS = {"bilevel": "白黒(CCITT G4)", "gray": "グレー(Flate)", "color": "カラー(JPEG)", "original": "元画像"}
 
 
 def load_config(config_path="config.json"):
@@ -25,6 +45,10 @@ def get_image_files(image_dir):
     pattern = os.path.join(image_dir, "page_*.png")
     image_files = sorted(glob.glob(pattern))
     
+    if not image_files:
+        # 内容アドレス方式のストア（page_store）の場合は最新のマニフェストからページ順に取得
+        image_files = PageStore.latest_manifest_files(image_dir)
+    
     if not image_files:
         # 他の画像形式も試す
         patterns = [
@@ -40,7 +64,184 @@ def get_image_files(image_dir):
     return image_files
 
 
-def create_pdf(image_files, output_filename=None, delete_images=False):
+def classify_page(image):
+    """
+    ページを白黒・グレー・カラーに分類する（ヒストグラムによるベクトル化判定）
+    
+    Args:
+        image (PIL.Image.Image): RGB画像
+        
+    Returns:
+        str: 'bilevel', 'gray', 'color' のいずれか
+    """
+    pixels = np.asarray(image)
+    
+    # 縮小による中間調の発生を避けるため、平均化せずに間引いてサンプリングする
+    step = max(1, int((pixels.shape[0] * pixels.shape[1] / CLASSIFY_MAX_PIXELS) ** 0.5))
+    sample = pixels[::step, ::step].astype(np.int32)
+    total = sample.shape[0] * sample.shape[1]
+    
+    chroma = sample.max(axis=2) - sample.min(axis=2)
+    if np.count_nonzero(chroma > COLOR_CHROMA_THRESHOLD) > total * COLOR_PIXEL_RATIO:
+        return "color"
+    
+    luminance = (sample[..., 0] * 299 + sample[..., 1] * 587 + sample[..., 2] * 114) // 1000
+    histogram = np.bincount(luminance.ravel(), minlength=256)
+    extremes = histogram[:BILEVEL_DARK + 1].sum() + histogram[BILEVEL_LIGHT:].sum()
+    if extremes >= total * BILEVEL_RATIO:
+        return "bilevel"
+    
+    return "gray"
+
+
+def _encode_ccitt_g4(image, dpi):
+    """
+    白黒画像をCCITT G4でエンコードする
+    
+    Returns:
+        dict: PDF画像データ（単一ストリップにできない場合はNone）
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format="TIFF", compression="group4", tiffinfo={278: image.height})  # 278: RowsPerStrip
+    data = buffer.getvalue()
+    
+    with Image.open(io.BytesIO(data)) as tiff:
+        offsets = tiff.tag_v2.get(273)  # StripOffsets
+        counts = tiff.tag_v2.get(279)   # StripByteCounts
+        photometric = tiff.tag_v2.get(262, 0)
+    
+    if not offsets or len(offsets) != 1:
+        return None
+    
+    return {
+        "width": image.width,
+        "height": image.height,
+        "dpi": dpi,
+        "colorspace": "/DeviceGray",
+        "bpc": 1,
+        "filter": "/CCITTFaxDecode",
+        "decode_parms": {"K": -1, "Columns": image.width, "Rows": image.height, "BlackIs1": photometric == 1},
+        "data": data[offsets[0]:offsets[0] + counts[0]],
+    }
+
+
+def _encode_jpeg(image, dpi, quality):
+    """
+    カラー画像をJPEGでエンコードする
+    
+    Returns:
+        dict: PDF画像データ
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return {
+        "width": image.width,
+        "height": image.height,
+        "dpi": dpi,
+        "colorspace": "/DeviceRGB",
+        "bpc": 8,
+        "filter": "/DCTDecode",
+        "decode_parms": None,
+        "data": buffer.getvalue(),
+    }
+
+
+def encode_page(task):
+    """
+    1ページ分の画像をPDF用にエンコードする（プロセスプールから呼ばれる）
+    
+    Args:
+        task (tuple): (画像パス, エンコード方式 'original'/'adaptive', JPEG品質)
+        
+    Returns:
+        tuple: (PDF画像データ, ページ分類)
+    """
+    image_path, encoding, jpeg_quality = task
+    
+    if encoding != "adaptive":
+        return load_pdf_image(image_path), "original"
+    
+    with Image.open(image_path) as image:
+        dpi = image_dpi(image)
+        rgb = image.convert("RGB")
+    
+    kind = classify_page(rgb)
+    
+    if kind == "bilevel":
+        gray = rgb.convert("L").point(lambda v: 255 if v >= 128 else 0)
+        bilevel = gray.convert("1", dither=Image.Dither.NONE)
+        encoded = _encode_ccitt_g4(bilevel, dpi) or encode_pdf_image(bilevel, dpi)
+    elif kind == "gray":
+        encoded = encode_pdf_image(rgb.convert("L"), dpi)
+    else:
+        encoded = _encode_jpeg(rgb, dpi, jpeg_quality)
+    
+    return encoded, kind
+
+
+def _encode_pages(tasks, workers, cache=None):
+    """
+    ページを順番どおりにエンコードする（適応エンコードはプロセスプールで並列化）
+    キャッシュがある場合は、キャッシュにないページだけをエンコードする
+    キャッシュのデータは書き込む直前に1ページずつ読み込む（全ページ分をメモリに持たない）
+    
+    Yields:
+        tuple: (PDF画像データ, ページ分類)
+    """
+    keys = [cache.key(task[0]) for task in tasks] if cache else [None] * len(tasks)
+    hits = [cache.contains(key) for key in keys] if cache else [False] * len(tasks)
+    missing = [task for task, hit in zip(tasks, hits) if not hit]
+    
+    if cache:
+        print(f"キャッシュ: {len(tasks) - len(missing)}ページ再利用 / {len(missing)}ページをエンコード")
+    
+    with contextlib.ExitStack() as stack:
+        if workers == 1 or len(missing) < 2 or tasks[0][1] != "adaptive":
+            encoded_pages = map(encode_page, missing)
+        else:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            encoded_pages = executor.map(encode_page, missing, chunksize=4)
+        
+        for task, key, hit in zip(tasks, keys, hits):
+            if hit:
+                cached = cache.get(key)
+                if cached is not None:
+                    yield cached
+                    continue
+                # 確認後にキャッシュが消えた（または壊れていた）場合はここでエンコードし直す
+                encoded, kind = encode_page(task)
+            else:
+                encoded, kind = next(encoded_pages)
+            if cache:
+                cache.put(key, encoded, kind)
+            yield encoded, kind
+
+
+def page_cache_for(image_files, encoding, jpeg_quality):
+    """
+    画像ディレクトリのビルドキャッシュを作成する
+    original は画像データをそのまま埋め込む（再エンコードしない）ため、キャッシュは adaptive のみで使う
+    
+    Returns:
+        PageCache: キャッシュ（使わない場合はNone）
+    """
+    if encoding != "adaptive" or not image_files:
+        return None
+    
+    settings = {
+        "encoding": encoding,
+        "jpeg_quality": jpeg_quality,
+        "thresholds": [COLOR_CHROMA_THRESHOLD, COLOR_PIXEL_RATIO, BILEVEL_DARK, BILEVEL_LIGHT, BILEVEL_RATIO, CLASSIFY_MAX_PIXELS],
+    }
+    image_dir = os.path.dirname(os.path.abspath(image_files[0]))
+    if os.path.basename(os.path.dirname(image_dir)) == PageStore.DIRNAME:
+        # ページストア（output_dir/store/ab/）の画像はoutput_dirにキャッシュする
+        image_dir = os.path.dirname(os.path.dirname(image_dir))
+    return PageCache(image_dir, settings)
+
+
+def create_pdf(image_files, output_filename=None, delete_images=False, encoding="original", jpeg_quality=85, workers=None,
+               use_cache=True):
     """
     画像ファイルからPDFを作成
     
@@ -48,6 +249,10 @@ def create_pdf(image_files, output_filename=None, delete_images=False):
         image_files (list): 画像ファイルのパスリスト
         output_filename (str): 出力PDFファイル名
         delete_images (bool): PDF作成後に画像を削除するか
+        encoding (str): 'original'=画像をそのまま埋め込む, 'adaptive'=ページごとに白黒/グレー/カラーを判定して再エンコード
+        jpeg_quality (int): カラーページのJPEG品質（adaptive時）
+        workers (int): エンコードに使うプロセス数（Noneの場合はCPUコア数）
+        use_cache (bool): エンコード済みのページをキャッシュし、作り直しの際は変更された画像だけをエンコードするか
     """
     if not image_files:
         print("エラー: 画像ファイルが見つかりません")
@@ -59,18 +264,45 @@ def create_pdf(image_files, output_filename=None, delete_images=False):
     
     print(f"\nPDFを作成しています: {output_filename}")
     print(f"画像ファイル数: {len(image_files)}")
+    if encoding == "adaptive":
+        print(f"エンコード方式: 適応（JPEG品質 {jpeg_quality}, {workers or os.cpu_count()}プロセス）")
     
     try:
-        # 画像をPDFに変換
-        with open(output_filename, "wb") as f:
-            f.write(img2pdf.convert(image_files))
+        # 画像を1ページずつPDFに追記（全ページをメモリに載せない）
+        writer = StreamingPDFWriter(output_filename + ".part")
+        # 画像を削除する場合は作り直すことがないため、キャッシュを使わない
+        cache = page_cache_for(image_files, encoding, jpeg_quality) if use_cache and not delete_images else None
+        kinds = {}
+        try:
+            # 同じ画像（ページストアで同じ内容のページ）は1回だけエンコード・埋め込みし、各ページから参照する
+            page_nums = {}
+            for page_num, image_path in enumerate(image_files, 1):
+                page_nums.setdefault(os.path.abspath(image_path), []).append(page_num)
+            if len(page_nums) < len(image_files):
+                print(f"同じ内容のページ: {len(image_files) - len(page_nums)}ページ（画像は1回だけ埋め込みます）")
+            
+            tasks = [(image_path, encoding, jpeg_quality) for image_path in page_nums]
+            for image_path, (encoded, kind) in zip(page_nums, _encode_pages(tasks, workers, cache)):
+                for page_num in page_nums[image_path]:
+                    writer.add_page(encoded, page_num, image_path)
+                    kinds[kind] = kinds.get(kind, 0) + 1
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close(output_filename)
+        
+        if cache:
+            cache.prune()
         
-        print(f"✓ PDF作成完了: {output_filename}")
+        size_mb = os.path.getsize(output_filename) / (1024 * 1024)
+        print(f"✓ PDF作成完了: {output_filename}（{size_mb:.1f} MB）")
+        if encoding == "adaptive":
+            print("  " + " / ".join(f"{PAGE_KIND_LABELS[kind]}: {count}" for kind, count in kinds.items()))
         
         # 画像ファイルを削除（オプション）
         if delete_images:
             print("\n画像ファイルを削除しています...")
-            for img_path in image_files:
+            for img_path in dict.fromkeys(image_files):
                 try:
                     os.remove(img_path)
                     print(f"  削除: {os.path.basename(img_path)}")
@@ -87,8 +319,186 @@ def create_pdf(image_files, output_filename=None, delete_images=False):
         return False
 
 
+def find_book_dirs(root):
+    """
+    ルートディレクトリ以下から画像を含むディレクトリ（1冊分のキャプチャ）を探す
+    
+    Args:
+        root (str): 検索するルートディレクトリ
+    
+    Returns:
+        list: ディレクトリのパス（名前順）
+    """
+    book_dirs = []
+    for dirpath, dirnames, _ in os.walk(root):
+        # キャッシュとページストアの中は探さない（ストアの画像はマニフェストから参照される）
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith(".") and name != PageStore.DIRNAME)
+        if get_image_files(dirpath):
+            book_dirs.append(dirpath)
+    return book_dirs
+
+
+def book_pdf_path(book_dir, output_dir=None):
+    """
+    1冊分のディレクトリに対応する出力PDFのパス（ディレクトリ名.pdf）
+    
+    Args:
+        book_dir (str): 画像ディレクトリ
+        output_dir (str): PDFの保存先（Noneの場合は画像ディレクトリ内）
+    """
+    name = os.path.basename(os.path.normpath(os.path.abspath(book_dir))) + ".pdf"
+    return os.path.join(output_dir or book_dir, name)
+
+
+def is_up_to_date(pdf_path, image_files):
+    """
+    PDFがすべての画像より新しいかどうか
+    """
+    if not os.path.exists(pdf_path):
+        return False
+    newest = max(os.path.getmtime(path) for path in image_files)
+    return os.path.getmtime(pdf_path) >= newest
+
+
+def build_book(job):
+    """
+    1冊分のPDFを作成する（バッチモードのプロセスプールから呼ばれる）
+    
+    Args:
+        job (tuple): (画像ディレクトリ, 出力PDFのパス, エンコード方式, JPEG品質, キャッシュを使うか)
+    
+    Returns:
+        dict: 結果（dir, pdf, pages, seconds, size, status, error）
+    """
+    book_dir, pdf_path, encoding, jpeg_quality, use_cache = job
+    image_files = get_image_files(book_dir)
+    result = {"dir": book_dir, "pdf": pdf_path, "pages": len(image_files),
+              "seconds": 0.0, "size": None, "status": "failed", "error": None}
+    
+    # 並列化は本単位で行うため、1冊の中では1プロセスでエンコードする
+    log = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        success = create_pdf(image_files, pdf_path, encoding=encoding, jpeg_quality=jpeg_quality, workers=1,
+                             use_cache=use_cache)
+    result["seconds"] = time.perf_counter() - start
+    
+    if success:
+        result["status"] = "built"
+        result["size"] = os.path.getsize(pdf_path)
+    else:
+        lines = [line for line in log.getvalue().splitlines() if line.strip()]
+        result["error"] = lines[-1].strip() if lines else "不明なエラー"
+    return result
+
+
+def print_batch_summary(results, elapsed):
+    """
+    バッチモードの結果を表で表示
+    """
+    status_labels = {"built": "作成", "skipped": "スキップ", "failed": "失敗"}
+    name_width = max([len(os.path.basename(os.path.normpath(r["dir"]))) for r in results] + [10])
+    
+    print(f"\n{'='*60}")
+    print("バッチ処理の結果")
+    print(f"{'='*60}")
+    # 全角文字は表示幅が2文字分なので、その分だけ詰めて揃える
+    print(f"{'本':<{name_width - 1}}  {'ページ':>3}  {'時間':>6}  {'サイズ':>7}  状態")
+    for result in results:
+        name = os.path.basename(os.path.normpath(result["dir"]))
+        size = f"{result['size'] / (1024 * 1024):.1f}MB" if result["size"] is not None else "-"
+        seconds = f"{result['seconds']:.1f}s" if result["status"] == "built" else "-"
+        print(f"{name:<{name_width}}  {result['pages']:>6}  {seconds:>8}  {size:>10}  {status_labels[result['status']]}")
+        if result["error"]:
+            print(f"    ✗ {result['error']}")
+    
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in status_labels}
+    total_size = sum(r["size"] or 0 for r in results if r["status"] == "built") / (1024 * 1024)
+    print(f"{'-'*60}")
+    print(f"作成: {counts['built']}冊 / スキップ: {counts['skipped']}冊 / 失敗: {counts['failed']}冊"
+          f"（作成したPDFの合計 {total_size:.1f} MB、{elapsed:.1f}秒）")
+
+
+def run_batch(book_dirs, output_dir=None, encoding="original", jpeg_quality=85, jobs=None, force=False, use_cache=True):
+    """
+    複数のディレクトリを1冊ずつPDFに変換する（本単位でプロセスプールに割り当てる）
+    
+    Args:
+        book_dirs (list): 画像ディレクトリのリスト
+        output_dir (str): PDFの保存先（Noneの場合は各画像ディレクトリ内に「ディレクトリ名.pdf」）
+        encoding (str): エンコード方式
+        jpeg_quality (int): カラーページのJPEG品質（adaptive時）
+        jobs (int): 同時に処理する冊数（Noneの場合はCPUコア数）
+        force (bool): 最新のPDFがある本も作り直す
+        use_cache (bool): ビルドキャッシュを使うか
+    
+    Returns:
+        list: 本ごとの結果（build_book の戻り値）
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    start = time.perf_counter()
+    results = []
+    jobs_to_run = []
+    
+    for book_dir in book_dirs:
+        image_files = get_image_files(book_dir)
+        pdf_path = book_pdf_path(book_dir, output_dir)
+        if not image_files:
+            results.append({"dir": book_dir, "pdf": pdf_path, "pages": 0, "seconds": 0.0, "size": None,
+                            "status": "failed", "error": "画像ファイルが見つかりません"})
+        elif not force and is_up_to_date(pdf_path, image_files):
+            results.append({"dir": book_dir, "pdf": pdf_path, "pages": len(image_files), "seconds": 0.0,
+                            "size": os.path.getsize(pdf_path), "status": "skipped", "error": None})
+        else:
+            jobs_to_run.append((book_dir, pdf_path, encoding, jpeg_quality, use_cache))
+    
+    print(f"対象: {len(book_dirs)}冊（作成: {len(jobs_to_run)}冊 / 最新のためスキップ: "
+          f"{sum(1 for r in results if r['status'] == 'skipped')}冊）")
+    
+    if jobs_to_run:
+        workers = min(jobs or os.cpu_count() or 1, len(jobs_to_run))
+        print(f"{workers}プロセスで処理します...\n")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(build_book, job): job for job in jobs_to_run}
+            for done, future in enumerate(as_completed(futures), 1):
+                book_dir = futures[future][0]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"dir": book_dir, "pdf": futures[future][1], "pages": 0, "seconds": 0.0,
+                              "size": None, "status": "failed", "error": str(e)}
+                mark = "✓" if result["status"] == "built" else "✗"
+                print(f"  {mark} [{done}/{len(jobs_to_run)}] {os.path.basename(os.path.normpath(book_dir))}"
+                      f"（{result['seconds']:.1f}秒）")
+                results.append(result)
+    
+    # 入力の順番で表示する
+    order = {book_dir: index for index, book_dir in enumerate(book_dirs)}
+    results.sort(key=lambda r: order[r["dir"]])
+    print_batch_summary(results, time.perf_counter() - start)
+    return results
+
+
+def parse_args():
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="画像からPDF作成ツール")
+    parser.add_argument("--batch", metavar="ROOT",
+                        help="ROOT以下の画像を含むディレクトリをすべて1冊ずつPDFに変換する（確認なしで実行）")
+    parser.add_argument("--dirs", nargs="+", metavar="DIR", help="指定したディレクトリを1冊ずつPDFに変換する（確認なしで実行）")
+    parser.add_argument("--output-dir", help="バッチモードのPDFの保存先（省略時は各ディレクトリ内に「ディレクトリ名.pdf」）")
+    parser.add_argument("--jobs", type=int, help="バッチモードで同時に処理する冊数（省略時はCPUコア数）")
+    parser.add_argument("--encoding", choices=["original", "adaptive"], help="エンコード方式（省略時は config.json の pdf_encoding）")
+    parser.add_argument("--force", action="store_true", help="最新のPDFがある本も作り直す")
+    parser.add_argument("--no-cache", action="store_true", help="ビルドキャッシュを使わずにすべてのページをエンコードする")
+    return parser.parse_args()
+
+
 def main():
     """メイン処理"""
+    args = parse_args()
+    
     print("="*60)
     print("画像からPDF作成ツール")
     print("="*60)
@@ -97,6 +507,23 @@ def main():
     # 設定を読み込む
     config = load_config()
     
+    if args.batch or args.dirs:
+        # バッチモード（画像は削除しない）
+        book_dirs = list(args.dirs or [])
+        if args.batch:
+            if not os.path.isdir(args.batch):
+                print(f"エラー: ディレクトリが見つかりません: {args.batch}")
+                return
+            book_dirs += find_book_dirs(args.batch)
+        run_batch(book_dirs,
+                  output_dir=args.output_dir,
+                  encoding=args.encoding or config.get("pdf_encoding", "original"),
+                  jpeg_quality=config.get("jpeg_quality", 85),
+                  jobs=args.jobs or config.get("pdf_workers", None),
+                  force=args.force,
+                  use_cache=config.get("pdf_cache", True) and not args.no_cache)
+        return
+    
     # 画像ディレクトリ
     image_dir = config.get("output_dir", "data")
     
@@ -106,6 +533,11 @@ def main():
     # 出力PDFファイル名
     pdf_filename = config.get("pdf_filename", None)
     
+    # エンコード方式（original / adaptive）
+    encoding = args.encoding or config.get("pdf_encoding", "original")
+    jpeg_quality = config.get("jpeg_quality", 85)
+    workers = config.get("pdf_workers", None)
+    
     print(f"画像ディレクトリ: {image_dir}")
     
     # ディレクトリが存在するか確認
@@ -141,7 +573,8 @@ def main():
         return
     
     # PDFを作成
-    success = create_pdf(image_files, pdf_filename, delete_images)
+    use_cache = config.get("pdf_cache", True) and not args.no_cache
+    success = create_pdf(image_files, pdf_filename, delete_images, encoding, jpeg_quality, workers, use_cache)
     
     if success:
         print(f"\n{'='*60}")
@@ -0,0 +1,120 @@
+"""
+ページ内に注入したMutationObserverによるページ変化の通知
+リーダーは単一ページアプリのため、ページを送ってもURLが変わらないことが多い
+DOMの変更と画像などの読み込み完了を数えるスクリプトを新しいドキュメントごとに注入し、
+ページ送り後は非同期スクリプトで「変更があり、その後一定時間変更がない」状態になった瞬間に戻る
+"""
+
+
+# ページに注入するスクリプト（何度実行しても1回だけ初期化される）
+# window.__kindle2pdfEvents = {changes: 変更回数, lastChange: 最後の変更時刻(ms), loads: 読み込み完了回数}
+# 変更回数はドキュメントを離れる時に sessionStorage に保存し、再読み込み後はその続きから数える
+# （再読み込みで回数が減ると、ページ送り前の値を超えるまで変化なしと判定されてしまうため）
+PAGE_EVENTS_JS = r"""
+(function() {
+    if (window.__kindle2pdfEvents) return;
+    var saved = 0;
+    try { saved = parseInt(sessionStorage.getItem('__kindle2pdfChanges') || '0', 10) || 0; } catch (e) {}
+    // 再読み込み自体も1回の変更として数える
+    var state = window.__kindle2pdfEvents = {changes: saved + 1, lastChange: performance.now(), loads: 0};
+    
+    function touch() {
+        state.changes++;
+        state.lastChange = performance.now();
+    }
+    
+    new MutationObserver(touch).observe(document, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    
+    // 画像やフレームの読み込み完了（loadはバブリングしないためキャプチャで受け取る）
+    document.addEventListener('load', function() { state.loads++; touch(); }, true);
+    window.addEventListener('load', touch);
+    window.addEventListener('pagehide', function() {
+        try { sessionStorage.setItem('__kindle2pdfChanges', String(state.changes)); } catch (e) {}
+    });
+})();
+"""
+
+# 変更回数が baseline を超え、その後 idleMs の間変更がなくなるまで待つ非同期スクリプト
+# 引数: baseline, idleMs, timeoutMs, callback
+# 結果: {changed: 変更があったか, elapsed: 経過時間(ms), timedOut: 上限に達したか}
+WAIT_FOR_CHANGE_JS = r"""
+var baseline = arguments[0], idleMs = arguments[1], timeoutMs = arguments[2];
+var done = arguments[arguments.length - 1];
+var state = window.__kindle2pdfEvents;
+var start = performance.now();
+
+function check() {
+    var now = performance.now();
+    var changed = !!state && state.changes > baseline;
+    if (changed && now - state.lastChange >= idleMs) {
+        done({changed: true, elapsed: now - start, timedOut: false});
+    } else if (now - start >= timeoutMs) {
+        done({changed: changed, elapsed: now - start, timedOut: true});
+    } else {
+        setTimeout(check, Math.min(idleMs / 2, 50));
+    }
+}
+check();
+"""
+
+
+class PageEventMonitor:
+    """注入したスクリプトによるページ変化の監視"""
+    
+    def __init__(self, driver):
+        """
+        初期化
+        
+        Args:
+            driver: WebDriver（Chrome）
+        """
+        self.driver = driver
+        self._script_timeout = None  # 設定済みの非同期スクリプトのタイムアウト（秒）
+    
+    def install(self):
+        """
+        スクリプトを注入する（以降に開くドキュメントと、現在のドキュメントの両方）
+        CDPの設定はタブごとのため、本を新しいタブで開いた場合はそのタブで再度呼ぶ
+        """
+        self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': PAGE_EVENTS_JS})
+        self.driver.execute_script(PAGE_EVENTS_JS)
+    
+    def counter(self):
+        """
+        現在の変更回数（スクリプトがない場合は注入してから0を返す）
+        
+        Returns:
+            int: 変更回数
+        """
+        count = self.driver.execute_script(
+            "return window.__kindle2pdfEvents ? window.__kindle2pdfEvents.changes : null;")
+        if count is None:
+            self.driver.execute_script(PAGE_EVENTS_JS)
+            return 0
+        return count
+    
+    def wait_for_change(self, baseline, idle_ms, timeout):
+        """
+        ページが変わって表示が落ち着くまで待つ
+        
+        Args:
+            baseline (int): ページ送り前の変更回数（counter() の値。Noneの場合は変化を待たずに落ち着くのを待つ）
+            idle_ms (int): 変更がこの時間（ミリ秒）続かなければ落ち着いたとみなす
+            timeout (float): 最大待機時間（秒）
+        
+        Returns:
+            bool: ページが変わった場合True、変更がなかった場合False、確認できなかった場合None
+        """
+        if baseline is None:
+            baseline = -1
+        
+        # タイムアウトは変わった場合だけ設定する（毎ページのドライバーとの往復を省く）
+        if self._script_timeout != timeout + 5:
+            self.driver.set_script_timeout(timeout + 5)
+            self._script_timeout = timeout + 5
+        result = self.driver.execute_async_script(WAIT_FOR_CHANGE_JS, baseline, idle_ms, int(timeout * 1000))
+        if not result:
+            return None
+        return result['changed']
@@ -0,0 +1,117 @@
+"""
+ページ番号表示（例: "5 / 196"）の位置をキャッシュして読み取る
+最初に見つけた表示要素をページ内のグローバル変数と要素パス（CSSセレクター）で記録し、
+以降はその要素だけを読む。記録した要素が一致しなくなった場合のみ、全テキストノードを走査し直す
+"""
+
+
+# ページ番号表示を探すJavaScript関数（findPageInfo(cachedPath) を定義する）
+# 戻り値: {info: {text, current, total}, path: 要素パス, scanned: 全走査したか}、見つからない場合はnull
+FIND_PAGE_INFO_JS = r"""
+function findPageInfo(cachedPath) {
+    var patterns = [
+        /(\d+)\s*\/\s*(\d+)/,
+        /Page\s+(\d+)\s+of\s+(\d+)/i
+    ];
+    
+    function read(element) {
+        if (!element || !element.isConnected) return null;
+        var text = (element.textContent || '').trim();
+        if (text.length > 200) return null;  // 本文などの大きな要素は対象外
+        for (var i = 0; i < patterns.length; i++) {
+            var match = text.match(patterns[i]);
+            if (match) {
+                return {text: text, current: parseInt(match[1]), total: parseInt(match[2])};
+            }
+        }
+        return null;
+    }
+    
+    // 要素パス（idがあればそこを起点にしたCSSセレクター）
+    function elementPath(element) {
+        var parts = [];
+        while (element && element.nodeType === 1 && element !== document.body) {
+            if (element.id) {
+                parts.unshift('#' + CSS.escape(element.id));
+                return parts.join(' > ');
+            }
+            var index = 1, sibling = element;
+            while ((sibling = sibling.previousElementSibling)) {
+                if (sibling.tagName === element.tagName) index++;
+            }
+            parts.unshift(element.tagName.toLowerCase() + ':nth-of-type(' + index + ')');
+            element = element.parentElement;
+        }
+        parts.unshift('body');
+        return parts.join(' > ');
+    }
+    
+    // 1. 前回の要素（同じドキュメント内ならそのまま読む）
+    var info = read(window.__kindle2pdfIndicator);
+    if (info) return {info: info, path: cachedPath, scanned: false};
+    
+    // 2. 記録した要素パス（ページの再読み込み後など）
+    if (cachedPath) {
+        var element = null;
+        try { element = document.querySelector(cachedPath); } catch (e) {}
+        info = read(element);
+        if (info) {
+            window.__kindle2pdfIndicator = element;
+            return {info: info, path: cachedPath, scanned: false};
+        }
+    }
+    
+    // 3. すべてのテキストノードを走査
+    var walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
+    var node;
+    while ((node = walker.nextNode())) {
+        info = read(node.parentElement);
+        if (info) {
+            window.__kindle2pdfIndicator = node.parentElement;
+            return {info: info, path: elementPath(node.parentElement), scanned: true};
+        }
+    }
+    window.__kindle2pdfIndicator = null;
+    return null;
+}
+"""
+
+
+class PageIndicatorLocator:
+    """ページ番号表示の位置のキャッシュ"""
+    
+    def __init__(self):
+        self.path = None  # 表示要素のCSSセレクター
+        self.scans = 0  # 全走査を行った回数
+    
+    def remember(self, located):
+        """
+        findPageInfo の結果から位置を記録し、ページ番号情報を返す
+        
+        Args:
+            located (dict): findPageInfo の戻り値
+        
+        Returns:
+            dict: ページ番号情報（{"text", "current", "total"}）、見つからない場合はNone
+        """
+        if not located:
+            return None
+        if located.get("scanned"):
+            self.scans += 1
+            if located.get("path") != self.path:
+                print(f"  ページ番号表示の位置を記録しました: {located.get('path')}")
+        self.path = located.get("path")
+        return located.get("info")
+    
+    def read(self, driver):
+        """
+        ページ番号表示を読み取る（単独で実行する場合）
+        
+        Args:
+            driver: WebDriver
+        
+        Returns:
+            dict: ページ番号情報、見つからない場合はNone
+        """
+        located = driver.execute_script(FIND_PAGE_INFO_JS + "\nreturn findPageInfo(arguments[0]);", self.path)
+        return self.remember(located)
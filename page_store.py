@@ -0,0 +1,110 @@
+"""
+内容アドレス方式のページストア
+フレームを内容のダイジェストをファイル名として output_dir/store/ab/<digest>.png に保存し、
+セッションごとのマニフェスト（ページ番号 -> ダイジェスト）でページの並びを記録する
+同じ内容のフレーム（白紙ページや、ページ送り失敗後の再キャプチャなど）は1回だけ保存される
+"""
+
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime
+
+
+class PageStore:
+    """output_dir に置く内容アドレス方式のページストア"""
+    
+    DIRNAME = "store"
+    MANIFEST_PATTERN = "manifest_*.json"
+    
+    def __init__(self, output_dir):
+        """
+        初期化
+        
+        Args:
+            output_dir (str): スクリーンショットの保存先ディレクトリ
+        """
+        self.output_dir = output_dir
+        self.dir = os.path.join(output_dir, self.DIRNAME)
+        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    @staticmethod
+    def digest(frame):
+        """
+        フレームの内容のダイジェスト（画素データ・サイズ・モードから計算）
+        
+        Args:
+            frame (PIL.Image.Image): フレーム
+        
+        Returns:
+            str: SHA-1の16進文字列
+        """
+        digest = hashlib.sha1(f"{frame.mode}:{frame.width}x{frame.height}:".encode())
+        digest.update(frame.tobytes())
+        return digest.hexdigest()
+    
+    def path_for(self, digest):
+        """
+        ダイジェストに対応する保存先のパス（先頭2文字でディレクトリを分ける）
+        
+        Args:
+            digest (str): ダイジェスト
+        
+        Returns:
+            str: 画像ファイルのパス
+        """
+        directory = os.path.join(self.dir, digest[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, digest + ".png")
+    
+    @property
+    def manifest_path(self):
+        """このセッションのマニフェストのパス"""
+        return os.path.join(self.output_dir, f"manifest_{self.session_id}.json")
+    
+    def write_manifest(self, image_files):
+        """
+        このセッションのマニフェストを書き込む（ページ番号順の画像ファイルから作成）
+        
+        Args:
+            image_files (list): ページ順の画像ファイルのパス（ストア内のファイル）
+        """
+        pages = []
+        for page_num, path in enumerate(image_files, 1):
+            pages.append({
+                "page": page_num,
+                "digest": os.path.splitext(os.path.basename(path))[0],
+                "file": os.path.relpath(path, self.output_dir).replace(os.sep, "/"),
+            })
+        
+        manifest = {
+            "session": self.session_id,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "pages": pages,
+        }
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.manifest_path)
+    
+    @classmethod
+    def latest_manifest_files(cls, output_dir):
+        """
+        最新のマニフェストからページ順の画像ファイルを取得
+        
+        Args:
+            output_dir (str): マニフェストを探すディレクトリ
+        
+        Returns:
+            list: 画像ファイルのパス（同じ画像が複数のページで使われる場合は同じパスが並ぶ）。マニフェストがない場合は空のリスト
+        """
+        manifests = sorted(glob.glob(os.path.join(output_dir, cls.MANIFEST_PATTERN)))
+        if not manifests:
+            return []
+        
+        with open(manifests[-1], "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        
+        pages = sorted(manifest.get("pages", []), key=lambda page: page["page"])
+        return [os.path.join(output_dir, *page["file"].split("/")) for page in pages]
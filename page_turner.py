@@ -0,0 +1,229 @@
+"""
+ページ送りの方法を自動で選ぶエンジン
+利用できる方法（Seleniumのキー送信 / JavaScriptのKeyboardEvent / PyAutoGUIのクリック+キー）を一度だけ順に試し、
+実際にページが変わった方法を記憶して以降はその方法だけを使う
+記憶した方法でページが変わらない状態が続いた場合のみ、その方法を除いて再び方法を探し直す
+"""
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.common.keys import Keys
+from trace_timing import Tracer
+
+
+# ページ送り方法（探索する順番）
+METHODS = ("selenium", "javascript", "pyautogui")
+
+# 方向ごとのキー情報 (Seleniumのキー, KeyboardEventのkey, keyCode, PyAutoGUIのキー名, 表示名)
+ARROW_KEYS = {
+    "left": (Keys.ARROW_LEFT, "ArrowLeft", 37, "left", "左"),
+    "right": (Keys.ARROW_RIGHT, "ArrowRight", 39, "right", "右"),
+}
+
+# KeyboardEvent を発火するスクリプト（引数: key, keyCode）
+DISPATCH_KEY_SCRIPT = """
+    var event = new KeyboardEvent('keydown', {
+        key: arguments[0],
+        code: arguments[0],
+        keyCode: arguments[1],
+        which: arguments[1],
+        bubbles: true,
+        cancelable: true
+    });
+    document.dispatchEvent(event);
+"""
+
+
+class PageTurner:
+    """ページ送り方法の探索と記憶"""
+    
+    def __init__(self, driver, direction="left", methods=METHODS, reprobe_after=2, tracer=None):
+        """
+        初期化
+        
+        Args:
+            driver: WebDriver
+            direction (str): 次のページへ進むキー（'left' または 'right'）
+            methods (list): 探索するページ送り方法（順番どおりに試す）
+            reprobe_after (int): 記憶した方法でページが変わらない状態がこの回数続いたら探し直す
+            tracer (Tracer): キー送信時間の計測先（Noneの場合は計測しない）
+        
+        Raises:
+            ValueError: direction または methods が不正な場合
+        """
+        direction = (direction or "left").lower()
+        if direction not in ARROW_KEYS:
+            raise ValueError(f"不正な page_turn_direction 設定です: {direction}（'left' または 'right' を指定してください）")
+        unknown = [method for method in methods if method not in METHODS]
+        if unknown or not methods:
+            raise ValueError(f"不正な navigation_methods 設定です: {methods}（{', '.join(METHODS)} から選択してください）")
+        
+        self.driver = driver
+        self.methods = list(methods)
+        self.reprobe_after = max(1, int(reprobe_after))
+        self.tracer = tracer or Tracer()
+        
+        # キー情報は起動時に一度だけ求める（forward=True が次のページ）
+        backward = "right" if direction == "left" else "left"
+        self.keys = {True: ARROW_KEYS[direction], False: ARROW_KEYS[backward]}
+        self.direction_text = ARROW_KEYS[direction][4]
+        
+        self.method = None  # 記憶しているページ送り方法
+        self.failures = 0  # 記憶した方法でページが変わらなかった連続回数
+        self.failed_methods = set()  # 最後にページ送りを確認できてから、ページが変わらなかった方法（探し直す際は後回しにする）
+        self._body = None  # キャッシュしたbody要素
+    
+    def focus(self):
+        """
+        ブラウザのウィンドウにフォーカスする（方法の探索時のみ）
+        """
+        self.driver.switch_to.window(self.driver.current_window_handle)
+        self.driver.execute_script("window.focus();")
+        self._body = None
+    
+    def _body_element(self):
+        """
+        body要素を取得（キャッシュを使い、ページの再読み込みなどで無効になった場合のみ取得し直す）
+        """
+        if self._body is None:
+            self._body = self.driver.find_element("tag name", "body")
+        return self._body
+    
+    def send(self, method, forward=True):
+        """
+        指定した方法でページ送りキーを1回送る
+        
+        Args:
+            method (str): ページ送り方法
+            forward (bool): Trueなら次のページ、Falseなら前のページ
+        
+        Raises:
+            Exception: キーを送れなかった場合
+        """
+        selenium_key, key_name, key_code, pyautogui_key, _ = self.keys[forward]
+        
+        if method == "selenium":
+            try:
+                self._body_element().send_keys(selenium_key)
+            except StaleElementReferenceException:
+                self._body = None
+                self._body_element().send_keys(selenium_key)
+        
+        elif method == "javascript":
+            self.driver.execute_script(DISPATCH_KEY_SCRIPT, key_name, key_code)
+        
+        elif method == "pyautogui":
+            import pyautogui
+            # 画面中央をクリックしてからキーを送る
+            screen_width, screen_height = pyautogui.size()
+            pyautogui.click(screen_width // 2, screen_height // 2)
+            pyautogui.press(pyautogui_key)
+    
+    def turn(self, wait, forward=True):
+        """
+        ページを1回送る
+        記憶した方法があればその方法だけを使い、なければ方法を探索する
+        
+        Args:
+            wait (callable): キー送信後に呼ばれ、表示の安定を待ってページが変わったか（True/False、不明ならNone）を返す
+                             wait(recheck=True) はキーを送らずにもう一度待って状態を確認する
+            forward (bool): Trueなら次のページ、Falseなら前のページ
+        
+        Returns:
+            tuple: (success, method) キーを送れた場合 success はTrue
+        """
+        method = self.method
+        if method:
+            try:
+                with self.tracer.span("next_page.send_key", method=method):
+                    self.send(method, forward)
+            except Exception as e:
+                print(f"  ✗ ページ送り（{method}）に失敗: {e}")
+                self.forget(failed=True)
+            else:
+                changed = wait()
+                if changed is False:
+                    self.failures += 1
+                    if self.failures >= self.reprobe_after:
+                        print(f"  ⚠️ {self.failures}回連続でページが変わらなかったため、次回は{method}以外のページ送り方法から探し直します")
+                        self.forget(failed=True)
+                else:
+                    self.failures = 0
+                return True, method
+        
+        return self.probe(wait, forward)
+    
+    def probe(self, wait, forward=True):
+        """
+        ページ送り方法を順に試し、ページ送りを確認できた方法を記憶する
+        ページが変わらなかった場合は、キーを送らずに状態を再確認してから次の方法に進む
+        （再確認でページが動いていないことを確かめるため、二重にページを送らない）
+        ページの変化を検出できない場合（wait が None を返す）は、キーを送れた方法をそのまま記憶する
+        前回ページが変わらなかった方法（failed_methods）は最後に試す
+        
+        Args:
+            wait (callable): turn() と同じ
+            forward (bool): Trueなら次のページ、Falseなら前のページ
+        
+        Returns:
+            tuple: (success, method) どの方法でもページが変わらなかった場合は (True, None)
+        """
+        print(f"  ページ送り方法を確認しています（{self.direction_text}矢印キー）...")
+        try:
+            self.focus()
+        except Exception as e:
+            print(f"  ✗ ブラウザのフォーカス切り替えに失敗: {e}")
+            return False, None
+        
+        # 前回ページが変わらなかった方法は後回しにする（順番は methods のまま）
+        candidates = sorted(self.methods, key=lambda method: method in self.failed_methods)
+        sent = False
+        for method in candidates:
+            try:
+                with self.tracer.span("next_page.send_key", method=method):
+                    self.send(method, forward)
+            except Exception as e:
+                print(f"    ✗ {method}: {e}")
+                self.failed_methods.add(method)
+                continue
+            sent = True
+            
+            changed = wait()
+            if changed is False:
+                print(f"    ? {method}: ページが変わりませんでした。状態を再確認します...")
+                changed = wait(recheck=True)
+            if changed is False:
+                # ページが動いていないことを確認済みなので、次の方法のキーを送っても二重送りにはならない
+                print(f"    ✗ {method}: ページが変わりませんでした。次の方法を試します")
+                self.failed_methods.add(method)
+                continue
+            
+            self.method = method
+            self.failures = 0
+            if changed is None:
+                print(f"    ? {method}: ページの変化を確認できませんでした（以降はこの方法を使用）")
+            else:
+                self.failed_methods.clear()
+                print(f"    ✓ {method}: ページ送りを確認しました（以降はこの方法を使用）")
+            return True, method
+        
+        if sent:
+            # キーは届いたがどの方法でもページが変わらなかった（最終ページなど）: 次回は最初から探し直す
+            self.failed_methods.clear()
+            print(f"  ✗ どの方法でもページが変わりませんでした（最終ページの可能性があります）")
+            return True, None
+        
+        print(f"  ✗✗✗ すべてのページ送り方法が失敗しました ✗✗✗")
+        return False, None
+    
+    def forget(self, failed=False):
+        """
+        記憶した方法を破棄し、次回のページ送りで探し直す
+        
+        Args:
+            failed (bool): 記憶した方法でページが変わらなかった場合True（探し直す際はその方法を最後に試す）
+        """
+        if failed and self.method:
+            self.failed_methods.add(self.method)
+        self.method = None
+        self.failures = 0
+        self._body = None
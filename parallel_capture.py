@@ -0,0 +1,168 @@
+"""
+複数のブラウザセッションによる並列キャプチャ
+本のページ範囲をN個に分割し、それぞれをヘッドレスChromeのセッション（別プロセス）でキャプチャする
+各セッションは担当範囲の先頭ページへ移動してから順にキャプチャし、結果はページ順に結合される
+"""
+
+import contextlib
+import time
+import traceback
+from urllib.parse import urlsplit
+
+
+def plan_ranges(total_pages, sessions, first_page=1):
+    """
+    ページ範囲をセッション数で均等に分割する
+    
+    Args:
+        total_pages (int): 最後のページ番号
+        sessions (int): セッション数
+        first_page (int): 最初のページ番号
+    
+    Returns:
+        list: (開始ページ, 終了ページ) のリスト（終了ページを含む）
+    """
+    count = total_pages - first_page + 1
+    sessions = max(1, min(sessions, count))
+    ranges = []
+    start = first_page
+    for index in range(sessions):
+        size = count // sessions + (1 if index < count % sessions else 0)
+        ranges.append((start, start + size - 1))
+        start += size
+    return ranges
+
+
+def _open_start_page(app, start, jump_url_template, reader_url, cookies):
+    """
+    セッションのブラウザで担当範囲の先頭ページを開く
+    
+    Returns:
+        bool: 先頭ページに移動できた場合True
+    """
+    url = jump_url_template.format(page=start) if jump_url_template else reader_url
+    
+    if cookies:
+        # ログイン状態をメインのセッションから引き継ぐ（Cookieは同じドメインを開いてから設定する）
+        parts = urlsplit(url)
+        app.driver.get(f"{parts.scheme}://{parts.netloc}/")
+        for cookie in cookies:
+            cookie = {key: value for key, value in cookie.items() if key != "sameSite"}
+            try:
+                app.driver.add_cookie(cookie)
+            except Exception:
+                pass  # 別ドメインのCookieなど
+    
+    app.driver.get(url)
+    
+    # ページ番号表示が読めるようになるまで待つ
+    page_info = None
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        page_info = app.get_page_state()['page_info']
+        if page_info:
+            break
+        time.sleep(0.5)
+    
+    if page_info and page_info['current'] == start:
+        return True
+    if page_info:
+        # ジャンプできない、またはずれている場合はページ番号表示を見ながら移動する
+        return app.seek_to_page_info({'current': start, 'total': page_info['total']})
+    # ページ番号表示がない場合はジャンプ先のURLを信頼する
+    return bool(jump_url_template)
+
+
+def missing_ranges(ranges, captured):
+    """
+    キャプチャできなかったページ範囲を求める
+    
+    Args:
+        ranges (list): plan_ranges() が返した (開始ページ, 終了ページ) のリスト
+        captured (iterable): 保存できたページ番号（capture_range() の結果の pages のページ番号）
+    
+    Returns:
+        list: (開始ページ, 終了ページ) のリスト（終了ページを含む）
+    """
+    captured = set(captured)
+    missing = []
+    for start, end in ranges:
+        for page in range(start, end + 1):
+            if page in captured:
+                continue
+            if missing and missing[-1][1] == page - 1:
+                missing[-1] = (missing[-1][0], page)
+            else:
+                missing.append((page, page))
+    return missing
+
+
+def capture_range(job):
+    """
+    1つのセッションで担当範囲をキャプチャする（プロセスプールから呼ばれる）
+    
+    Args:
+        job (dict): config_path, overrides, start, end, index, jump_url_template, reader_url, cookies, log_path
+    
+    Returns:
+        dict: start, end, pages（保存できたページの (ページ番号, 画像パス) のリスト）, settle_times, frame_qualities, error
+    """
+    from kindle_to_pdf import KindleToPDF
+    
+    start, end = job["start"], job["end"]
+    result = {"start": start, "end": end, "pages": [], "settle_times": [], "frame_qualities": [], "error": None}
+    captured = []  # (ページ番号, 画像パス)
+    
+    with open(job["log_path"], "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        app = None
+        try:
+            app = KindleToPDF(job["config_path"], config_overrides=job["overrides"])
+            app.setup_browser()
+            print(f"セッション{job['index']}: {start}～{end}ページを担当します")
+            
+            if not _open_start_page(app, start, job["jump_url_template"], job["reader_url"], job["cookies"]):
+                raise RuntimeError(f"{start}ページ目に移動できませんでした")
+            
+            for page in range(start, end + 1):
+                print(f"ページ {page}/{end} をキャプチャ中...")
+                path = app.take_screenshot(page)
+                app.images.append(path)
+                captured.append((page, path))
+                if page < end and not app.next_page():
+                    raise RuntimeError(f"{page}ページ目からのページ送りに失敗しました")
+            
+            app.flush_image_writer()
+        except Exception as e:
+            result["error"] = str(e)
+            traceback.print_exc()
+        finally:
+            if app:
+                app.flush_image_writer()
+                # 保存に失敗した画像は app.images から除外されるため、残った画像のページだけを返す
+                saved = set(app.images)
+                result["pages"] = [(page, path) for page, path in captured if path in saved]
+                result["settle_times"] = list(app.settle_times)
+                result["frame_qualities"] = list(app.frame_qualities)
+                app.cleanup()
+    
+    return result
+
+
+def worker_overrides():
+    """
+    並列セッション用の設定の上書き
+    各セッションはヘッドレスで動作し、保存した画像をメインのセッションが結合する
+    """
+    return {
+        "headless": True,
+        "capture_backend": "cdp",
+        "use_chrome_profile": False,  # 同じプロファイルは複数のChromeで同時に使えないため、Cookieで引き継ぐ
+        "session_journal": False,
+        "streaming_pdf": False,
+        "page_store": False,  # マニフェストはセッションごとに書けないため、ページ番号のファイル名で保存する
+        "auto_crop": False,  # セッションごとに範囲を推定すると、結合したPDFのページの大きさが揃わないため
+        "screenshot_region": None,  # メインの画面座標はヘッドレスChromeのビューポート座標と対応しないため
+        "delete_screenshots": False,
+        "trace_timing": False,
+        "parallel_sessions": 1,
+    }
@@ -0,0 +1,125 @@
+"""
+PDF作成のビルドキャッシュ
+エンコード済みのページ画像を、画像内容のハッシュとエンコード設定をキーとして画像ディレクトリ内に保存する
+作り直しの際は変更された画像だけをエンコードし、それ以外はキャッシュから取り出してPDFに組み込む
+"""
+
+import hashlib
+import json
+import os
+
+
+class PageCache:
+    """画像ディレクトリ内に置くエンコード済みページのキャッシュ"""
+    
+    DIRNAME = ".pdf_cache"
+    
+    def __init__(self, image_dir, settings):
+        """
+        初期化
+        
+        Args:
+            image_dir (str): 画像ディレクトリ（この中にキャッシュディレクトリを作る）
+            settings (dict): エンコード結果に影響する設定（方式・品質・しきい値など）。変わるとキャッシュは使われない
+        """
+        self.dir = os.path.join(image_dir, self.DIRNAME)
+        self.settings_digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self._used = set()
+    
+    def key(self, image_path):
+        """
+        画像ファイルのキャッシュキー（内容のハッシュ + 設定のハッシュ）
+        
+        Args:
+            image_path (str): 画像ファイルのパス
+        
+        Returns:
+            str: キャッシュキー
+        """
+        digest = hashlib.sha1()
+        with open(image_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return f"{digest.hexdigest()}-{self.settings_digest}"
+    
+    def _path(self, key):
+        return os.path.join(self.dir, key + ".page")
+    
+    def contains(self, key):
+        """
+        キャッシュにエントリがあるか（データは読み込まない）
+        
+        Args:
+            key (str): キャッシュキー
+        
+        Returns:
+            bool: エントリがある場合True
+        """
+        return os.path.exists(self._path(key))
+    
+    def get(self, key):
+        """
+        キャッシュからエンコード済みのページを取り出す
+        
+        Args:
+            key (str): キャッシュキー
+        
+        Returns:
+            tuple: (PDF画像データ, ページ分類)、キャッシュにない場合はNone
+        """
+        self._used.add(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                header, data = f.read().split(b"\n", 1)
+            meta = json.loads(header)
+        except (OSError, ValueError):
+            return None
+        
+        kind = meta.pop("kind")
+        meta["dpi"] = tuple(meta["dpi"])
+        meta["data"] = data
+        return meta, kind
+    
+    def put(self, key, encoded, kind):
+        """
+        エンコード済みのページをキャッシュに保存する（1行目にJSONのヘッダー、続けて画像データ）
+        
+        Args:
+            key (str): キャッシュキー
+            encoded (dict): PDF画像データ
+            kind (str): ページ分類
+        """
+        self._used.add(key)
+        meta = {name: value for name, value in encoded.items() if name != "data"}
+        meta["kind"] = kind
+        
+        os.makedirs(self.dir, exist_ok=True)
+        temp_path = self._path(key) + ".tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+                f.write(encoded["data"])
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"  警告: キャッシュを保存できませんでした: {e}")
+    
+    def prune(self):
+        """
+        今回のビルドで使わなかったキャッシュを削除する（差し替え前の画像や古い設定の分）
+        
+        Returns:
+            int: 削除したファイル数
+        """
+        if not os.path.isdir(self.dir):
+            return 0
+        
+        removed = 0
+        for name in os.listdir(self.dir):
+            if name.endswith(".page") and name[:-5] in self._used:
+                continue
+            try:
+                os.remove(os.path.join(self.dir, name))
+                removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,379 @@
+"""
+画像を1ページずつPDFに追記するストリーミングPDFライター
+キャプチャ中にページを書き足していき、終了時にページツリー・xref・trailerを書いて完成させる
+"""
+
+import io
+import os
+import shutil
+import struct
+import threading
+import zlib
+from PIL import Image
+
+
+DEFAULT_DPI = 96  # 解像度情報がない画像のDPI（img2pdfと同じ扱い）
+
+
+def _pdf_value(value):
+    """
+    Python の値をPDFオブジェクトの表記に変換する
+    
+    Args:
+        value: 変換する値（文字列は "/Name" や "3 0 R" などのPDF表記としてそのまま出力、bytesは16進文字列）
+    
+    Returns:
+        bytes: PDF表記
+    """
+    if isinstance(value, bool):
+        return b"true" if value else b"false"
+    if isinstance(value, int):
+        return str(value).encode()
+    if isinstance(value, float):
+        return (f"{value:.4f}".rstrip("0").rstrip(".") or "0").encode()
+    if isinstance(value, str):
+        return value.encode("latin-1")
+    if isinstance(value, bytes):
+        return b"<" + value.hex().encode() + b">"
+    if isinstance(value, (list, tuple)):
+        return b"[" + b" ".join(_pdf_value(v) for v in value) + b"]"
+    if isinstance(value, dict):
+        items = b" ".join(b"/" + k.encode() + b" " + _pdf_value(v) for k, v in value.items())
+        return b"<< " + items + b" >>"
+    raise TypeError(f"PDFに変換できない値です: {value!r}")
+
+
+def image_dpi(image):
+    """
+    画像のDPIを取得（情報がない場合は DEFAULT_DPI）
+    
+    Returns:
+        tuple: (x_dpi, y_dpi)
+    """
+    dpi = image.info.get("dpi")
+    if not dpi or not dpi[0] or not dpi[1]:
+        return (DEFAULT_DPI, DEFAULT_DPI)
+    return (round(float(dpi[0])), round(float(dpi[1])))
+
+
+def _read_png_chunks(data):
+    """
+    PNGのチャンクを読み出す
+    
+    Returns:
+        list: (type, payload) のリスト
+    """
+    chunks = []
+    pos = 8  # シグネチャ
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        chunks.append((chunk_type, data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+        if chunk_type == b"IEND":
+            break
+    return chunks
+
+
+def _png_passthrough(data, image):
+    """
+    PNGの圧縮データ（IDAT）を再圧縮せずにPDF用に取り出す
+    
+    Returns:
+        dict: PDF画像データ（そのまま使えない形式の場合はNone）
+    """
+    chunks = _read_png_chunks(data)
+    if not chunks or chunks[0][0] != b"IHDR":
+        return None
+    
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", chunks[0][1])
+    if interlace != 0 or bit_depth > 8:
+        return None
+    
+    if color_type == 0:
+        colorspace, colors = "/DeviceGray", 1
+    elif color_type == 2:
+        colorspace, colors = "/DeviceRGB", 3
+    elif color_type == 3:
+        palette = b"".join(payload for chunk_type, payload in chunks if chunk_type == b"PLTE")
+        if not palette:
+            return None
+        colorspace, colors = ["/Indexed", "/DeviceRGB", len(palette) // 3 - 1, palette], 1
+    else:
+        return None  # アルファ付きは再エンコードする
+    
+    return {
+        "width": width,
+        "height": height,
+        "dpi": image_dpi(image),
+        "colorspace": colorspace,
+        "bpc": bit_depth,
+        "filter": "/FlateDecode",
+        "decode_parms": {"Predictor": 15, "Colors": colors, "BitsPerComponent": bit_depth, "Columns": width},
+        "data": b"".join(payload for chunk_type, payload in chunks if chunk_type == b"IDAT"),
+    }
+
+
+def encode_pdf_image(image, dpi=None, compress_level=6):
+    """
+    PIL画像を無損失（Flate）でPDF用にエンコードする
+    
+    Args:
+        image (PIL.Image.Image): 画像
+        dpi (tuple): DPI（Noneの場合は画像の情報から取得）
+        compress_level (int): zlibの圧縮レベル
+    
+    Returns:
+        dict: PDF画像データ
+    """
+    if image.mode == "1":
+        colorspace, bpc = "/DeviceGray", 1
+    elif image.mode == "L":
+        colorspace, bpc = "/DeviceGray", 8
+    else:
+        image = image.convert("RGB")
+        colorspace, bpc = "/DeviceRGB", 8
+    
+    return {
+        "width": image.width,
+        "height": image.height,
+        "dpi": dpi or image_dpi(image),
+        "colorspace": colorspace,
+        "bpc": bpc,
+        "filter": "/FlateDecode",
+        "decode_parms": None,
+        "data": zlib.compress(image.tobytes(), compress_level),
+    }
+
+
+def load_pdf_image(image_path):
+    """
+    画像ファイルをPDF用の画像データに変換する
+    JPEGとPNG（アルファなし）は圧縮データをそのまま埋め込み、それ以外は再エンコードする
+    
+    Args:
+        image_path (str): 画像ファイルのパス
+    
+    Returns:
+        dict: PDF画像データ
+    """
+    with open(image_path, "rb") as f:
+        data = f.read()
+    
+    with Image.open(io.BytesIO(data)) as image:
+        if image.format == "JPEG" and image.mode in ("L", "RGB"):
+            return {
+                "width": image.width,
+                "height": image.height,
+                "dpi": image_dpi(image),
+                "colorspace": "/DeviceGray" if image.mode == "L" else "/DeviceRGB",
+                "bpc": 8,
+                "filter": "/DCTDecode",
+                "decode_parms": None,
+                "data": data,
+            }
+        
+        if image.format == "PNG":
+            encoded = _png_passthrough(data, image)
+            if encoded:
+                return encoded
+        
+        image.load()
+        if image.mode in ("RGBA", "LA", "P"):
+            # 透過部分は白で塗りつぶす
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            return encode_pdf_image(background, image_dpi(image))
+        return encode_pdf_image(image)
+
+
+class StreamingPDFWriter:
+    """ページを順次追記していくPDFライター"""
+    
+    PAGES_OBJ = 2  # ページツリーのオブジェクト番号（終了時に書き込む）
+    CATALOG_OBJ = 1
+    
+    def __init__(self, path):
+        """
+        初期化
+        
+        Args:
+            path (str): 書き込み中の一時ファイルのパス（close時に最終ファイル名へ移動する）
+        """
+        self.path = path
+        self._file = open(path, "wb")
+        self._offsets = {}
+        self._next_obj = 3
+        self._pages = {}  # ページ番号 -> ページオブジェクト番号
+        self._images = {}  # 画像のキー -> (画像オブジェクト番号, 幅pt, 高さpt)（同じ画像は1回だけ埋め込む）
+        self._loading = {}  # 読み込み中の画像のキー -> 埋め込みの完了を知らせるイベント
+        self._lock = threading.Lock()
+        self.closed = False
+        
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    
+    def _write_object(self, obj_num, body, stream=None):
+        """
+        間接オブジェクトを書き込む
+        """
+        self._offsets[obj_num] = self._file.tell()
+        self._file.write(f"{obj_num} 0 obj\n".encode())
+        self._file.write(body)
+        if stream is not None:
+            self._file.write(b"\nstream\n")
+            self._file.write(stream)
+            self._file.write(b"\nendstream")
+        self._file.write(b"\nendobj\n")
+    
+    def _allocate(self, count):
+        """
+        オブジェクト番号を確保する
+        """
+        first = self._next_obj
+        self._next_obj += count
+        return range(first, first + count)
+    
+    def add_page(self, encoded, page_num, key=None):
+        """
+        エンコード済みの画像を1ページとして追記する（スレッドセーフ）
+        
+        Args:
+            encoded (dict): load_pdf_image / encode_pdf_image が返す画像データ（key の画像が埋め込み済みならNoneでもよい）
+            page_num (int): ページ番号（ページの並び順に使われる。追記の順序は問わない）
+            key (str): 画像のキー（同じキーの画像は1回だけ埋め込み、各ページから参照する）
+        """
+        with self._lock:
+            if self.closed:
+                raise ValueError("PDFはすでに完成しています")
+            
+            if key is not None and key in self._images:
+                image_obj, width_pt, height_pt = self._images[key]
+            else:
+                image_obj, width_pt, height_pt = self._write_image(encoded)
+                if key is not None:
+                    self._images[key] = (image_obj, width_pt, height_pt)
+            
+            content = f"q {_pdf_value(width_pt).decode()} 0 0 {_pdf_value(height_pt).decode()} 0 0 cm /Im0 Do Q".encode()
+            content_obj, page_obj = self._allocate(2)
+            self._write_object(content_obj, _pdf_value({"Length": len(content)}), content)
+            self._write_object(page_obj, _pdf_value({
+                "Type": "/Page",
+                "Parent": f"{self.PAGES_OBJ} 0 R",
+                "MediaBox": [0, 0, width_pt, height_pt],
+                "Resources": {"XObject": {"Im0": f"{image_obj} 0 R"}},
+                "Contents": f"{content_obj} 0 R",
+            }))
+            self._pages[page_num] = page_obj
+    
+    def _write_image(self, encoded):
+        """
+        画像XObjectを書き込む（ロックを取得した状態で呼ぶ）
+        
+        Returns:
+            tuple: (オブジェクト番号, ページの幅pt, ページの高さpt)
+        """
+        image_dict = {
+            "Type": "/XObject",
+            "Subtype": "/Image",
+            "Width": encoded["width"],
+            "Height": encoded["height"],
+            "ColorSpace": encoded["colorspace"],
+            "BitsPerComponent": encoded["bpc"],
+            "Filter": encoded["filter"],
+        }
+        if encoded.get("decode_parms"):
+            image_dict["DecodeParms"] = encoded["decode_parms"]
+        image_dict["Length"] = len(encoded["data"])
+        
+        image_obj, = self._allocate(1)
+        self._write_object(image_obj, _pdf_value(image_dict), encoded["data"])
+        return image_obj, encoded["width"] * 72.0 / encoded["dpi"][0], encoded["height"] * 72.0 / encoded["dpi"][1]
+    
+    def add_image_file(self, image_path, page_num):
+        """
+        画像ファイルを1ページとして追記する（スレッドセーフ。同じファイルは1回だけ埋め込む）
+        
+        Args:
+            image_path (str): 画像ファイルのパス
+            page_num (int): ページ番号
+        """
+        key = os.path.abspath(image_path)
+        while True:
+            # 埋め込み済みかの確認と読み込みの予約を1回のロックで行う（同じファイルを2つのスレッドが読み込まない）
+            with self._lock:
+                if key in self._images:
+                    reserved = None
+                    break
+                loading = self._loading.get(key)
+                if loading is None:
+                    reserved = self._loading[key] = threading.Event()
+                    break
+            # 他のスレッドが同じファイルを読み込み中: 埋め込みが終わるのを待つ（失敗した場合は予約し直す）
+            loading.wait()
+        
+        if reserved is None:
+            # 埋め込み済みの画像はファイルを読み込まずに参照だけを追加する
+            self.add_page(None, page_num, key)
+            return
+        
+        try:
+            # 画像の読み込みはロックの外で行い、他のページの追記を止めない
+            self.add_page(load_pdf_image(image_path), page_num, key)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            reserved.set()
+    
+    @property
+    def page_count(self):
+        """追記済みのページ数"""
+        return len(self._pages)
+    
+    def close(self, final_path=None):
+        """
+        ページツリー・xref・trailerを書き込んでPDFを完成させる
+        
+        Args:
+            final_path (str): 完成したPDFの移動先（Noneの場合は一時ファイルのパスのまま）
+        
+        Returns:
+            str: 完成したPDFのパス
+        """
+        with self._lock:
+            if self.closed:
+                return self.path
+            
+            kids = [f"{self._pages[num]} 0 R" for num in sorted(self._pages)]
+            self._write_object(self.PAGES_OBJ, _pdf_value({"Type": "/Pages", "Kids": kids, "Count": len(kids)}))
+            self._write_object(self.CATALOG_OBJ, _pdf_value({"Type": "/Catalog", "Pages": f"{self.PAGES_OBJ} 0 R"}))
+            
+            xref_offset = self._file.tell()
+            self._file.write(f"xref\n0 {self._next_obj}\n".encode())
+            self._file.write(b"0000000000 65535 f \n")
+            for obj_num in range(1, self._next_obj):
+                self._file.write(f"{self._offsets.get(obj_num, 0):010d} 00000 n \n".encode())
+            self._file.write(b"trailer\n" + _pdf_value({"Size": self._next_obj, "Root": f"{self.CATALOG_OBJ} 0 R"}) + b"\n")
+            self._file.write(f"startxref\n{xref_offset}\n%%EOF\n".encode())
+            self._file.close()
+            self.closed = True
+        
+        if final_path and os.path.abspath(final_path) != os.path.abspath(self.path):
+            shutil.move(self.path, final_path)
+            self.path = final_path
+        
+        return self.path
+    
+    def abort(self):
+        """
+        書き込みを中止して一時ファイルを削除する
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self._file.close()
+            self.closed = True
+        
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
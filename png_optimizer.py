@@ -0,0 +1,191 @@
+"""
+保存済みPNGのバックグラウンド再圧縮
+キャプチャ中は最速の圧縮レベルで書き込み、ページ送りのループが圧縮を待たないようにする
+保存後にワーカースレッドで最大レベルに再圧縮し（色数が少ないページはグレースケール/パレットに変換し）、最終的なファイルは小さく保つ
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from trace_timing import Tracer
+
+
+def reduce_colors(image):
+    """
+    画質を変えずに色数を減らす（グレースケールまたは256色以下のパレット）
+    
+    Args:
+        image (PIL.Image.Image): 画像
+    
+    Returns:
+        PIL.Image.Image: 変換後の画像（減らせない場合は元の画像）
+    """
+    if image.mode not in ("RGB", "L"):
+        return image
+    
+    colors = image.getcolors(256)
+    if colors is None or image.mode == "L":
+        return image
+    
+    if all(r == g == b for _, (r, g, b) in colors):
+        return image.convert("L")
+    
+    # 減色アルゴリズムが色をまとめてしまった場合は使わない（無損失の場合のみ変換する）
+    paletted = image.convert("P", palette=Image.ADAPTIVE, colors=len(colors))
+    if paletted.convert("RGB").tobytes() == image.tobytes():
+        return paletted
+    return image
+
+
+def optimize_png(path, compress_level=9, reduce=True):
+    """
+    PNGファイルを再圧縮する（小さくなった場合のみ置き換える）
+    
+    Args:
+        path (str): PNGファイルのパス
+        compress_level (int): zlibの圧縮レベル
+        reduce (bool): 色数を減らせる場合はグレースケール/パレットに変換する
+    
+    Returns:
+        tuple: (元のサイズ, 再圧縮後のサイズ)（バイト）
+    """
+    original_size = os.path.getsize(path)
+    
+    with Image.open(path) as image:
+        image.load()
+        info = {"dpi": image.info["dpi"]} if "dpi" in image.info else {}
+        if reduce:
+            image = reduce_colors(image)
+        
+        temp_path = f"{path}.{threading.get_ident()}.opt"
+        image.save(temp_path, format="PNG", compress_level=compress_level, **info)
+    
+    optimized_size = os.path.getsize(temp_path)
+    if optimized_size < original_size:
+        os.replace(temp_path, path)
+        return original_size, optimized_size
+    
+    os.remove(temp_path)
+    return original_size, original_size
+
+
+class PNGOptimizer:
+    """保存済みPNGを再圧縮するワーカースレッドプール"""
+    
+    def __init__(self, num_workers=1, compress_level=9, reduce=True, tracer=None):
+        """
+        初期化
+        
+        Args:
+            num_workers (int): 再圧縮ワーカー数
+            compress_level (int): 再圧縮時のzlibの圧縮レベル
+            reduce (bool): 色数を減らせるページはグレースケール/パレットに変換する
+            tracer (Tracer): 再圧縮時間の計測先（Noneの場合は計測しない）
+        """
+        self.tracer = tracer or Tracer()
+        self.compress_level = compress_level
+        self.reduce = reduce
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(num_workers)), thread_name_prefix="PNGOptimizer")
+        self._cond = threading.Condition()
+        self._callbacks = {}  # 再圧縮中のパス -> 完了後に呼ぶコールバックのリスト（同じファイルは1回だけ再圧縮する）
+        self._done = set()  # 再圧縮が終わったパス
+        self.original_bytes = 0
+        self.optimized_bytes = 0
+        self.errors = 0
+        self.callback_errors = []  # (path, exception): 完了後のコールバックで発生した例外
+    
+    def submit(self, path, on_done=None):
+        """
+        ファイルの再圧縮を予約する
+        
+        Args:
+            path (str): PNGファイルのパス
+            on_done (callable): 再圧縮後（失敗した場合も）に path を引数として呼ばれるコールバック（ワーカースレッドで実行）
+        """
+        with self._cond:
+            optimized = path in self._done
+            if not optimized and path in self._callbacks:
+                # 同じファイルを再圧縮中: 完了後にまとめて呼ぶ
+                if on_done:
+                    self._callbacks[path].append(on_done)
+                return
+            if not optimized:
+                self._callbacks[path] = [on_done] if on_done else []
+        
+        if optimized:
+            if on_done:
+                self._call(on_done, path)
+        else:
+            self.executor.submit(self._run, path)
+    
+    def _call(self, callback, path):
+        """
+        完了後のコールバックを呼ぶ（例外は記録して、他のコールバックと後続の処理を止めない）
+        """
+        try:
+            callback(path)
+        except Exception as e:
+            with self._cond:
+                self.callback_errors.append((path, e))
+            print(f"  ✗ 再圧縮後の処理に失敗しました: {path}: {e}")
+    
+    def _run(self, path):
+        """
+        1ファイルを再圧縮し、完了を待っているコールバックを呼ぶ
+        """
+        try:
+            with self.tracer.span("png_optimizer.optimize", file=os.path.basename(path)):
+                original_size, optimized_size = optimize_png(path, self.compress_level, self.reduce)
+            with self._cond:
+                self.original_bytes += original_size
+                self.optimized_bytes += optimized_size
+        except Exception as e:
+            # 再圧縮できなくても、保存済みの（圧縮率の低い）ファイルはそのまま使える
+            with self._cond:
+                self.errors += 1
+            print(f"  警告: 画像の再圧縮に失敗しました: {path}: {e}")
+        
+        with self._cond:
+            # 以降に予約された同じファイルのコールバックは submit で直接呼ばれる
+            callbacks = list(self._callbacks[path])
+            self._done.add(path)
+        try:
+            for callback in callbacks:
+                self._call(callback, path)
+        finally:
+            with self._cond:
+                del self._callbacks[path]
+                self._cond.notify_all()
+    
+    def take_callback_errors(self):
+        """
+        コールバックで発生した例外を取り出してクリアする
+        
+        Returns:
+            list: (path, exception) のリスト
+        """
+        with self._cond:
+            errors, self.callback_errors = self.callback_errors, []
+        return errors
+    
+    def pending(self):
+        """
+        再圧縮が終わっていないファイル数
+        """
+        with self._cond:
+            return len(self._callbacks)
+    
+    def flush(self):
+        """
+        予約済みの再圧縮がすべて終わるまで待つ（完了後のコールバックも含む）
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._callbacks)
+    
+    def close(self):
+        """
+        残りの再圧縮を終えてワーカーを終了する
+        """
+        self.flush()
+        self.executor.shutdown(wait=True)
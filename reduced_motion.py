@@ -0,0 +1,74 @@
+"""
+ページめくりアニメーションの抑止
+page_delay の一部はコンテンツの読み込みではなく、リーダーのページめくりのトランジションが終わるのを待つ時間になっている
+本のタブにトランジションとアニメーションを無効にするスタイルシートを注入し、
+CDPで prefers-reduced-motion: reduce をエミュレートして、ページ送り直後に新しいページが表示されるようにする
+"""
+
+import json
+
+
+# すべての要素のトランジションとアニメーションを一瞬で終わらせるスタイルシート
+# （none にすると transitionend / animationend を待つ処理が止まるため、ごく短い時間にして終了イベントは発生させる）
+NO_MOTION_CSS = """
+*, *::before, *::after {
+    transition-duration: 0.01ms !important;
+    transition-delay: 0s !important;
+    animation-duration: 0.01ms !important;
+    animation-delay: 0s !important;
+    animation-iteration-count: 1 !important;
+    scroll-behavior: auto !important;
+}
+"""
+
+# スタイルシートを注入するスクリプト（何度実行しても1回だけ追加される）
+# 新しいドキュメントではまだ <head> がないため、DOMの構築後に追加する
+INJECT_CSS_JS = r"""
+(function(css) {
+    function inject() {
+        if (document.getElementById('kindle2pdf-no-motion')) return;
+        var style = document.createElement('style');
+        style.id = 'kindle2pdf-no-motion';
+        style.textContent = css;
+        (document.head || document.documentElement).appendChild(style);
+    }
+    if (document.documentElement) {
+        inject();
+    } else {
+        document.addEventListener('DOMContentLoaded', inject);
+    }
+})(%s);
+"""
+
+
+class AnimationSuppressor:
+    """本のタブのトランジションとアニメーションを無効にする"""
+    
+    def __init__(self, driver):
+        """
+        初期化
+        
+        Args:
+            driver: WebDriver（Chrome）
+        """
+        self.driver = driver
+    
+    def apply(self):
+        """
+        現在のタブに適用する（以降に開くドキュメントと、現在のドキュメントの両方）
+        CDPの設定はタブごとのため、本を新しいタブで開いた場合はそのタブで再度呼ぶ
+        
+        Returns:
+            bool: 適用できた場合True
+        """
+        script = INJECT_CSS_JS % json.dumps(NO_MOTION_CSS)
+        try:
+            self.driver.execute_cdp_cmd('Emulation.setEmulatedMedia', {
+                'features': [{'name': 'prefers-reduced-motion', 'value': 'reduce'}]
+            })
+            self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': script})
+            self.driver.execute_script(script)
+            return True
+        except Exception as e:
+            print(f"  警告: アニメーションを無効にできませんでした: {e}")
+            return False
@@ -0,0 +1,149 @@
+"""
+キャプチャセッションのジャーナル（追記専用のJSON Lines）
+ページごとのファイル・内容ダイジェスト・ページ番号表示・タイミングを記録し、中断したセッションの再開に使う
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class SessionJournal:
+    """output_dir に置く追記専用のセッションジャーナル"""
+    
+    FILENAME = "session_journal.jsonl"
+    
+    def __init__(self, output_dir):
+        """
+        初期化
+        
+        Args:
+            output_dir (str): スクリーンショットの保存先ディレクトリ
+        """
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._lock = threading.Lock()
+    
+    def _append(self, record):
+        """
+        レコードを1行追記する（スレッドセーフ）
+        """
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+    
+    def start_session(self, capture_mode, total_pages):
+        """
+        新しいセッションの開始を記録する
+        
+        Args:
+            capture_mode (str): キャプチャモード
+            total_pages (int): 総ページ数（不明の場合はNone）
+        """
+        self._append({
+            "type": "session",
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "capture_mode": capture_mode,
+            "total_pages": total_pages,
+        })
+    
+    def resume_session(self, start_page):
+        """
+        セッションの再開を記録する
+        
+        Args:
+            start_page (int): 再開後に最初にキャプチャするページ番号
+        """
+        self._append({
+            "type": "resume",
+            "resumed_at": datetime.now().isoformat(timespec="seconds"),
+            "start_page": start_page,
+        })
+    
+    def record_page(self, page, file, digest, page_info=None, settle_time=None, captured_at=None, **extra):
+        """
+        保存済みのページを記録する
+        
+        Args:
+            page (int): ページ番号
+            file (str): 画像ファイルのパス
+            digest (str): 画像内容のダイジェスト
+            page_info (dict): ページ番号表示（例: {"current": 5, "total": 196}）
+            settle_time (float): このページに移動した際の安定待ち時間（秒）
+            captured_at (float): キャプチャ時刻（UNIX時刻）
+            **extra: その他の記録項目
+        """
+        record = {
+            "type": "page",
+            "page": page,
+            "file": file,
+            "digest": digest,
+            "page_info": page_info,
+            "settle_time": round(settle_time, 3) if settle_time is not None else None,
+            "captured_at": captured_at,
+        }
+        record.update(extra)
+        self._append(record)
+    
+    def mark_complete(self):
+        """
+        セッションの完了を記録する
+        """
+        self._append({"type": "complete", "completed_at": datetime.now().isoformat(timespec="seconds")})
+    
+    def load(self):
+        """
+        最新セッションの内容を読み込む
+        
+        Returns:
+            dict: {"session": 開始レコード, "pages": {ページ番号: レコード}, "complete": bool}
+                  ジャーナルがない場合はNone
+        """
+        if not os.path.exists(self.path):
+            return None
+        
+        session = None
+        pages = {}
+        complete = False
+        
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 書き込み途中で中断された行
+                
+                if record.get("type") == "session":
+                    session, pages, complete = record, {}, False
+                elif record.get("type") == "page":
+                    pages[record["page"]] = record
+                elif record.get("type") == "complete":
+                    complete = True
+        
+        if session is None:
+            return None
+        
+        return {"session": session, "pages": pages, "complete": complete}
+    
+    @staticmethod
+    def captured_prefix(pages):
+        """
+        1ページ目から途切れずに保存済みのページを取得する
+        
+        Args:
+            pages (dict): load() が返すページレコード
+        
+        Returns:
+            list: ページ番号順のレコード（ファイルが存在するもののみ）
+        """
+        records = []
+        page = 1
+        while page in pages and os.path.exists(pages[page]["file"]):
+            records.append(pages[page])
+            page += 1
+        return records
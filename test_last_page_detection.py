@@ -10,7 +10,7 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+from driver_cache import resolve_chromedriver
 import pyautogui
 
 
@@ -18,7 +18,7 @@ def setup_browser():
     """ブラウザをセットアップ"""
     print("ブラウザを起動しています...")
     
-    service = Service(ChromeDriverManager().install())
+    service = Service(resolve_chromedriver())
     options = webdriver.ChromeOptions()
     
     options.add_argument("--no-sandbox")
@@ -6,7 +6,7 @@ import json
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from driver_cache import resolve_chromedriver
 import re
 
 
@@ -14,7 +14,7 @@ def setup_browser():
     """ブラウザをセットアップ"""
     print("ブラウザを起動しています...")
     
-    service = Service(ChromeDriverManager().install())
+    service = Service(resolve_chromedriver())
     options = webdriver.ChromeOptions()
     
     # 基本設定
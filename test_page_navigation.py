@@ -7,7 +7,7 @@ import time
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
+from driver_cache import resolve_chromedriver
 
 
 def test_page_navigation():
@@ -18,7 +18,7 @@ def test_page_navigation():
     
     # ブラウザを起動
     print("\n1. ブラウザを起動しています...")
-    service = Service(ChromeDriverManager().install())
+    service = Service(resolve_chromedriver())
     options = webdriver.ChromeOptions()
     options.add_argument("--start-maximized")
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -0,0 +1,4 @@
+"""
+ブラウザを使わない部分（PDF書き出し・フレーム解析・最終ページ検出・ジャーナルなど）の自動テスト
+実行: python -m unittest discover tests（または python -m pytest tests）
+"""
@@ -0,0 +1,97 @@
+"""frame_analysis の自動テスト"""
+
+import unittest
+
+from PIL import Image, ImageDraw
+
+from frame_analysis import find_content_bbox, frame_difference, frame_quality, midtone_fraction
+
+
+def _page(size=(400, 600), box=(100, 150, 300, 450), toolbar=False):
+    """白地に黒い矩形（本文）があるページ（toolbar=True で上端にリーダーのツールバーを描く）"""
+    image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((box[0], box[1], box[2] - 1, box[3] - 1), fill=(0, 0, 0))
+    if toolbar:
+        draw.rectangle((0, 0, size[0] - 1, 19), fill=(60, 60, 60))
+    return image
+
+
+def _photo(size=(200, 200)):
+    """中間調の多いページ（グラデーション）"""
+    image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for x in range(20, 180):
+        draw.line((x, 20, x, 179), fill=(x, x, x))
+    return image
+
+
+class FindContentBBoxTest(unittest.TestCase):
+    
+    def test_box_with_padding(self):
+        self.assertEqual(find_content_bbox([_page()], padding=8), (92, 142, 308, 458))
+    
+    def test_toolbar_at_edge_is_excluded(self):
+        self.assertEqual(find_content_bbox([_page(toolbar=True)], padding=0), (100, 150, 300, 450))
+    
+    def test_union_of_frames(self):
+        frames = [_page(box=(100, 150, 300, 450)), _page(box=(80, 200, 250, 500))]
+        
+        self.assertEqual(find_content_bbox(frames, padding=0), (80, 150, 300, 500))
+    
+    def test_padding_is_clamped_to_frame(self):
+        self.assertEqual(find_content_bbox([_page(box=(2, 2, 398, 598))], padding=8), (0, 0, 400, 600))
+    
+    def test_blank_frames(self):
+        self.assertIsNone(find_content_bbox([Image.new("RGB", (100, 100), (255, 255, 255))]))
+
+
+class FrameDifferenceTest(unittest.TestCase):
+    
+    def test_identical_frames(self):
+        self.assertEqual(frame_difference(_page(), _page()), 0.0)
+    
+    def test_different_frames(self):
+        self.assertGreater(frame_difference(_page(), _page(box=(50, 50, 350, 550))), 0.1)
+    
+    def test_different_sizes(self):
+        self.assertEqual(frame_difference(_page(), _page(size=(300, 600))), 1.0)
+
+
+class FrameQualityTest(unittest.TestCase):
+    
+    def test_stable_text_page(self):
+        result = frame_quality(_page(), _page(), baseline_midtone=0.0)
+        
+        self.assertEqual(result["score"], 1.0)
+        self.assertEqual(result["diff"], 0.0)
+    
+    def test_stable_photo_page_is_not_penalized(self):
+        # 中間調が多くても、2枚が同じ（画面が静止している）なら正常なフレーム
+        photo = _photo()
+        self.assertGreater(midtone_fraction(photo), 0.5)
+        
+        self.assertEqual(frame_quality(photo, _photo(), baseline_midtone=0.0)["score"], 1.0)
+    
+    def test_moving_frame_scores_zero(self):
+        result = frame_quality(_page(), _page(box=(50, 50, 350, 550)))
+        
+        self.assertEqual(result["score"], 0.0)
+    
+    def test_midtone_increase_is_penalized_when_moving(self):
+        # ごくわずかに動いていて（diff_limit 未満）、中間調が基準より大きく増えている: クロスフェードの途中
+        first = _photo()
+        second = _photo()
+        second.putpixel((190, 190), (0, 0, 0))
+        second.putpixel((191, 190), (0, 0, 0))
+        
+        moving = frame_quality(first, second, baseline_midtone=0.0, diff_limit=1.0)
+        without_baseline = frame_quality(first, second, diff_limit=1.0)
+        
+        self.assertGreater(moving["diff"], 0.0)
+        self.assertEqual(moving["score"], 0.0)
+        self.assertGreater(without_baseline["score"], 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""last_page_detector の自動テスト"""
+
+import unittest
+
+from last_page_detector import LastPageDetector, unchanged_signals
+
+
+def _state(page, total=100, content=None, url="https://read.amazon.co.jp/?asin=B000"):
+    """get_page_state と同じ形式のページの状態"""
+    return {
+        "url": url,
+        "page_content_hash": content if content is not None else f"content-{page}",
+        "page_source_hash": f"source-{page}",
+        "page_info": {"current": page, "total": total},
+    }
+
+
+class UnchangedSignalsTest(unittest.TestCase):
+    
+    def test_page_turned(self):
+        self.assertEqual(unchanged_signals(_state(1), _state(2)),
+                         {"url": True, "content": False, "source": False, "page_number": False})
+    
+    def test_missing_signals_are_skipped(self):
+        before = dict(_state(1), page_content_hash=None, page_info=None)
+        
+        self.assertEqual(set(unchanged_signals(before, _state(1))), {"url", "source"})
+
+
+class LastPageDetectorTest(unittest.TestCase):
+    
+    def test_page_change(self):
+        detector = LastPageDetector()
+        detector.begin(_state(1))
+        
+        status, _, _ = detector.observe(_state(2))
+        
+        self.assertEqual(status, "changed")
+        self.assertEqual(len(detector.history), 1)
+    
+    def test_last_page_needs_repeated_attempts(self):
+        detector = LastPageDetector(confirm_attempts=2)
+        detector.begin(_state(100))
+        
+        self.assertEqual(detector.observe(_state(100))[0], "suspect")
+        # キーを送らずに再確認しただけでは回数に数えない
+        self.assertEqual(detector.observe(_state(100), new_attempt=False)[0], "suspect")
+        status, confidence, reasons = detector.observe(_state(100))
+        
+        self.assertEqual(status, "last")
+        self.assertGreaterEqual(confidence, detector.threshold)
+        self.assertIn("最終ページ番号到達 (100/100)", reasons)
+    
+    def test_begin_resets_attempts(self):
+        detector = LastPageDetector(confirm_attempts=2)
+        detector.begin(_state(50))
+        detector.observe(_state(50))
+        self.assertEqual(detector.attempts, 1)
+        
+        detector.begin(_state(51))
+        
+        self.assertEqual(detector.attempts, 0)
+    
+    def test_content_change_wins_over_confidence(self):
+        # ページ番号表示が最終ページでも、本文が変わっていればページは動いている
+        detector = LastPageDetector(confirm_attempts=1)
+        detector.begin(_state(100))
+        
+        self.assertEqual(detector.observe(dict(_state(100), page_content_hash="other"))[0], "changed")
+    
+    def test_unreliable_signal_is_down_weighted(self):
+        # ページ番号表示が2ページに1回しか変わらない本
+        detector = LastPageDetector()
+        for page in range(1, 9):
+            detector.begin(_state(page // 2))
+            detector.observe(_state((page + 1) // 2, content=f"content-{page + 1}"))
+        
+        self.assertAlmostEqual(detector.reliability("page_number"), 0.5)
+        self.assertEqual(detector.reliability("content"), 1.0)
+        self.assertEqual(detector.reliability("url"), 0.0)
+        
+        # URLは毎ページ変わらないため、最終ページの判定に寄与しない
+        confidence, reasons = detector.score(_state(10), _state(11))
+        self.assertEqual(confidence, 0)
+        self.assertEqual(reasons, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
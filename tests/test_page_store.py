@@ -0,0 +1,64 @@
+"""page_store の自動テスト"""
+
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from page_store import PageStore
+
+
+class PageStoreTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def test_digest_depends_on_content(self):
+        white = Image.new("RGB", (10, 10), (255, 255, 255))
+        
+        self.assertEqual(PageStore.digest(white), PageStore.digest(white.copy()))
+        self.assertNotEqual(PageStore.digest(white), PageStore.digest(Image.new("RGB", (10, 10), (0, 0, 0))))
+        # 画素データが同じでも、サイズやモードが違えば別の画像
+        self.assertNotEqual(PageStore.digest(Image.new("L", (10, 20))), PageStore.digest(Image.new("L", (20, 10))))
+    
+    def test_path_for_shards_by_prefix(self):
+        store = PageStore(self.dir)
+        digest = "ab" + "0" * 38
+        
+        path = store.path_for(digest)
+        
+        self.assertEqual(path, os.path.join(self.dir, "store", "ab", digest + ".png"))
+        self.assertTrue(os.path.isdir(os.path.dirname(path)))
+    
+    def test_manifest_round_trip(self):
+        store = PageStore(self.dir)
+        blank = store.path_for(PageStore.digest(Image.new("RGB", (4, 4), (255, 255, 255))))
+        text = store.path_for(PageStore.digest(Image.new("RGB", (4, 4), (0, 0, 0))))
+        
+        # 同じ内容のページ（白紙）は同じファイルを参照する
+        store.write_manifest([blank, text, blank])
+        
+        self.assertEqual(PageStore.latest_manifest_files(self.dir), [blank, text, blank])
+    
+    def test_latest_manifest_is_used(self):
+        old = PageStore(self.dir)
+        old.session_id = "20240101_000000"
+        old.write_manifest([old.path_for("aa" + "1" * 38)])
+        new = PageStore(self.dir)
+        new.session_id = "20240102_000000"
+        page = new.path_for("bb" + "2" * 38)
+        new.write_manifest([page])
+        
+        self.assertEqual(PageStore.latest_manifest_files(self.dir), [page])
+    
+    def test_no_manifest(self):
+        self.assertEqual(PageStore.latest_manifest_files(self.dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
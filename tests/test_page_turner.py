@@ -0,0 +1,114 @@
+"""page_turner のページ送り方法の探索の自動テスト（ブラウザの代わりに偽のドライバーを使う）"""
+
+import unittest
+
+from page_turner import PageTurner
+
+
+class FakeDriver:
+    """キーの送信を受け付けるだけの偽のWebDriver"""
+    
+    current_window_handle = "main"
+    
+    def __init__(self):
+        self.switch_to = self
+    
+    def window(self, handle):
+        pass
+    
+    def execute_script(self, script, *args):
+        pass
+    
+    def find_element(self, by, value):
+        return self
+    
+    def send_keys(self, key):
+        pass
+
+
+class FakeReader:
+    """指定した方法のキーでだけページが変わるリーダー（wait として PageTurner に渡す）"""
+    
+    def __init__(self, turner, working):
+        self.turner = turner
+        self.working = set(working)
+        self.sent = []
+        self.page = 1
+        original_send = turner.send
+        
+        def send(method, forward=True):
+            original_send(method, forward)
+            self.sent.append(method)
+            if method in self.working:
+                self.page += 1
+        
+        turner.send = send
+    
+    def waiter(self):
+        before = self.page
+        
+        def wait(recheck=False):
+            return self.page != before
+        return wait
+    
+    def turn(self):
+        return self.turner.turn(self.waiter())
+
+
+def _turner(working, reprobe_after=2):
+    turner = PageTurner(FakeDriver(), methods=("selenium", "javascript"), reprobe_after=reprobe_after)
+    return turner, FakeReader(turner, working)
+
+
+class PageTurnerTest(unittest.TestCase):
+    
+    def test_first_working_method_is_remembered(self):
+        turner, reader = _turner({"selenium", "javascript"})
+        
+        self.assertEqual(reader.turn(), (True, "selenium"))
+        self.assertEqual(reader.turn(), (True, "selenium"))
+        self.assertEqual(reader.sent, ["selenium", "selenium"])
+    
+    def test_probe_moves_on_when_page_does_not_change(self):
+        turner, reader = _turner({"javascript"})
+        
+        self.assertEqual(reader.turn(), (True, "javascript"))
+        
+        self.assertEqual(reader.sent, ["selenium", "javascript"])
+        self.assertEqual(reader.page, 2)
+        self.assertEqual(turner.method, "javascript")
+    
+    def test_reprobe_skips_the_method_that_stopped_working(self):
+        turner, reader = _turner({"selenium", "javascript"})
+        reader.turn()
+        
+        # 途中から selenium のキーが効かなくなった
+        reader.working = {"javascript"}
+        reader.turn()
+        reader.turn()
+        self.assertIsNone(turner.method)
+        self.assertEqual(turner.failed_methods, {"selenium"})
+        
+        self.assertEqual(reader.turn(), (True, "javascript"))
+        self.assertEqual(reader.sent[-1:], ["javascript"])
+        self.assertEqual(turner.failed_methods, set())
+    
+    def test_no_method_changes_the_page(self):
+        turner, reader = _turner(set())
+        
+        self.assertEqual(reader.turn(), (True, None))
+        
+        self.assertEqual(reader.sent, ["selenium", "javascript"])
+        self.assertIsNone(turner.method)
+        # 最終ページなどで何も変わらなかった場合は、次回も最初の方法から試す
+        self.assertEqual(turner.failed_methods, set())
+    
+    def test_undetectable_change_keeps_the_first_method(self):
+        turner, reader = _turner({"selenium", "javascript"})
+        
+        self.assertEqual(turner.turn(lambda recheck=False: None), (True, "selenium"))
+        self.assertEqual(reader.sent, ["selenium"])
+
+
+if __name__ == "__main__":
+    unittest.main()
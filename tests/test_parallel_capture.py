@@ -0,0 +1,129 @@
+"""parallel_capture の自動テスト（ブラウザの代わりに偽のセッションを使う）"""
+
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from parallel_capture import capture_range, missing_ranges, plan_ranges, worker_overrides
+
+
+class PlanRangesTest(unittest.TestCase):
+    
+    def test_even_split(self):
+        self.assertEqual(plan_ranges(12, 3), [(1, 4), (5, 8), (9, 12)])
+    
+    def test_remainder_goes_to_first_sessions(self):
+        self.assertEqual(plan_ranges(20, 3), [(1, 7), (8, 14), (15, 20)])
+    
+    def test_ranges_cover_every_page_once(self):
+        for total in range(1, 40):
+            for sessions in range(1, 8):
+                ranges = plan_ranges(total, sessions)
+                pages = [page for start, end in ranges for page in range(start, end + 1)]
+                self.assertEqual(pages, list(range(1, total + 1)), (total, sessions))
+    
+    def test_more_sessions_than_pages(self):
+        self.assertEqual(plan_ranges(2, 5), [(1, 1), (2, 2)])
+    
+    def test_first_page(self):
+        self.assertEqual(plan_ranges(10, 2, first_page=5), [(5, 7), (8, 10)])
+
+
+class MissingRangesTest(unittest.TestCase):
+    
+    def test_all_captured(self):
+        self.assertEqual(missing_ranges(plan_ranges(10, 2), range(1, 11)), [])
+    
+    def test_failed_and_partial_sessions(self):
+        # 2番目のセッションは異常終了し、3番目は途中で止まった
+        captured = list(range(1, 8)) + [15, 16, 17]
+        
+        self.assertEqual(missing_ranges(plan_ranges(20, 3), captured), [(8, 14), (18, 20)])
+    
+    def test_hole_in_the_middle_of_a_session(self):
+        captured = [page for page in range(1, 11) if page != 4]
+        
+        self.assertEqual(missing_ranges(plan_ranges(10, 2), captured), [(4, 4)])
+    
+    def test_adjacent_gaps_are_merged(self):
+        self.assertEqual(missing_ranges(plan_ranges(12, 3), [1, 2]), [(3, 12)])
+
+
+class FakeKindleToPDF:
+    """capture_range が使う KindleToPDF の代わり（fail_page の画像は保存に失敗したことにする）"""
+    
+    fail_page = None
+    
+    def __init__(self, config_path, config_overrides=None):
+        self.images = []
+        self.settle_times = []
+        self.frame_qualities = []
+    
+    def setup_browser(self):
+        pass
+    
+    def take_screenshot(self, page):
+        return f"page_{page:04d}.png"
+    
+    def next_page(self):
+        return True
+    
+    def flush_image_writer(self):
+        if self.fail_page is not None:
+            self.images = [path for path in self.images if path != f"page_{self.fail_page:04d}.png"]
+    
+    def cleanup(self):
+        pass
+
+
+class CaptureRangeTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        module = types.ModuleType("kindle_to_pdf")
+        module.KindleToPDF = FakeKindleToPDF
+        patcher = mock.patch.dict(sys.modules, {"kindle_to_pdf": module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def _capture(self, start, end):
+        return capture_range({
+            "config_path": "config.json",
+            "overrides": worker_overrides(),
+            "start": start,
+            "end": end,
+            "index": 1,
+            "jump_url_template": "https://example.com/?page={page}",
+            "reader_url": "https://example.com/",
+            "cookies": [],
+            "log_path": os.path.join(self.temp.name, "session.log"),
+        })
+    
+    def test_pages_keep_their_numbers_after_a_failed_save(self):
+        FakeKindleToPDF.fail_page = 6
+        self.addCleanup(setattr, FakeKindleToPDF, "fail_page", None)
+        with mock.patch("parallel_capture._open_start_page", return_value=True):
+            result = self._capture(5, 8)
+        
+        self.assertIsNone(result["error"])
+        self.assertEqual(result["pages"], [(5, "page_0005.png"), (7, "page_0007.png"), (8, "page_0008.png")])
+        self.assertEqual(missing_ranges([(5, 8)], dict(result["pages"])), [(6, 6)])
+
+
+class WorkerOverridesTest(unittest.TestCase):
+    
+    def test_main_session_geometry_is_not_used(self):
+        overrides = worker_overrides()
+        
+        self.assertIsNone(overrides["screenshot_region"])
+        self.assertFalse(overrides["auto_crop"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""pdf_cache の自動テスト"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import make_pdf
+from pdf_cache import PageCache
+
+
+ENCODED = {
+    "width": 10,
+    "height": 20,
+    "dpi": (96, 96),
+    "colorspace": "/DeviceGray",
+    "bpc": 8,
+    "filter": "/FlateDecode",
+    "decode_parms": None,
+    "data": b"\x00\n\x01binary\ndata",
+}
+
+
+class PageCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+        self.image = self._image("page_0001.png", b"page one")
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def _image(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+    
+    def test_round_trip(self):
+        cache = PageCache(self.dir, {"method": "flate"})
+        key = cache.key(self.image)
+        
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ENCODED, "text")
+        
+        self.assertEqual(cache.get(key), (ENCODED, "text"))
+    
+    def test_contains_does_not_read_data(self):
+        cache = PageCache(self.dir, {})
+        key = cache.key(self.image)
+        
+        self.assertFalse(cache.contains(key))
+        cache.put(key, ENCODED, "text")
+        
+        with mock.patch("builtins.open", side_effect=AssertionError("読み込まない")):
+            self.assertTrue(cache.contains(key))
+    
+    def test_key_depends_on_content_and_settings(self):
+        cache = PageCache(self.dir, {"method": "flate", "quality": 90})
+        same = self._image("copy.png", b"page one")
+        other = self._image("other.png", b"page two")
+        
+        self.assertEqual(cache.key(self.image), cache.key(same))
+        self.assertNotEqual(cache.key(self.image), cache.key(other))
+        # 設定の並び順は関係ない
+        self.assertEqual(cache.key(self.image), PageCache(self.dir, {"quality": 90, "method": "flate"}).key(self.image))
+        self.assertNotEqual(cache.key(self.image), PageCache(self.dir, {"method": "flate", "quality": 80}).key(self.image))
+    
+    def test_changed_image_misses(self):
+        cache = PageCache(self.dir, {})
+        cache.put(cache.key(self.image), ENCODED, "text")
+        
+        self._image("page_0001.png", b"replaced page")
+        
+        self.assertIsNone(PageCache(self.dir, {}).get(cache.key(self.image)))
+    
+    def test_prune_removes_unused_entries(self):
+        first = PageCache(self.dir, {})
+        old_key = first.key(self.image)
+        first.put(old_key, ENCODED, "text")
+        
+        self._image("page_0001.png", b"replaced page")
+        second = PageCache(self.dir, {})
+        new_key = second.key(self.image)
+        second.put(new_key, ENCODED, "photo")
+        
+        self.assertEqual(second.prune(), 1)
+        self.assertIsNone(PageCache(self.dir, {}).get(old_key))
+        self.assertEqual(PageCache(self.dir, {}).get(new_key), (ENCODED, "photo"))
+    
+    def test_prune_without_cache_dir(self):
+        self.assertEqual(PageCache(self.dir, {}).prune(), 0)
+
+
+class EncodePagesTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+        self.images = []
+        for page in range(1, 4):
+            path = os.path.join(self.dir, f"page_{page:04d}.png")
+            Image.new("L", (32, 32), 255 if page % 2 else 0).save(path)
+            self.images.append(path)
+        self.tasks = [(path, "adaptive", 85) for path in self.images]
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def _encode(self, cache):
+        return list(make_pdf._encode_pages(self.tasks, 1, cache))
+    
+    def test_cached_pages_are_read_one_at_a_time(self):
+        first = self._encode(PageCache(self.dir, {}))
+        
+        cache = PageCache(self.dir, {})
+        reads = []
+        get = cache.get
+        cache.get = lambda key: reads.append(key) or get(key)
+        pages = make_pdf._encode_pages(self.tasks, 1, cache)
+        
+        # 1ページ目を取り出した時点では、キャッシュは1ページ分しか読まれていない
+        self.assertEqual(next(pages), first[0])
+        self.assertEqual(len(reads), 1)
+        self.assertEqual([first[0]] + list(pages), first)
+        self.assertEqual(len(reads), 3)
+    
+    def test_entry_removed_after_check_is_reencoded(self):
+        first = self._encode(PageCache(self.dir, {}))
+        
+        cache = PageCache(self.dir, {})
+        get = cache.get
+        
+        def get_after_removal(key):
+            os.remove(cache._path(key))
+            return get(key)
+        
+        cache.get = get_after_removal
+        
+        self.assertEqual(self._encode(cache), first)
+        # エンコードし直したページはキャッシュに戻る
+        self.assertTrue(all(PageCache(self.dir, {}).contains(cache.key(path)) for path in self.images))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+"""pdf_stream の自動テスト"""
+
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from unittest import mock
+
+from PIL import Image
+
+import pdf_stream
+from pdf_stream import StreamingPDFWriter, load_pdf_image
+
+
+def _save(directory, name, image, **params):
+    path = os.path.join(directory, name)
+    image.save(path, **params)
+    return path
+
+
+def _idat(path):
+    """PNGファイルのIDATチャンクを連結したデータ"""
+    with open(path, "rb") as f:
+        data = f.read()
+    chunks = []
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        if chunk_type == b"IDAT":
+            chunks.append(data[pos + 8:pos + 8 + length])
+        pos += 12 + length
+    return b"".join(chunks)
+
+
+class LoadPDFImageTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def test_png_rgb_passthrough(self):
+        image = Image.new("RGB", (40, 30), (250, 250, 250))
+        image.putpixel((5, 5), (10, 20, 30))
+        path = _save(self.dir, "rgb.png", image, dpi=(144, 144))
+        
+        encoded = load_pdf_image(path)
+        
+        self.assertEqual(encoded["filter"], "/FlateDecode")
+        self.assertEqual(encoded["colorspace"], "/DeviceRGB")
+        self.assertEqual(encoded["decode_parms"], {"Predictor": 15, "Colors": 3, "BitsPerComponent": 8, "Columns": 40})
+        self.assertEqual(encoded["dpi"], (144, 144))
+        # 圧縮データは再圧縮せずにそのまま使われる（各行の先頭にPNGのフィルター種別が付く）
+        self.assertEqual(encoded["data"], _idat(path))
+        self.assertEqual(len(zlib.decompress(encoded["data"])), 30 * (1 + 40 * 3))
+    
+    def test_png_palette_passthrough(self):
+        image = Image.new("P", (16, 16))
+        image.putpalette([0, 0, 0, 255, 255, 255] + [0] * 762)
+        image.putpixel((3, 3), 1)
+        path = _save(self.dir, "palette.png", image)
+        
+        encoded = load_pdf_image(path)
+        
+        self.assertEqual(encoded["colorspace"][:2], ["/Indexed", "/DeviceRGB"])
+        self.assertEqual(encoded["data"], _idat(path))
+    
+    def test_png_with_alpha_is_reencoded_on_white(self):
+        image = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+        path = _save(self.dir, "alpha.png", image)
+        
+        encoded = load_pdf_image(path)
+        
+        self.assertIsNone(encoded["decode_parms"])
+        self.assertEqual(zlib.decompress(encoded["data"]), b"\xff" * (8 * 8 * 3))
+    
+    def test_jpeg_is_embedded_as_is(self):
+        path = _save(self.dir, "page.jpg", Image.new("RGB", (20, 20), (128, 64, 32)), quality=90)
+        
+        encoded = load_pdf_image(path)
+        
+        self.assertEqual(encoded["filter"], "/DCTDecode")
+        with open(path, "rb") as f:
+            self.assertEqual(encoded["data"], f.read())
+
+
+class StreamingPDFWriterTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def _write(self, pages):
+        writer = StreamingPDFWriter(os.path.join(self.dir, "out.pdf.part"))
+        for page_num, path in pages:
+            writer.add_image_file(path, page_num)
+        path = writer.close(os.path.join(self.dir, "out.pdf"))
+        with open(path, "rb") as f:
+            return writer, f.read()
+    
+    def _assert_xref_consistent(self, data):
+        """startxref と xref の各オフセットが、それぞれ xref 表とオブジェクトの先頭を指している"""
+        xref_offset = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+        self.assertTrue(data[xref_offset:].startswith(b"xref\n"))
+        
+        header = re.match(rb"xref\n0 (\d+)\n", data[xref_offset:])
+        size = int(header.group(1))
+        entries = data[xref_offset + header.end():].split(b"\n")[:size]
+        self.assertEqual(entries[0], b"0000000000 65535 f ")
+        for obj_num, entry in enumerate(entries[1:], 1):
+            offset = int(entry[:10])
+            self.assertTrue(data[offset:].startswith(f"{obj_num} 0 obj\n".encode()), f"オブジェクト {obj_num}")
+        
+        self.assertIn(f"/Size {size}".encode(), data)
+        return size
+    
+    def test_round_trip(self):
+        first = _save(self.dir, "1.png", Image.new("RGB", (96, 48), (255, 255, 255)))
+        second = _save(self.dir, "2.png", Image.new("L", (48, 96), 200))
+        third = _save(self.dir, "3.jpg", Image.new("RGB", (30, 30), (0, 128, 255)))
+        
+        # 追記の順序に関係なく、ページ番号の順に並ぶ
+        writer, data = self._write([(2, second), (1, first), (3, third)])
+        
+        self.assertEqual(writer.page_count, 3)
+        self.assertTrue(data.startswith(b"%PDF-1.4\n"))
+        self._assert_xref_consistent(data)
+        self.assertIn(b"/Type /Pages /Kids [", data)
+        self.assertIn(b"/Count 3", data)
+        # 96dpi の画像は 72/96 倍の大きさのページになる
+        self.assertIn(b"/MediaBox [0 0 72 36]", data)
+        self.assertIn(b"/MediaBox [0 0 36 72]", data)
+        
+        kids = re.search(rb"/Kids \[([^\]]*)\]", data).group(1).split(b" R")
+        page_objs = [int(kid.split()[0]) for kid in kids if kid.strip()]
+        boxes = [re.search(rf"\n{obj} 0 obj\n[^\n]*/MediaBox \[([^\]]*)\]".encode(), data).group(1) for obj in page_objs]
+        self.assertEqual(boxes, [b"0 0 72 36", b"0 0 36 72", b"0 0 22.5 22.5"])
+    
+    def test_same_file_is_embedded_once(self):
+        blank = _save(self.dir, "blank.png", Image.new("RGB", (10, 10), (255, 255, 255)))
+        
+        writer, data = self._write([(1, blank), (2, blank), (3, blank)])
+        
+        self.assertEqual(writer.page_count, 3)
+        self.assertEqual(data.count(b"/Subtype /Image"), 1)
+        self._assert_xref_consistent(data)
+    
+    def test_concurrent_add_loads_same_file_once(self):
+        blank = _save(self.dir, "blank.png", Image.new("RGB", (200, 200), (255, 255, 255)))
+        writer = StreamingPDFWriter(os.path.join(self.dir, "out.pdf"))
+        barrier = threading.Barrier(8)
+        loads = []
+        
+        def slow_load(path):
+            loads.append(path)
+            time.sleep(0.05)  # 読み込み中に他のスレッドが同じファイルを追加する
+            return load_pdf_image(path)
+        
+        def add(page_num):
+            barrier.wait()
+            writer.add_image_file(blank, page_num)
+        
+        with mock.patch.object(pdf_stream, "load_pdf_image", slow_load):
+            threads = [threading.Thread(target=add, args=(page_num,)) for page_num in range(1, 9)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        path = writer.close()
+        
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(writer.page_count, 8)
+        self.assertEqual(data.count(b"/Subtype /Image"), 1)
+        self._assert_xref_consistent(data)
+    
+    def test_failed_load_releases_reservation(self):
+        page = _save(self.dir, "1.png", Image.new("RGB", (10, 10)))
+        writer = StreamingPDFWriter(os.path.join(self.dir, "out.pdf"))
+        
+        with mock.patch.object(pdf_stream, "load_pdf_image", side_effect=OSError("読み込み失敗")):
+            with self.assertRaises(OSError):
+                writer.add_image_file(page, 1)
+        # 失敗した読み込みの予約は残らず、次の追加で読み込み直す
+        writer.add_image_file(page, 1)
+        
+        self.assertEqual(writer.page_count, 1)
+        with open(writer.close(), "rb") as f:
+            self._assert_xref_consistent(f.read())
+    
+    def test_add_after_close_fails(self):
+        page = _save(self.dir, "1.png", Image.new("RGB", (10, 10)))
+        writer, _ = self._write([(1, page)])
+        
+        with self.assertRaises(ValueError):
+            writer.add_image_file(page, 2)
+    
+    def test_abort_removes_partial_file(self):
+        writer = StreamingPDFWriter(os.path.join(self.dir, "out.pdf.part"))
+        writer.abort()
+        
+        self.assertFalse(os.path.exists(writer.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
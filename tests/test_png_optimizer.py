@@ -0,0 +1,110 @@
+"""png_optimizer の自動テスト"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+from png_optimizer import PNGOptimizer, optimize_png, reduce_colors
+
+
+class ReduceColorsTest(unittest.TestCase):
+    
+    def test_gray_page_becomes_grayscale(self):
+        image = Image.new("RGB", (8, 8), (255, 255, 255))
+        image.putpixel((1, 1), (40, 40, 40))
+        
+        self.assertEqual(reduce_colors(image).mode, "L")
+    
+    def test_few_colors_become_lossless_palette(self):
+        image = Image.new("RGB", (8, 8), (255, 255, 255))
+        image.putpixel((1, 1), (200, 30, 30))
+        
+        reduced = reduce_colors(image)
+        
+        self.assertEqual(reduced.mode, "P")
+        self.assertEqual(reduced.convert("RGB").tobytes(), image.tobytes())
+    
+    def test_many_colors_are_kept(self):
+        image = Image.new("RGB", (32, 32))
+        image.putdata([(x * 8, y * 8, (x + y) * 4) for y in range(32) for x in range(32)])
+        
+        self.assertIs(reduce_colors(image), image)
+
+
+class OptimizePNGTest(unittest.TestCase):
+    
+    def test_recompressed_file_is_smaller_and_identical(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "page.png")
+            image = Image.new("RGB", (200, 200), (255, 255, 255))
+            image.paste((0, 0, 0), (50, 50, 150, 60))
+            image.save(path, compress_level=0, dpi=(144, 144))
+            
+            original_size, optimized_size = optimize_png(path)
+            
+            self.assertLess(optimized_size, original_size)
+            self.assertEqual(os.path.getsize(path), optimized_size)
+            with Image.open(path) as optimized:
+                self.assertEqual(optimized.convert("RGB").tobytes(), image.tobytes())
+                self.assertEqual(tuple(round(v) for v in optimized.info["dpi"]), (144, 144))
+            self.assertEqual(os.listdir(directory), ["page.png"])
+
+
+class PNGOptimizerTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp.name, "page.png")
+        Image.new("RGB", (64, 64), (255, 255, 255)).save(self.path, compress_level=0)
+        self.optimizer = PNGOptimizer()
+    
+    def tearDown(self):
+        self.optimizer.close()
+        self.temp.cleanup()
+    
+    def test_callbacks_run_after_recompression(self):
+        done = []
+        
+        self.optimizer.submit(self.path, done.append)
+        self.optimizer.submit(self.path, done.append)
+        self.optimizer.flush()
+        # 再圧縮済みのファイルはすぐにコールバックを呼ぶ
+        self.optimizer.submit(self.path, done.append)
+        
+        self.assertEqual(done, [self.path] * 3)
+        self.assertEqual(self.optimizer.pending(), 0)
+        self.assertGreater(self.optimizer.original_bytes, self.optimizer.optimized_bytes)
+    
+    def test_failing_callback_is_recorded(self):
+        done = []
+        release = threading.Event()
+        
+        def fail(path):
+            release.wait()
+            raise ValueError("PDFに追記できません")
+        
+        self.optimizer.submit(self.path, fail)
+        self.optimizer.submit(self.path, done.append)
+        release.set()
+        self.optimizer.flush()
+        
+        # 失敗したコールバックの後のコールバックも呼ばれ、例外は取り出せる
+        self.assertEqual(done, [self.path])
+        errors = self.optimizer.take_callback_errors()
+        self.assertEqual([(path, type(e)) for path, e in errors], [(self.path, ValueError)])
+        self.assertEqual(self.optimizer.take_callback_errors(), [])
+    
+    def test_failing_callback_for_optimized_file_is_recorded(self):
+        self.optimizer.submit(self.path)
+        self.optimizer.flush()
+        
+        self.optimizer.submit(self.path, lambda path: 1 / 0)
+        
+        self.assertEqual(len(self.optimizer.take_callback_errors()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
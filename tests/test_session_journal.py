@@ -0,0 +1,100 @@
+"""session_journal の自動テスト"""
+
+import os
+import tempfile
+import unittest
+
+from session_journal import SessionJournal
+
+
+class SessionJournalTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+        self.journal = SessionJournal(self.dir)
+    
+    def tearDown(self):
+        self.temp.cleanup()
+    
+    def _page_file(self, page):
+        path = os.path.join(self.dir, f"page_{page:04d}.png")
+        with open(path, "wb") as f:
+            f.write(b"png")
+        return path
+    
+    def test_no_journal(self):
+        self.assertIsNone(self.journal.load())
+    
+    def test_round_trip(self):
+        self.journal.start_session("manual", 3)
+        self.journal.record_page(1, self._page_file(1), "d1", {"current": 1, "total": 3}, settle_time=0.12345)
+        self.journal.record_page(2, self._page_file(2), "d2", quality=0.9)
+        
+        state = self.journal.load()
+        
+        self.assertEqual(state["session"]["capture_mode"], "manual")
+        self.assertEqual(state["session"]["total_pages"], 3)
+        self.assertEqual(sorted(state["pages"]), [1, 2])
+        self.assertEqual(state["pages"][1]["page_info"], {"current": 1, "total": 3})
+        self.assertEqual(state["pages"][1]["settle_time"], 0.123)
+        self.assertEqual(state["pages"][2]["quality"], 0.9)
+        self.assertFalse(state["complete"])
+    
+    def test_complete(self):
+        self.journal.start_session("manual", 1)
+        self.journal.record_page(1, self._page_file(1), "d1")
+        self.journal.mark_complete()
+        
+        self.assertTrue(self.journal.load()["complete"])
+    
+    def test_latest_session_only(self):
+        self.journal.start_session("manual", 2)
+        self.journal.record_page(1, self._page_file(1), "old")
+        self.journal.mark_complete()
+        self.journal.start_session("auto_complete", None)
+        
+        state = self.journal.load()
+        
+        self.assertEqual(state["session"]["capture_mode"], "auto_complete")
+        self.assertEqual(state["pages"], {})
+        self.assertFalse(state["complete"])
+    
+    def test_resumed_pages_overwrite_earlier_records(self):
+        self.journal.start_session("manual", 2)
+        self.journal.record_page(2, self._page_file(2), "first")
+        self.journal.resume_session(2)
+        self.journal.record_page(2, self._page_file(2), "second")
+        
+        self.assertEqual(self.journal.load()["pages"][2]["digest"], "second")
+    
+    def test_truncated_line_is_ignored(self):
+        self.journal.start_session("manual", 2)
+        self.journal.record_page(1, self._page_file(1), "d1")
+        with open(self.journal.path, "a", encoding="utf-8") as f:
+            f.write('{"type": "page", "page": 2, "fi')
+        
+        self.assertEqual(sorted(self.journal.load()["pages"]), [1])
+    
+    def test_captured_prefix_stops_at_gap(self):
+        self.journal.start_session("manual", 5)
+        for page in (1, 2, 4):
+            self.journal.record_page(page, self._page_file(page), f"d{page}")
+        
+        records = SessionJournal.captured_prefix(self.journal.load()["pages"])
+        
+        self.assertEqual([record["page"] for record in records], [1, 2])
+    
+    def test_captured_prefix_stops_at_missing_file(self):
+        self.journal.start_session("manual", 3)
+        for page in (1, 2, 3):
+            self.journal.record_page(page, self._page_file(page), f"d{page}")
+        os.remove(os.path.join(self.dir, "page_0002.png"))
+        
+        records = SessionJournal.captured_prefix(self.journal.load()["pages"])
+        
+        self.assertEqual([record["page"] for record in records], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+処理フェーズごとの所要時間の計測（タイミングスパン）
+計測結果は Chrome のトレースイベント形式（chrome://tracing や Perfetto で表示可能）のJSONに保存し、
+終了時にフェーズごとのヒストグラムを表示する
+無効時の span() は共有の空のコンテキストマネージャを返すだけなので、ほとんどオーバーヘッドがない
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+# 無効時に返す空のスパン（再利用可能）
+_NULL_SPAN = contextlib.nullcontext()
+
+# ヒストグラムの区間の上限（ミリ秒）
+HISTOGRAM_BUCKETS_MS = [1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class _Span:
+    """1つのタイミングスパン（with文で使う）"""
+    
+    __slots__ = ("tracer", "name", "args", "start")
+    
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.add_span(self.name, self.start, time.perf_counter() - self.start,
+                             error=exc_type.__name__ if exc_type else None, **self.args)
+        return False
+
+
+def traced(name):
+    """
+    メソッド全体をスパンとして計測するデコレータ（インスタンスの tracer 属性を使う）
+    
+    Args:
+        name (str): フェーズ名
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Tracer:
+    """タイミングスパンの記録とトレースイベントの書き出し"""
+    
+    def __init__(self, enabled=False):
+        """
+        初期化
+        
+        Args:
+            enabled (bool): 計測を行うか（Falseの場合、span() は何も記録しない）
+        """
+        self.enabled = enabled
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+    
+    def span(self, name, **args):
+        """
+        処理フェーズの所要時間を計測するコンテキストマネージャを返す
+        
+        Args:
+            name (str): フェーズ名（例: "next_page.send_key"）
+            **args: トレースイベントに付加する情報（ページ番号など）
+        
+        Returns:
+            コンテキストマネージャ
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+    
+    def add_span(self, name, start, duration, **args):
+        """
+        計測済みのスパンを記録する（スレッドセーフ）
+        
+        Args:
+            name (str): フェーズ名
+            start (float): 開始時刻（time.perf_counter() の値）
+            duration (float): 所要時間（秒）
+            **args: トレースイベントに付加する情報（Noneの値は省略）
+        """
+        if not self.enabled:
+            return
+        
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round(duration * 1e6, 1),
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        args = {key: value for key, value in args.items() if value is not None}
+        if args:
+            event["args"] = args
+        
+        with self._lock:
+            self.events.append(event)
+    
+    def durations(self):
+        """
+        フェーズごとの所要時間を取得
+        
+        Returns:
+            dict: フェーズ名 -> 所要時間（秒）のリスト（記録順）
+        """
+        result = {}
+        with self._lock:
+            for event in self.events:
+                result.setdefault(event["name"], []).append(event["dur"] / 1e6)
+        return result
+    
+    def save(self, path):
+        """
+        トレースイベント形式のJSONを保存する
+        
+        Args:
+            path (str): 保存先のファイルパス
+        """
+        with self._lock:
+            events = list(self.events)
+        
+        # スレッドに名前を付けてトレースビューアで見分けやすくする
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in sorted({event["tid"] for event in events}):
+            events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                           "args": {"name": names.get(tid, f"thread-{tid}")}})
+        
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    
+    def print_summary(self):
+        """
+        フェーズごとの所要時間の集計とヒストグラムを表示
+        """
+        durations = self.durations()
+        if not durations:
+            return
+        
+        print("\n" + "="*70)
+        print("フェーズごとの所要時間")
+        print("="*70)
+        # 全角文字は表示幅が2文字分なので、その分だけ詰めて揃える
+        print(f"{'フェーズ':<28}{'回数':>4}{'合計':>8}{'平均':>8}{'p50':>10}{'最大':>8}")
+        
+        for name in sorted(durations):
+            values = sorted(durations[name])
+            total = sum(values)
+            print(f"{name:<32}{len(values):>6}{total:>9.2f}s"
+                  f"{total / len(values) * 1000:>8.0f}ms"
+                  f"{values[(len(values) - 1) // 2] * 1000:>8.0f}ms"
+                  f"{values[-1] * 1000:>8.0f}ms")
+        
+        print("\nヒストグラム（件数）")
+        labels = [f"<{limit}ms" for limit in HISTOGRAM_BUCKETS_MS] + [f">={HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        for name in sorted(durations):
+            counts = [0] * len(labels)
+            for value in durations[name]:
+                index = 0
+                while index < len(HISTOGRAM_BUCKETS_MS) and value * 1000 >= HISTOGRAM_BUCKETS_MS[index]:
+                    index += 1
+                counts[index] += 1
+            
+            peak = max(counts)
+            print(f"  {name}")
+            for label, count in zip(labels, counts):
+                if count:
+                    bar = "#" * max(1, round(count / peak * 30))
+                    print(f"    {label:>9} {bar} {count}")
+        print("="*70)
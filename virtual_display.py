@@ -0,0 +1,108 @@
+"""
+キャプチャごとの仮想ディスプレイ（Xvfb）
+画面のないLinuxサーバーでも、Chromeを専用の仮想フレームバッファ上で通常どおり（ヘッドレスではなく）起動する
+スクリーンショット（pyautogui / x11shm）とキー操作はすべてそのディスプレイに対して行われるため、
+1台のサーバーで複数のキャプチャを同時に実行してもフォーカスやマウスを奪い合わない
+"""
+
+import os
+import shutil
+import subprocess
+import time
+
+
+class VirtualDisplay:
+    """Xvfb による仮想ディスプレイ"""
+    
+    def __init__(self, size=(1920, 1080), depth=24, start_timeout=10):
+        """
+        初期化
+        
+        Args:
+            size (tuple): 画面の大きさ (width, height)
+            depth (int): 色深度
+            start_timeout (float): Xvfb の起動を待つ最大時間（秒）
+        """
+        self.size = tuple(size)
+        self.depth = depth
+        self.start_timeout = start_timeout
+        self.process = None
+        self.display = None  # 例: ":99"
+        self._previous_display = None
+    
+    def start(self):
+        """
+        Xvfb を起動し、このプロセスの DISPLAY をそのディスプレイに切り替える
+        以降に起動するChrome（ChromeDriver経由）と、以降にインポートされる pyautogui はこのディスプレイを使う
+        
+        Returns:
+            str: ディスプレイ名
+        """
+        xvfb = shutil.which("Xvfb")
+        if not xvfb:
+            raise RuntimeError("Xvfb が見つかりません（Debian/Ubuntu: sudo apt install xvfb）")
+        
+        # -displayfd: 空いているディスプレイ番号をXvfb自身に選ばせ、準備ができたらその番号を書き込ませる
+        # （同時に起動した複数のキャプチャが同じ番号を取り合わない）
+        read_fd, write_fd = os.pipe()
+        width, height = self.size
+        try:
+            self.process = subprocess.Popen(
+                [xvfb, "-displayfd", str(write_fd), "-screen", "0", f"{width}x{height}x{self.depth}",
+                 "-nolisten", "tcp", "-noreset"],
+                pass_fds=(write_fd,), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        finally:
+            os.close(write_fd)
+        
+        try:
+            number = self._read_display_number(read_fd)
+        finally:
+            os.close(read_fd)
+        
+        self.display = f":{number}"
+        self._previous_display = os.environ.get("DISPLAY")
+        os.environ["DISPLAY"] = self.display
+        return self.display
+    
+    def _read_display_number(self, read_fd):
+        """
+        Xvfb が書き込むディスプレイ番号を読む（起動に失敗した場合は例外）
+        """
+        deadline = time.time() + self.start_timeout
+        data = b""
+        os.set_blocking(read_fd, False)
+        while not data.endswith(b"\n"):
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Xvfb の起動に失敗しました（終了コード {self.process.returncode}）")
+            if time.time() > deadline:
+                self.stop()
+                raise RuntimeError(f"Xvfb が{self.start_timeout}秒以内に起動しませんでした")
+            try:
+                chunk = os.read(read_fd, 16)
+            except BlockingIOError:
+                chunk = None
+            if chunk:
+                data += chunk
+            else:
+                time.sleep(0.05)
+        return int(data.strip())
+    
+    def stop(self):
+        """
+        Xvfb を終了し、DISPLAY を元に戻す
+        """
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        
+        if self.display and os.environ.get("DISPLAY") == self.display:
+            if self._previous_display is None:
+                os.environ.pop("DISPLAY", None)
+            else:
+                os.environ["DISPLAY"] = self._previous_display
+        self.display = None